@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Steam Controller calibration from recorded captures
+
+Fit the pads rotation, the stick rest position and noise floor and the gyro
+bias from one or more capture files recorded with sc-dump.py -w, and store
+them in the profile of the controller. For a good fit, swipe the pads
+horizontally and vertically, let the stick go back to rest a few times and
+leave the controller on a table for a few seconds.
+"""
+
+import sys
+import json
+import argparse
+
+import numpy as np
+
+from steamcontroller import SCButtons, SCStatus
+from steamcontroller.decoder import STEAM_CONTROLLER_FORMAT
+from steamcontroller.capture import CaptureReader, HEADER_SIZE, RECORD_SIZE
+from steamcontroller.calibration import Calibration
+
+# Minimum pad move between two reports used to fit the rotation, smaller
+# moves are dominated by the touch noise
+PAD_MOVE = 200
+# Stick samples further from the center are not at rest
+STICK_REST = 6000
+# Gyro samples by window, a window is still if its deviation is close to the
+# lowest one
+GYRO_WINDOW = 64
+GYRO_STILL = 2.0
+
+_TYPES = {'B': 'u1', 'H': '<u2', 'I': '<u4', 'h': '<i2'}
+
+
+def _dtype():
+    """Return the numpy type of a capture record"""
+    # Timestamp in ns then the raw report
+    names, formats, offsets = ['t'], ['<u8'], [0]
+    offset = 8
+    for fmt, name in STEAM_CONTROLLER_FORMAT:
+        if name.startswith('ukn_'):
+            offset += int(fmt[:-1] or 1)
+            continue
+        names.append(name)
+        formats.append(_TYPES[fmt])
+        offsets.append(offset)
+        offset += np.dtype(_TYPES[fmt]).itemsize
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                     'itemsize': RECORD_SIZE})
+
+
+RECORD = _dtype()
+
+
+def load(paths):
+    """
+    Return the input reports of capture files as a numpy structured array and
+    the serial number found in their headers
+    """
+    serial = None
+    records = []
+    for path in paths:
+        with CaptureReader(path) as reader:
+            serial = serial or reader.serial
+            count = len(reader)
+        if count == 0:
+            continue
+        rec = np.memmap(path, dtype=RECORD, mode='r', offset=HEADER_SIZE, shape=(count,))
+        records.append(rec[rec['status'] == SCStatus.INPUT])
+    if not records:
+        return np.zeros(0, dtype=RECORD), serial
+    return np.concatenate(records), serial
+
+
+def fitPadAngle(rec, left, default):
+    """
+    Return the rotation of a pad
+
+    Swipes are expected along the pad axes, the direction of each move is
+    taken modulo 90 degrees (4 theta) and averaged weighted by its length.
+    """
+    touch = SCButtons.LPADTOUCH if left else SCButtons.RPADTOUCH
+    prefix = 'lpad_' if left else 'rpad_'
+    touched = rec['buttons'] & touch != 0
+    both = touched[1:] & touched[:-1]
+    dx = np.diff(rec[prefix + 'x'].astype(np.float64))[both]
+    dy = np.diff(rec[prefix + 'y'].astype(np.float64))[both]
+    dist = np.hypot(dx, dy)
+    moving = dist > PAD_MOVE
+    if np.count_nonzero(moving) < 50:
+        return default, 0.0
+    theta = 4 * np.arctan2(dy[moving], dx[moving])
+    weight = dist[moving]
+    s, c = np.dot(weight, np.sin(theta)), np.dot(weight, np.cos(theta))
+    # Resultant length, 1 when every swipe has the same direction modulo 90
+    strength = np.hypot(s, c) / weight.sum()
+    # Reports are rotated by the pad angle, the correction is the opposite
+    return -np.arctan2(s, c) / 4, strength
+
+
+def fitStick(rec, default):
+    """Return the stick center and noise amplitude at rest"""
+    # The left pad coordinates are the stick ones when it is not touched
+    free = rec['buttons'] & (SCButtons.LPADTOUCH | SCButtons.LPAD) == 0
+    x = rec['lpad_x'][free].astype(np.float64)
+    y = rec['lpad_y'][free].astype(np.float64)
+    rest = (np.abs(x) < STICK_REST) & (np.abs(y) < STICK_REST)
+    if np.count_nonzero(rest) < 50:
+        return default.stick_center, default.stick_noise
+    x, y = x[rest], y[rest]
+    cx, cy = np.median(x), np.median(y)
+    noise = np.percentile(np.hypot(x - cx, y - cy), 99)
+    return (int(round(cx)), int(round(cy))), int(np.ceil(noise))
+
+
+def fitGyroBias(rec, default):
+    """Return the gyro rates measured while the controller is still"""
+    gyro = np.stack([rec['gpitch'], rec['groll'], rec['gyaw']], axis=1).astype(np.float64)
+    windows = len(gyro) // GYRO_WINDOW
+    if windows == 0 or not gyro.any():
+        sys.stderr.write('No gyro data in the captures, the gyro bias is left to {}, '
+                         'record them with sc-dump.py -w\n'.format(default.gyro_bias))
+        return default.gyro_bias
+    blocks = gyro[:windows * GYRO_WINDOW].reshape(windows, GYRO_WINDOW, 3)
+    spread = blocks.std(axis=1).max(axis=1)
+    still = spread <= max(spread.min() * GYRO_STILL, 1.0)
+    return tuple(round(float(v), 2) for v in blocks[still].mean(axis=(0, 1)))
+
+
+def calibrate(rec, serial=None):
+    """Return the Calibration fitted on input reports"""
+    default = Calibration(serial)
+    cal = Calibration(serial)
+    cal.lpad_angle, lstrength = fitPadAngle(rec, True, default.lpad_angle)
+    cal.rpad_angle, rstrength = fitPadAngle(rec, False, default.rpad_angle)
+    cal.stick_center, cal.stick_noise = fitStick(rec, default)
+    cal.gyro_bias = fitGyroBias(rec, default)
+    return cal, (lstrength, rstrength)
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('captures', nargs='+', metavar='FILE',
+                        help='capture files recorded with sc-dump.py -w')
+    parser.add_argument('-s', '--serial', default=None,
+                        help='controller serial number, read from the captures by default')
+    parser.add_argument('-o', '--output', metavar='FILE', default=None,
+                        help='profile file, by default the profile of the serial number')
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help='print the profile without writing it')
+    args = parser.parse_args()
+
+    try:
+        rec, serial = load(args.captures)
+    except (IOError, OSError, ValueError) as e:
+        sys.stderr.write(str(e) + '\n')
+        sys.exit(1)
+
+    cal, strength = calibrate(rec, args.serial or serial)
+    sys.stderr.write('{:d} reports, pads fit strength left {:.2f} right {:.2f}\n'.format(
+        len(rec), strength[0], strength[1]))
+
+    if args.dry_run:
+        print(json.dumps(cal.toDict(), indent=2, sort_keys=True))
+        return
+    path = args.output or Calibration.path(cal.serial)
+    cal.save(path)
+    print('Calibration written to {}'.format(path))
+
+
+if __name__ == '__main__':
+    _main()
@@ -25,21 +25,64 @@
 """Steam Controller USB Dumper"""
 
 import sys
+import argparse
+from time import monotonic
 from steamcontroller import SteamController
+from steamcontroller.capture import CaptureWriter, CaptureReader, ReplayContext
 
 def dump(_, sci):
     print(sci)
 
 def _main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-s', '--stats', type=float, metavar='SECONDS', default=None,
+                        help='print USB link statistics every SECONDS')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='do not print reports')
+    parser.add_argument('-w', '--write', metavar='FILE', default=None,
+                        help='record raw reports into capture FILE, the gyro is enabled')
+    parser.add_argument('-g', '--gyro', action='store_true',
+                        help='enable the gyro and quaternion fields of the reports')
+    parser.add_argument('-r', '--read', metavar='FILE', default=None,
+                        help='replay capture FILE instead of reading a controller')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='replay speed, 1 is real time, 0 is as fast as possible')
+    args = parser.parse_args()
 
+    last = [monotonic()]
+
+    def callback(sc, sci):
+        if not args.quiet:
+            dump(sc, sci)
+        if args.stats is not None and monotonic() - last[0] >= args.stats:
+            last[0] = monotonic()
+            print(sc.linkStats())
+
+    sc = None
+    capture = None
     try:
-        sc = SteamController(callback=dump)
+        ctx = None
+        if args.read is not None:
+            ctx = ReplayContext(CaptureReader(args.read), speed=args.speed)
+        sc = SteamController(callback=callback, ctx=ctx)
+        # Captures are used by sc-calibrate.py to fit the gyro bias
+        if args.read is None and (args.gyro or args.write is not None):
+            sc.setGyro(True)
+        if args.write is not None:
+            capture = CaptureWriter(args.write, pid=sc._pid, serial=sc.readSerial())
+            sc.setCapture(capture)
         sc.run()
     except KeyboardInterrupt:
         pass
     except Exception as e:
         sys.stderr.write(str(e) + '\n')
 
+    if capture is not None:
+        capture.close()
+
+    if sc is not None and args.stats is not None:
+        print(sc.linkStats())
+
     print("Bye")
 
 
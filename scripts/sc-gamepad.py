@@ -37,8 +37,9 @@ from steamcontroller.uinput import (
     Axes
 )
 from steamcontroller.daemon import Daemon
+from steamcontroller.manager import SteamControllerManager
+from steamcontroller.pool import DevicePool
 
-import gc
 
 def evminit():
     evm = EventMapper()
@@ -71,13 +72,25 @@ def evminit():
     return evm
 
 class SCDaemon(Daemon):
+    all = False
+    pool = None
+
+    def setup(self):
+        # Virtual devices outlive controller reconnects
+        self.pool = DevicePool(evminit)
+
     def run(self):
-        evm = evminit()
-        sc = SteamController(callback=evm.process, keep_alive=True)
-        sc.run()
-        del sc
-        del evm
-        gc.collect()
+        try:
+            if self.all:
+                self.serve(SteamControllerManager(self.pool.lease,
+                                                  release=self.pool.release))
+            else:
+                self.serve(SteamController(callback=self.pool.acquire().process, keep_alive=True))
+        finally:
+            self.pool.reset()
+
+    def teardown(self):
+        self.pool.close()
 
 if __name__ == '__main__':
     import argparse
@@ -86,11 +99,14 @@ if __name__ == '__main__':
         parser = argparse.ArgumentParser(description=__doc__)
         parser.add_argument('command', type=str, choices=['start', 'stop', 'restart', 'debug'])
         parser.add_argument('-i', '--index', type=int, choices=[0,1,2,3], default=None)
+        parser.add_argument('-a', '--all', action='store_true',
+                            help='serve all controllers from this process')
         args = parser.parse_args()
         if args.index != None:
             daemon = SCDaemon('/tmp/steamcontroller{:d}.pid'.format(args.index))
         else:
             daemon = SCDaemon('/tmp/steamcontroller.pid')
+        daemon.all = args.all
 
         if 'start' == args.command:
             daemon.start()
@@ -99,12 +115,12 @@ if __name__ == '__main__':
         elif 'restart' == args.command:
             daemon.restart()
         elif 'debug' == args.command:
+            daemon.setup()
             try:
-                evm = evminit()
-                sc = SteamController(callback=evm.process, keep_alive=True)
-                sc.run()
-
+                daemon.run()
             except KeyboardInterrupt:
                 pass
+            finally:
+                daemon.teardown()
 
     _main()
@@ -24,19 +24,70 @@
 
 """Steam Controller gyro data plot"""
 
-from steamcontroller import SteamController
-from PySide import QtGui
+import argparse
+import threading
+from time import monotonic
+from operator import itemgetter
+
+import numpy as np
 import pyqtgraph as pg
-import time
-import struct
+from pyqtgraph.Qt import QtCore
+
+from steamcontroller import SteamController, SCStatus, SCI_NULL
+
+CHANNELS = ('gpitch', 'groll', 'gyaw', 'q1', 'q2', 'q3', 'q4')
+
+# Highest report rate expected, sizes the ring buffer of the plot window
+MAX_RATE = 1000
+
+
+class RingBuffer(object):
+    """
+    Fixed size ring buffer of rows (time and channels), written by the USB
+    thread and read by the Qt thread
+
+    Each row is written twice, at i and i + size, so the last size rows are
+    always contiguous and copied in one slice at redraw.
+
+    @param int size         number of rows kept
+    @param int width        values by row
+    """
+
+    def __init__(self, size, width):
+        self._data = np.zeros((width, 2 * size))
+        self._size = size
+        self._index = 0
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def append(self, row):
+        """Write a row, oldest row is overwritten once full"""
+        with self._lock:
+            i = self._index
+            self._data[:, i] = row
+            self._data[:, i + self._size] = row
+            self._index = i + 1 if i + 1 < self._size else 0
+            self.count += 1
+
+    def snapshot(self):
+        """Return a copy of the rows written in time order as a (width, n) array"""
+        with self._lock:
+            n = min(self.count, self._size)
+            end = self._index + self._size
+            return self._data[:, end - n:end].copy()
 
-run = True
-times = []
 
 def _main():
-    app = QtGui.QApplication([])
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-w', '--window', type=float, default=10.0,
+                        help='plotted duration in s')
+    parser.add_argument('-f', '--fps', type=float, default=60.0,
+                        help='redraw rate, the display refresh rate')
+    args = parser.parse_args()
+
+    app = pg.mkQApp()
 
-    win = pg.GraphicsWindow(title="Steam Controller")
+    win = pg.GraphicsLayoutWidget(title="Steam Controller")
     win.resize(1000, 600)
     win.nextRow()
 
@@ -54,89 +105,73 @@ def _main():
     p4 = win.addPlot(name="plot4", title='Others', colspan=5)
     win.nextRow()
 
+    for plot, yrange in ((p1, 8000), (p2, 8000), (p3, 8000), (p4, 32767)):
+        plot.addLegend()
+        plot.showGrid(x=True, y=True, alpha=0.5)
+        plot.setYRange(-yrange, yrange)
+        plot.setXRange(-args.window, 0)
+        # Curves are redrawn at the display rate, skip what is not visible
+        plot.setClipToView(True)
+
+    curves = [
+        p1.plot(pen=(0, 2), name='vel'),
+        p2.plot(pen=(0, 2), name='vel'),
+        p3.plot(pen=(0, 2), name='vel'),
+        p4.plot(pen=(0, 4), name='1'),
+        p4.plot(pen=(1, 4), name='2'),
+        p4.plot(pen=(2, 4), name='3'),
+        p4.plot(pen=(3, 4), name='4'),
+    ]
+
+    ring = RingBuffer(int(args.window * MAX_RATE), len(CHANNELS) + 1)
+    imu = itemgetter(*[SCI_NULL._fields.index(name) for name in CHANNELS])
+
+    # USB thread, only writes the ring buffer
+    last = [None]
 
-    p1.addLegend()
-    p1.showGrid(x=True, y=True, alpha=0.5)
-    p1.setYRange(-8000, 8000)
-
-    p2.addLegend()
-    p2.showGrid(x=True, y=True, alpha=0.5)
-    p2.setYRange(-8000, 8000)
-
-    p3.addLegend()
-    p3.showGrid(x=True, y=True, alpha=0.5)
-    p3.setYRange(-8000, 8000)
-
-    p4.addLegend()
-    p4.showGrid(x=True, y=True, alpha=0.5)
-    p4.setYRange(-32767, 32767)
-
-
-    imu = {
-        'gpitch' : [],
-        'groll'  : [],
-        'gyaw'   : [],
-        'q1'     : [],
-        'q2'     : [],
-        'q3'     : [],
-        'q4'     : [],
-    }
+    def update(sc, sci):
+        if sci.status != SCStatus.INPUT or sci.seq == last[0]:
+            # Wired controllers get their last report sent again, not a sample
+            return
+        last[0] = sci.seq
+        ring.append((sc.timestamp,) + imu(sci))
 
-    curves = {
-        'gpitch' : p1.plot(times, [], pen=(0, 2), name='vel'),
-        'groll'  : p2.plot(times, [], pen=(0, 2), name='vel'),
-        'gyaw'   : p3.plot(times, [], pen=(0, 2), name='vel'),
-        'q1'     : p4.plot(times, [], pen=(0, 4), name='1'),
-        'q2'     : p4.plot(times, [], pen=(1, 4), name='2'),
-        'q3'     : p4.plot(times, [], pen=(2, 4), name='3'),
-        'q4'     : p4.plot(times, [], pen=(3, 4), name='4'),
-    }
+    # Qt thread, decimated to the display rate
+    drawn = [0]
 
-    def update(sc, sci):
-        global times
-        if sci.status != 15361:
+    def redraw():
+        if ring.count == drawn[0]:
             return
-        cur = time.time()
-        times.append(cur)
-        times = [x for x in times if cur - x <= 10.0]
-
-        for name in imu.keys():
-            imu[name].append(sci._asdict()[name])
-            nt = len(times)
-            ni = len(imu[name])
-            if nt < ni:
-                imu[name] = imu[name][-nt:]
-            elif nt > ni:
-                times = times[nt-ni:]
-            curves[name].setData(times, imu[name])
-
-    app.processEvents()
+        drawn[0] = ring.count
+        data = ring.snapshot()
+        times = data[0] - monotonic()
+        keep = np.searchsorted(times, -args.window)
+        for i, curve in enumerate(curves):
+            curve.setData(times[keep:], data[i + 1, keep:])
+
     sc = SteamController(callback=update)
-    sc.handleEvents()
-    sc._sendControl(struct.pack('>' + 'I' * 6,
-                                0x87153284,
-                                0x03180000,
-                                0x31020008,
-                                0x07000707,
-                                0x00301400,
-                                0x2f010000))
-    def closeEvent(event):
-        global run
-        run = False
-        event.accept()
-
-    win.closeEvent = closeEvent
-    app.processEvents()
+    sc.setGyro(True)
+    usb = threading.Thread(target=sc.run)
+    usb.daemon = True
+    usb.start()
 
+    timer = QtCore.QTimer()
+    timer.timeout.connect(redraw)
+    timer.start(int(1000 / args.fps))
+
+    win.show()
     try:
-        i = 0
-        while run:
-            i = i + 1
-            sc.handleEvents()
-            app.processEvents()
+        if hasattr(app, 'exec_'):
+            app.exec_()
+        else:
+            app.exec()
     except KeyboardInterrupt:
         print("Bye")
 
+    timer.stop()
+    sc.addExit()
+    usb.join(1.0)
+
 
 if __name__ == '__main__':
     _main()
@@ -1,6 +1,5 @@
 #!/usr/bin/env python
 
-import sys
 try:
     from setuptools import setup, Extension
 except ImportError:
@@ -9,9 +8,7 @@ except ImportError:
 uinput = Extension('libuinput',
                    sources = ['src/uinput.c'])
 
-deps = ['libusb1', 'psutil']
-if sys.version_info < (3,4):
-    deps.append('enum34')
+deps = ['libusb1']
 
 setup(name='python-steamcontroller',
       version='1.2',
@@ -22,6 +19,7 @@ setup(name='python-steamcontroller',
       package_dir={'steamcontroller': 'src'},
       packages=['steamcontroller'],
       scripts=['scripts/sc-dump.py',
+               'scripts/sc-calibrate.py',
                'scripts/sc-xbox.py',
                'scripts/sc-gamepad.py',
                'scripts/sc-desktop.py',
@@ -32,5 +30,6 @@ setup(name='python-steamcontroller',
                'scripts/json2vdf.py'],
       license='MIT',
       platforms=['Linux'],
+      python_requires='>=3.7',
       install_requires=deps,
       ext_modules=[uinput, ])
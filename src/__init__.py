@@ -19,66 +19,79 @@
 # THE SOFTWARE.
 
 from enum import IntEnum
-from threading import Timer
-from time import time, sleep
-from struct import pack, unpack
+from time import monotonic
+from threading import get_ident, Event
+from struct import pack
 from collections import namedtuple
 
-import usb1
+from steamcontroller.decoder import (
+    REPORT_SIZE,
+    STEAM_CONTROLLER_FORMAT,
+    SteamControllerInput,
+    SteamControllerHotplug,
+    SteamControllerIdle,
+    SCI_NULL,
+    SCStatus,
+    SCHotplug,
+    DECODERS,
+)
+from steamcontroller.stats import LinkStats
+from steamcontroller.scheduler import ControlScheduler, Priority
+from steamcontroller.tools import LazyModule
+
+usb1 = LazyModule('usb1')
 
 
 VENDOR_ID = 0x28de
-PRODUCT_ID = [0x1102, 0x1142, 0x1142, 0x1142, 0x1142]
-ENDPOINT =   [3, 2, 3, 4, 5]
-CONTROLIDX = [2, 1, 2, 3, 4]
+
+# Controller interfaces (interface number, in endpoint) by product id, the
+# interface number is also the control message index
+INTERFACES = {
+    0x1102: [(2, 3)],                           # Wired controller
+    0x1142: [(1, 2), (2, 3), (3, 4), (4, 5)],   # Wireless dongle
+}
 
 HPERIOD  = 0.02
 LPERIOD  = 0.5
 DURATION = 1.0
 
-STEAM_CONTROLLER_FORMAT = [
-    ('x',   'ukn_00'),
-    ('x',   'ukn_01'),
-    ('B',   'status'),
-    ('x',   'ukn_02'),
-    ('H',   'seq'),
-    ('x',   'ukn_03'),
-    ('I',   'buttons'),
-    ('B',   'ltrig'),
-    ('B',   'rtrig'),
-    ('x',   'ukn_04'),
-    ('x',   'ukn_05'),
-    ('x',   'ukn_06'),
-    ('h',   'lpad_x'),
-    ('h',   'lpad_y'),
-    ('h',   'rpad_x'),
-    ('h',   'rpad_y'),
-    ('10x', 'ukn_07'),
-    ('h',   'gpitch'),
-    ('h',   'groll'),
-    ('h',   'gyaw'),
-    ('h',   'q1'),
-    ('h',   'q2'),
-    ('h',   'q3'),
-    ('h',   'q4'),
-    ('16x', 'ukn_08'),
-]
-
-_FORMATS, _NAMES = zip(*STEAM_CONTROLLER_FORMAT)
+# Number of interrupt transfers kept submitted
+TRANSFERS = 8
+
+# Control transfers timeout in ms and maximum number of control transfers in
+# flight, other messages stay in the scheduler where they can be coalesced
+CONTROL_TIMEOUT = 200
+CONTROL_INFLIGHT = 2
+
+# Delay in s between two reconnection attempts without libusb hotplug support
+RECONNECT_POLL = 2.0
+
+# Delays in s between open attempts after a device arrival, udev may not have
+# set the permissions of the new device node yet
+ARRIVAL_RETRY = (0.01, 0.05, 0.2, 1.0)
 
 EXITCMD = pack('>' + 'I' * 2,
                0x9f046f66,
                0x66210000)
 
-SteamControllerInput = namedtuple('SteamControllerInput', ' '.join([x for x in _NAMES if not x.startswith('ukn_')]))
+# Serial number string attribute request, the answer is read back with a
+# GET_REPORT after the command header
+SERIALCMD = pack('>BBB', 0xae, 0x15, 0x01)
 
-SCI_NULL = SteamControllerInput._make(unpack('<' + ''.join(_FORMATS), b'\x00' * 64))
+# Sensors byte of the settings message, enables the gyro rates and the
+# orientation quaternion in the input reports
+GYRO_ENABLE = 0x14
 
 
-class SCStatus(IntEnum):
-    INPUT = 0x01
-    HOTPLUG = 0x03
-    IDLE = 0x04
+def settingsCmd(gyro=False):
+    """Return the settings control message, haptic auto feedback is disabled"""
+    return pack('>' + 'I' * 6,
+                0x87153284,
+                0x03180000,
+                0x31020008,
+                0x07000707,
+                0x00300000 | (GYRO_ENABLE << 8 if gyro else 0),
+                0x2f010000)
 
 
 class SCButtons(IntEnum):
@@ -107,9 +120,58 @@ class HapticPos(IntEnum):
     LEFT = 1
 
 
+SCSlot = namedtuple('SCSlot', 'handle pid number endpoint')
+
+
+def openSlots(ctx):
+    """
+    Enumerate the bus once and open every Steam Controller device
+
+    Kernel drivers are detached from all device interfaces.
+
+    @param USBContext ctx   libusb context
+
+    @return list of SCSlot  one slot per controller interface, not claimed yet
+    """
+    slots = []
+    for device in ctx.getDeviceIterator(skip_on_error=True):
+        if device.getVendorID() != VENDOR_ID or device.getProductID() not in INTERFACES:
+            continue
+        try:
+            handle = device.open()
+        except usb1.USBError:
+            continue
+        for inter in device[0]:
+            for setting in inter:
+                number = setting.getNumber()
+                try:
+                    if handle.kernelDriverActive(number):
+                        handle.detachKernelDriver(number)
+                except usb1.USBError:
+                    pass
+        pid = device.getProductID()
+        for number, endpoint in INTERFACES[pid]:
+            slots.append(SCSlot(handle, pid, number, endpoint))
+    return slots
+
+
+def claimSlot(slot):
+    """
+    Claim a slot interface
+
+    @return bool            False if the interface is busy
+    """
+    try:
+        slot.handle.claimInterface(slot.number)
+    except usb1.USBErrorBusy:
+        return False
+    return True
+
+
 class SteamController(object):
 
-    def __init__(self, callback, callback_args=None, keep_alive=False):
+    def __init__(self, callback, callback_args=None, keep_alive=False, transfers=TRANSFERS,
+                 ctx=None, slot=None):
         """
         Constructor
 
@@ -118,122 +180,180 @@ class SteamController(object):
 
         callback_args: Optional arguments passed to the callback afer the
         SteamControllerInput argument
+
+        transfers: number of interrupt transfers kept in flight, reports keep
+        being received while the callback is running
+
+        ctx, slot: shared libusb context and claimed slot, used by
+        SteamControllerManager to drive several controllers
+
+        connected, battery and voltage attributes are kept up to date from
+        hotplug (wireless only) and idle reports, connected is False once the
+        device is closed by run() and the callback is then given the last
+        report again
+
+        timestamp is the monotonic arrival time of the input report given to
+        the callback, reports delivered in a batch keep their own time
         """
         self._handle = None
+        self._slot = slot
         self._cb = callback
         self._cb_args = callback_args
-        self._cmsg = []
-        self._ctx = usb1.USBContext()
+        self._cmsg = ControlScheduler()
+        self._ctrl_free = []
+        self._ctrl_inflight = []
+        self._ctrl_failed = 0
+        self._loop_thread = None
+        self._woken = False
+        self._ctx = ctx if ctx is not None else usb1.USBContext()
         self._transfer_list = []
+        self._transfers = max(1, transfers)
+        self._pending = []
+        self._pending_times = []
+        self._pending_other = False
+        self._seq = None
+        self._stats = LinkStats()
+        self._capture = None
+        self._timed = False
+        self._deadline = None
+        self._timers = []
+        self._tup = None
+        self._lastusb = monotonic()
         self.keep_alive = keep_alive
+        self.timestamp = None
+        self.connected = None
+        self.battery = None
+        self.voltage = None
+        self._serial = None
+        self._serial_due = False
+        self._gyro = False
+        self._released = False
+        self._wakeup = Event()
+        self._hotplug_handle = None
+        self._arrived = False
+        self._departed = False
         try:
             self._open()
         except (usb1.USBError, ValueError):
-            if not keep_alive:
+            # The manager serving a slot decides what to do with it
+            if not keep_alive or slot is not None:
                 raise
 
     def _open(self):
-        handle = []
-        pid = []
-        endpoint = []
-        ccidx = []
-        for i in range(len(PRODUCT_ID)):
-            _pid = PRODUCT_ID[i]
-            _endpoint = ENDPOINT[i]
-            _ccidx = CONTROLIDX[i]
-
-            _handle = self._ctx.openByVendorIDAndProductID(
-                VENDOR_ID, _pid,
-                skip_on_error=True,
-            )
-            if _handle is not None:
-                handle.append(_handle)
-                pid.append(_pid)
-                endpoint.append(_endpoint)
-                ccidx.append(_ccidx)
-
-        if not handle:
-            raise ValueError('No SteamController Device found')
-
-        claimed = False
-        for i in range(len(handle)):
-            self._ccidx = ccidx[i]
-            self._handle = handle[i]
-            self._pid = pid[i]
-            self._endpoint = endpoint[i]
-            dev = handle[i].getDevice()
-            cfg = dev[0]
-
-            try:
-                for inter in cfg:
-                    for setting in inter:
-                        number = setting.getNumber()
-                        if self._handle.kernelDriverActive(number):
-                            self._handle.detachKernelDriver(number)
-                        if (setting.getClass() == 3 and
-                            setting.getSubClass() == 0 and
-                            setting.getProtocol() == 0 and
-                            number == i+1):
-                            self._handle.claimInterface(number)
-                            self._number = number
-                            claimed = True
-            except usb1.USBErrorBusy:
-                claimed = False
-
-            if claimed:
-                break
-
-        if not claimed:
-            raise ValueError('All SteamController are busy')
+        if self._slot is not None:
+            slot = self._slot
+        else:
+            slots = openSlots(self._ctx)
+            if not slots:
+                raise ValueError('No SteamController Device found')
+
+            slot = None
+            for candidate in slots:
+                if claimSlot(candidate):
+                    slot = candidate
+                    break
+            for handle in set(x.handle for x in slots):
+                if slot is None or handle is not slot.handle:
+                    handle.close()
+
+            if slot is None:
+                raise ValueError('All SteamController are busy')
+
+        self._handle = slot.handle
+        self._departed = False
+        self.connected = None
+        self._pid = slot.pid
+        self._number = slot.number
+        self._ccidx = slot.number
+        self._endpoint = slot.endpoint
 
         self._transfer_list = []
-        transfer = self._handle.getTransfer()
-        transfer.setInterrupt(
-            usb1.ENDPOINT_IN | self._endpoint,
-            64,
-            callback=self._processReceivedData,
-        )
-        transfer.submit()
-        self._transfer_list.append(transfer)
-
-        self._period = LPERIOD
+        try:
+            self._start()
+        except usb1.USBError:
+            # Not left half opened, ie unplugged meanwhile
+            for transfer in self._transfer_list:
+                try:
+                    transfer.cancel()
+                except usb1.USBError:
+                    pass
+            try:
+                self._close(turnoff=False)
+            except usb1.USBError:
+                pass
+            raise
+
+    def _start(self):
+        """Submit the interrupt transfers, reset the session and send the settings"""
+        for _ in range(self._transfers):
+            transfer = self._handle.getTransfer()
+            transfer.setInterrupt(
+                usb1.ENDPOINT_IN | self._endpoint,
+                REPORT_SIZE,
+                callback=self._processReceivedData,
+            )
+            transfer.submit()
+            self._transfer_list.append(transfer)
 
-        if self._pid == 0x1102:
-            self._timer = Timer(LPERIOD, self._callbackTimer)
-            self._timer.start()
-        else:
-            self._timer = None
+        # Wired controller only send reports on changes, last report is
+        # periodically sent again to the callback from the event loop
+        self._timed = self._pid == 0x1102
+        self._deadline = None
 
         self._tup = None
-        self._lastusb = time()
-
-        # Disable Haptic auto feedback
-
-        self._ctx.handleEvents()
+        self._pending = []
+        self._pending_times = []
+        self._pending_other = False
+        self._seq = None
+        self._serial = None
+        self._serial_due = True
+        self._stats.resync()
+        self._cmsg.clear()
+        self._lastusb = monotonic()
+
+        # Disable Haptic auto feedback, events are only polled here as a
+        # dongle slot without paired controller would block handleEvents()
+
+        self._ctx.handleEventsTimeout(tv=0)
         self._sendControl(pack('>' + 'I' * 1,
                                0x81000000))
-        self._ctx.handleEvents()
-        self._sendControl(pack('>' + 'I' * 6,
-                               0x87153284,
-                               0x03180000,
-                               0x31020008,
-                               0x07000707,
-                               0x00300000,
-                               0x2f010000))
-        self._ctx.handleEvents()
-
-    def _close(self):
+        self._ctx.handleEventsTimeout(tv=0)
+        self._sendControl(settingsCmd(self._gyro))
+        self._ctx.handleEventsTimeout(tv=0)
+
+    def _close(self, turnoff=True):
+        for transfer in self._ctrl_inflight:
+            try:
+                transfer.cancel()
+            except usb1.USBError:
+                pass
+        self._ctrl_inflight = []
+        self._ctrl_free = []
         if self._handle:
-            self._sendControl(EXITCMD)
-            self._handle.releaseInterface(self._number)
-            self._handle.resetDevice()
-            self._handle.close()
-            self._handle = None
+            try:
+                if turnoff:
+                    self._sendControl(EXITCMD)
+                self._handle.releaseInterface(self._number)
+            finally:
+                # Shared handles are closed by their owner, an unplugged
+                # device handle is closed too
+                try:
+                    if self._slot is None:
+                        try:
+                            self._handle.resetDevice()
+                        finally:
+                            self._handle.close()
+                finally:
+                    self._handle = None
+        self._deadline = None
 
     def __del__(self):
-        self._close()
+        # Nothing to close if the constructor failed before opening
+        if getattr(self, '_handle', None) is not None:
+            self._close()
 
-    def _sendControl(self, data, timeout=0):
+    def _sendControl(self, data, timeout=CONTROL_TIMEOUT):
+        """Synchronous control message write, timeout in ms"""
         zeros = b'\x00' * (64 - len(data))
 
         self._handle.controlWrite(request_type=0x21,
@@ -243,95 +363,472 @@ class SteamController(object):
                                   data=data + zeros,
                                   timeout=timeout)
 
+    @property
+    def serial(self):
+        """
+        Serial number of the connected controller, read by the event loop
+        before its first report is given to the callback, None if unknown
+        """
+        return self._serial
+
+    def readSerial(self):
+        """
+        Return the controller serial number, None when it cannot be read (ie
+        no controller paired to a wireless dongle slot)
+
+        The answer is cached until the controller reconnects. Synchronous, must
+        not be called from a transfer callback.
+        """
+        if self._serial is None and self._handle is not None:
+            try:
+                self._sendControl(SERIALCMD)
+                data = bytes(self._handle.controlRead(request_type=0xa1,
+                                                      request=0x01,
+                                                      value=0x0300,
+                                                      index=self._ccidx,
+                                                      length=64,
+                                                      timeout=CONTROL_TIMEOUT))
+            except usb1.USBError:
+                return None
+            serial = data[3:].split(b'\x00')[0] if data[:1] == SERIALCMD[:1] else b''
+            if serial:
+                self._serial = serial.decode('ascii', 'replace')
+        return self._serial
+
+    def _submitControl(self, data, callback=None, timeout=CONTROL_TIMEOUT):
+        """
+        Submit a control message as an asynchronous transfer
+
+        @param bytes data       control message (padded to 64 bytes)
+        @param callback         called with the transfer status on completion
+        @param int timeout      timeout in ms
+        """
+        if self._ctrl_free:
+            transfer = self._ctrl_free.pop()
+        else:
+            transfer = self._handle.getTransfer()
+
+        def _done(transfer):
+            # Transfers cancelled by _close are already forgotten
+            if transfer not in self._ctrl_inflight:
+                return
+            self._ctrl_inflight.remove(transfer)
+            self._ctrl_free.append(transfer)
+            status = transfer.getStatus()
+            if status != usb1.TRANSFER_COMPLETED:
+                self._ctrl_failed += 1
+            if callback is not None:
+                callback(status)
+
+        transfer.setControl(0x21, 0x09, 0x0300, self._ccidx,
+                            data + b'\x00' * (64 - len(data)),
+                            callback=_done, timeout=timeout)
+        transfer.submit()
+        self._ctrl_inflight.append(transfer)
+
+    def _sendPending(self):
+        """
+        Submit queued control messages allowed by the scheduler
+
+        @return bool            False if an exit is requested and keep_alive is not set
+        """
+        while len(self._ctrl_inflight) < CONTROL_INFLIGHT:
+            cmsg = self._cmsg.pop()
+            if cmsg is None:
+                break
+            if cmsg == EXITCMD and not self.keep_alive:
+                return False
+            self._submitControl(cmsg)
+        return True
+
+    def _interrupt(self):
+        """Wake up the event loop when a message is queued from another thread"""
+        if self._loop_thread is None or self._loop_thread == get_ident():
+            return
+        self._woken = True
+        try:
+            self._ctx.interruptEventHandler()
+        except (AttributeError, usb1.USBError):
+            pass
+
     def addExit(self):
-        self._cmsg.insert(0, EXITCMD)
+        self._cmsg.push(EXITCMD, Priority.EXIT, key=EXITCMD)
+        self._interrupt()
 
     def addFeedback(self, position, amplitude=128, period=0, count=1):
         """
-        Add haptic feedback to be sent on next usb tick
+        Add haptic feedback to be sent on next usb tick, a pending feedback
+        on the same position is replaced
 
         @param int position     haptic to use 1 for left 0 for right
         @param int amplitude    signal amplitude from 0 to 65535
         @param int period       signal period from 0 to 65535
         @param int count        number of period to play
         """
-        self._cmsg.insert(0, pack('<BBBHHH', 0x8f, 0x07, position, amplitude, period, count))
+        self._cmsg.push(pack('<BBBHHH', 0x8f, 0x07, position, amplitude, period, count),
+                        Priority.HAPTIC, key=('haptic', position))
+        self._interrupt()
+
+    def release(self):
+        """
+        Give the controller back, ie to the Steam client: run() closes the
+        device without turning the controller off and returns. Can be called
+        from any thread.
+        """
+        self._released = True
+        self._wakeup.set()
+        self._interrupt()
+
+    def setGyro(self, enabled=True):
+        """
+        Enable or disable the gyro and quaternion fields of the input reports,
+        the setting is sent again when the controller is reopened
+
+        @param bool enabled     gyro enabled
+        """
+        enabled = bool(enabled)
+        if enabled == self._gyro:
+            return
+        self._gyro = enabled
+        self._cmsg.push(settingsCmd(enabled), Priority.SETTINGS, key='settings')
+        self._interrupt()
+
+    def controlStats(self):
+        """
+        Return control messages statistics
+
+        @return dict            queue depth, sent, coalesced, dropped, failed and
+                                in flight counters
+        """
+        stats = self._cmsg.stats()
+        stats['failed'] = self._ctrl_failed
+        stats['inflight'] = len(self._ctrl_inflight)
+        return stats
 
     def _processReceivedData(self, transfer):
-        """Private USB async Rx function"""
+        """
+        Private USB async Rx function
+
+        The transfer is resubmitted as soon as the report is decoded, the
+        callback is called later by _flush
+        """
         if (transfer.getStatus() != usb1.TRANSFER_COMPLETED or
-            transfer.getActualLength() != 64):
+            transfer.getActualLength() != REPORT_SIZE):
             return
 
         data = transfer.getBuffer()
-        tup = SteamControllerInput._make(unpack('<' + ''.join(_FORMATS), data))
-        if tup.status == SCStatus.INPUT:
-            self._tup = tup
+        now = monotonic()
+        self._stats.report(data[2], now)
+        if self._capture is not None:
+            self._capture.write(data, now)
+        try:
+            tup = DECODERS[data[2]](data)
+        except KeyError:
+            tup = None
+        try:
+            transfer.submit()
+        except usb1.USBError:
+            # Device gone, isOpen() turns False once no transfer is left
+            pass
 
-        self._callback()
-        transfer.submit()
+        if tup is None:
+            self._pending_other = True
+            return
+
+        status = tup.status
+        if status == SCStatus.INPUT:
+            self._stats.sequence(tup.seq)
+            self._pending.append(tup)
+            self._pending_times.append(now)
+            return
+        elif status == SCStatus.HOTPLUG:
+            self.connected = tup.state == SCHotplug.CONNECTED
+            if self.connected:
+                # The last report was sent before the disconnection
+                self._tup = None
+                self._serial_due = True
+            self._seq = None
+            self._serial = None
+            self._stats.resync()
+        elif status == SCStatus.IDLE:
+            self.battery = tup.battery
+            self.voltage = tup.voltage
+        self._pending_other = True
+
+    def _flush(self):
+        """Call the callback for received reports, input reports are sorted by seq"""
+        pending = self._pending
+        if pending:
+            if self._serial_due:
+                # Once per connection, from the event loop and before the
+                # callback sees the controller (ie to load its calibration)
+                self._serial_due = False
+                self.readSerial()
+            times = self._pending_times
+            self._pending = []
+            self._pending_times = []
+            self._pending_other = False
+            if len(pending) > 1:
+                base = pending[0].seq if self._seq is None else self._seq
+                pending.sort(key=lambda tup: (tup.seq - base) & 0xffff)
+            # Arrival times stay in order when reports are sorted
+            for tup, now in zip(pending, times):
+                self._tup = tup
+                self.timestamp = now
+                self._callback()
+            self._seq = tup.seq
+        elif self._pending_other:
+            self._pending_other = False
+            self._callback()
 
     def _callback(self):
         if self._tup is None:
             return
 
-        self._lastusb = time()
+        self._lastusb = monotonic()
+        if self._timed:
+            self._deadline = self._lastusb + HPERIOD
+
+        self._emit()
 
+    def _emit(self):
+        start = monotonic()
         if isinstance(self._cb_args, (list, tuple)):
             self._cb(self, self._tup, *self._cb_args)
         else:
             self._cb(self, self._tup)
+        self._stats.callback(monotonic() - start)
 
-        self._period = HPERIOD
+    def linkStats(self):
+        """
+        Return USB link statistics
+
+        @return LinkStats       running statistics, see snapshot() and reset()
+        """
+        return self._stats
 
-    def _callbackTimer(self):
-        d = time() - self._lastusb
-        self._timer.cancel()
+    def setCapture(self, capture):
+        """
+        Record every received raw report
 
-        if d > DURATION:
-            self._period = LPERIOD
+        @param CaptureWriter capture  capture file writer, None to stop recording
+        """
+        self._capture = capture
 
-        self._timer = Timer(self._period, self._callbackTimer)
-        self._timer.start()
+    def addTimer(self, timer):
+        """
+        Drive a timer from the event loop, ie the trackball inertia of a mouse
 
-        if self._tup is None:
-            return
+        @param timer            object with timeout(now) returning the time in s
+                                before its next tick or None when idle, and
+                                tick(now), now being the monotonic time
+        """
+        if timer not in self._timers:
+            self._timers.append(timer)
+
+    def removeTimer(self, timer):
+        """
+        Stop driving a timer added with addTimer
+        """
+        if timer in self._timers:
+            self._timers.remove(timer)
 
-        if d < HPERIOD:
+    def _timeout(self):
+        """
+        Return time in s before next timer tick or pending control message,
+        None if there is nothing to wait for
+        """
+        # A control transfer completion wakes up the loop when all are in flight
+        if len(self._ctrl_inflight) < CONTROL_INFLIGHT:
+            timeout = self._cmsg.timeout()
+        else:
+            timeout = None
+        if self._timers:
+            now = monotonic()
+            for timer in self._timers:
+                tick = timer.timeout(now)
+                if tick is not None and (timeout is None or tick < timeout):
+                    timeout = tick
+        if self._deadline is None:
+            return timeout
+        tick = max(0.0, self._deadline - monotonic())
+        return tick if timeout is None else min(tick, timeout)
+
+    def _tick(self):
+        """
+        Timer tick, called from the event loop
+
+        Last report is sent again every HPERIOD during DURATION after the last
+        usb report, then every LPERIOD while buttons are held (for long press
+        detection). The timer is disarmed otherwise so an idle controller
+        does not wake up the loop.
+
+        Timers added with addTimer are ticked first.
+        """
+        now = monotonic()
+        for timer in self._timers:
+            timer.tick(now)
+        if self._deadline is None or self._tup is None:
+            return
+        if now < self._deadline:
             return
 
-        if isinstance(self._cb_args, (list, tuple)):
-            self._cb(self, self._tup, *self._cb_args)
+        d = now - self._lastusb
+        if d <= DURATION:
+            self._deadline = now + HPERIOD
+        elif self._tup.buttons:
+            self._deadline = now + LPERIOD
         else:
-            self._cb(self, self._tup)
+            self._deadline = None
+
+        if d >= HPERIOD:
+            self._emit()
+
+    def _handleEvents(self):
+        """Wait for USB events or next timer tick and process them"""
+        # Reports may have been received outside of the loop (ie in _open)
+        self._flush()
+        self._loop_thread = get_ident()
+        timeout = self._timeout()
+        try:
+            if timeout is None:
+                self._ctx.handleEvents()
+            else:
+                self._ctx.handleEventsTimeout(tv=timeout)
+        except usb1.USBErrorInterrupted:
+            if not self._woken:
+                raise
+        self._woken = False
+        self._flush()
+        self._tick()
 
     def run(self):
         """Function to run in order to process USB events"""
         if self._handle or self.keep_alive:
             try:
                 while True:
-                    while any(x.isSubmitted() for x in self._transfer_list):
-                        self._ctx.handleEvents()
-                        if self._cmsg:
-                            cmsg = self._cmsg.pop()
-                            if cmsg == EXITCMD and not self.keep_alive:
-                                return
-                            self._sendControl(cmsg)
+                    while self.isOpen() and not self._released and not self._departed:
+                        self._handleEvents()
+                        if not self._sendPending():
+                            return
                     try:
-                        self._close()
+                        self._close(turnoff=not self._released and not self._departed)
                     except usb1.USBError:
                         pass
-                    if not self.keep_alive:
+                    self._disconnect()
+                    if self._released or not self.keep_alive:
+                        return
+                    if not self._reconnect():
                         return
-                    sleep(2)
+            except usb1.USBErrorInterrupted:
+                pass
+
+    def _disconnect(self):
+        """
+        Let the callback see the controller gone: connected is False while the
+        last report is given again, ie EventMapper releases held keys
+        """
+        self.connected = False
+        if self._tup is not None:
+            self._emit()
+            self._tup = None
+
+    def _hotplug(self):
+        """
+        Register the hotplug callback on first call
+
+        @return bool            False if libusb has no hotplug support
+        """
+        if self._hotplug_handle is None:
+            self._hotplug_handle = False
+            try:
+                if self._ctx.hasCapability(usb1.CAP_HAS_HOTPLUG):
+                    self._hotplug_handle = self._ctx.hotplugRegisterCallback(
+                        self._hotplugEvent, vendor_id=VENDOR_ID)
+            except (AttributeError, usb1.USBError):
+                pass
+        return self._hotplug_handle is not False
+
+    def _hotplugEvent(self, ctx, device, event):
+        """libusb hotplug callback, devices can not be opened from here"""
+        if device.getProductID() not in INTERFACES:
+            return False
+        if event == usb1.HOTPLUG_EVENT_DEVICE_ARRIVED:
+            self._arrived = True
+        elif self._handle is None:
+            # Waiting for a controller, stop polling the one that left
+            self._departed = True
+        else:
+            current = self._handle.getDevice()
+            if (current.getBusNumber() == device.getBusNumber() and
+                    current.getDeviceAddress() == device.getDeviceAddress()):
+                self._departed = True
+        return False
+
+    def _reconnect(self):
+        """
+        Wait for a controller and open it, driven by hotplug arrivals, or by
+        polling every RECONNECT_POLL s without hotplug support or while a
+        plugged controller can not be opened (ie busy). An unplugged
+        controller costs nothing, the thread sleeps in libusb.
+
+        @return bool            False if released while waiting
+        """
+        if not self._hotplug():
+            while not self._released:
+                self._wakeup.wait(RECONNECT_POLL)
+                if self._released:
+                    break
+                try:
+                    self._open()
+                    return True
+                except (usb1.USBError, ValueError):
+                    pass
+            return False
+
+        self._loop_thread = get_ident()
+        # A controller still plugged (ie closed on error) or busy after its
+        # arrival sends no other arrival: poll it until it can be opened
+        poll = not self._departed
+        while not self._released:
+            if self._arrived:
+                self._arrived = False
+                for delay in ARRIVAL_RETRY:
                     try:
                         self._open()
+                        return True
                     except (usb1.USBError, ValueError):
-                        pass
+                        self._wakeup.wait(delay)
+                        if self._released:
+                            return False
+                self._departed = False
+                poll = True
+                continue
+            if self._departed:
+                poll = False
+            try:
+                if poll:
+                    self._ctx.handleEventsTimeout(tv=RECONNECT_POLL)
+                else:
+                    self._ctx.handleEvents()
             except usb1.USBErrorInterrupted:
-                pass
+                if not self._woken:
+                    raise
+            self._woken = False
+            if poll and not self._arrived and not self._released and not self._departed:
+                try:
+                    self._open()
+                    return True
+                except (usb1.USBError, ValueError):
+                    pass
+        return False
+
+    def isOpen(self):
+        """Return True while interrupt transfers are submitted"""
+        return any(x.isSubmitted() for x in self._transfer_list)
 
     def handleEvents(self):
         """Function to run in order to handle USB events"""
         if self._handle and self._ctx:
-            self._ctx.handleEvents()
+            self._handleEvents()
+            self._sendPending()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""asyncio integration of SteamController"""
+
+import asyncio
+import select
+from collections import deque
+from struct import pack
+
+from steamcontroller import SteamController, TRANSFERS, CONTROL_TIMEOUT
+from steamcontroller.tools import LazyModule
+
+usb1 = LazyModule('usb1')
+
+
+# Maximum number of reports kept when nobody reads them
+QUEUE_SIZE = 256
+
+
+class AsyncSteamController(SteamController):
+    """
+    SteamController driven by an asyncio event loop
+
+    libusb file descriptors are registered in the running loop, so several
+    controllers and any other I/O can be served by a single thread:
+
+        sc = AsyncSteamController()
+        async for sci in sc.reports():
+            ...
+
+    A callback can still be given, it is called for each report as with
+    SteamController. It is built from a coroutine, or given the loop that
+    drives it. addFeedback(), addExit() and release() can be called from any
+    thread.
+    """
+
+    def __init__(self, callback=None, callback_args=None, transfers=TRANSFERS,
+                 queue_size=QUEUE_SIZE, loop=None, ctx=None):
+        self._queue = deque(maxlen=queue_size)
+        self._waiter = None
+        self._done = False
+        self._user_cb = callback
+        self._user_cb_args = callback_args
+        self._loop = loop if loop is not None else asyncio.get_running_loop()
+        self._readers = set()
+        self._writers = set()
+        self._timer = None
+        super(AsyncSteamController, self).__init__(callback=self._enqueue, transfers=transfers,
+                                                   ctx=ctx)
+
+        for fd, events in self._ctx.getPollFDList():
+            self._addFD(fd, events, None)
+        self._ctx.setPollFDNotifiers(self._addFD, self._removeFD)
+        self._loop.call_soon(self._process)
+
+    def _enqueue(self, sc, sci):
+        if self._user_cb is not None:
+            if isinstance(self._user_cb_args, (list, tuple)):
+                self._user_cb(sc, sci, *self._user_cb_args)
+            else:
+                self._user_cb(sc, sci)
+        self._queue.append(sci)
+        self._wakeReader()
+
+    def _wakeReader(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _addFD(self, fd, events, _):
+        if events & select.POLLIN:
+            self._loop.add_reader(fd, self._process)
+            self._readers.add(fd)
+        if events & select.POLLOUT:
+            self._loop.add_writer(fd, self._process)
+            self._writers.add(fd)
+
+    def _removeFD(self, fd, _):
+        if fd in self._readers:
+            self._loop.remove_reader(fd)
+            self._readers.discard(fd)
+        if fd in self._writers:
+            self._loop.remove_writer(fd)
+            self._writers.discard(fd)
+
+    def _process(self):
+        """Handle ready USB events, timer ticks and queued control messages"""
+        if self._done:
+            return
+        if self._released:
+            self.close()
+            return
+        try:
+            self._ctx.handleEventsTimeout(tv=0)
+        except usb1.USBErrorInterrupted:
+            pass
+        self._flush()
+        self._tick()
+
+        if not self._sendPending():
+            self.close()
+            return
+
+        if not any(x.isSubmitted() for x in self._transfer_list):
+            self.close()
+            return
+        self._schedule()
+
+    def _schedule(self):
+        """Arm a loop timer for the next libusb or re-emit timeout"""
+        timeouts = [x for x in (self._ctx.getNextTimeout(), self._timeout()) if x is not None]
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if timeouts:
+            self._timer = self._loop.call_later(min(timeouts), self._process)
+
+    def _interrupt(self):
+        """Process queued control messages and release() from the loop thread"""
+        if not self._done:
+            self._loop.call_soon_threadsafe(self._process)
+
+    async def sendControl(self, data, timeout=CONTROL_TIMEOUT):
+        """
+        Send a control message without blocking the loop
+
+        @param bytes data       control message (padded to 64 bytes)
+        @param int timeout      timeout in ms
+        """
+        if self._handle is None:
+            raise ValueError('SteamController is closed')
+        future = self._loop.create_future()
+
+        def _done(status):
+            if future.done():
+                return
+            if status == usb1.TRANSFER_COMPLETED:
+                future.set_result(None)
+            else:
+                future.set_exception(usb1.USBError(status))
+
+        self._submitControl(data, callback=_done, timeout=timeout)
+        self._schedule()
+        await future
+
+    async def feedback(self, position, amplitude=128, period=0, count=1):
+        """
+        Play an haptic feedback, see SteamController.addFeedback
+        """
+        await self.sendControl(pack('<BBBHHH', 0x8f, 0x07, position, amplitude, period, count))
+
+    async def reports(self):
+        """Async iterator over input reports, ends when the controller is closed"""
+        while True:
+            while self._queue:
+                yield self._queue.popleft()
+            if self._done:
+                return
+            self._waiter = self._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+    def close(self):
+        """
+        Unregister from the loop and close the controller, it is turned off
+        unless release() was called
+        """
+        if self._done:
+            return
+        self._done = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for fd in list(self._readers | self._writers):
+            self._removeFD(fd, None)
+        self._ctx.setPollFDNotifiers(None, None)
+        try:
+            self._close(turnoff=not self._released)
+        except usb1.USBError:
+            pass
+        self._disconnect()
+        self._wakeReader()
+
+    def run(self):
+        raise RuntimeError('AsyncSteamController is driven by the asyncio loop, iterate reports() instead')
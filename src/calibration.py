@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Per controller calibration profiles"""
+
+import os
+import json
+import math
+
+
+# Rotational offset of the d-touch-pad, roughly 20.556 degrees
+PAD_ANGLE = -0.35877
+
+# Stick noise floor, the stick buttons hysteresis is four times the noise
+STICK_NOISE = 500
+
+DEFAULT = 'default'
+
+
+def configDir():
+    """Return the directory of calibration profiles"""
+    config = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+    return os.path.join(config, 'steamcontroller', 'calibration')
+
+
+class Calibration(object):
+    """
+    Correction constants of a controller, fitted by sc-calibrate.py from a
+    recorded session and stored as JSON by serial number
+
+    @param str serial           controller serial number, None for the default profile
+    @param float lpad_angle     rotation in rad of the left pad
+    @param float rpad_angle     rotation in rad of the right pad
+    @param tuple stick_center   (x, y) rest position of the stick
+    @param int stick_noise      stick noise amplitude around the center
+    @param tuple gyro_bias      (pitch, roll, yaw) gyro rates at rest
+    """
+
+    FIELDS = ('lpad_angle', 'rpad_angle', 'stick_center', 'stick_noise', 'gyro_bias')
+
+    def __init__(self, serial=None, lpad_angle=PAD_ANGLE, rpad_angle=PAD_ANGLE,
+                 stick_center=(0, 0), stick_noise=STICK_NOISE, gyro_bias=(0, 0, 0)):
+        self.serial = serial
+        self.lpad_angle = float(lpad_angle)
+        self.rpad_angle = float(rpad_angle)
+        self.stick_center = tuple(int(x) for x in stick_center)
+        self.stick_noise = int(stick_noise)
+        self.gyro_bias = tuple(float(x) for x in gyro_bias)
+
+    def padRotation(self, left):
+        """Return (cos, sin) of the pad rotation"""
+        angle = self.lpad_angle if left else self.rpad_angle
+        return math.cos(angle), math.sin(angle)
+
+    def stickHysteresis(self):
+        """Return the stick move in units needed to press or release a stick button"""
+        return max(500, min(4000, 4 * self.stick_noise))
+
+    def toDict(self):
+        out = dict((name, getattr(self, name)) for name in self.FIELDS)
+        out['serial'] = self.serial
+        return out
+
+    @classmethod
+    def fromDict(cls, data):
+        return cls(**dict((k, v) for k, v in data.items() if k in cls.FIELDS or k == 'serial'))
+
+    @staticmethod
+    def path(serial=None, directory=None):
+        """Return the profile file of a serial number"""
+        return os.path.join(directory or configDir(), '{}.json'.format(serial or DEFAULT))
+
+    def save(self, path=None):
+        """
+        Write the profile
+
+        @param str path         file, the profile of the serial in configDir() by default
+        """
+        if path is None:
+            path = self.path(self.serial)
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.toDict(), f, indent=2, sort_keys=True)
+        os.rename(tmp, path)
+
+    @classmethod
+    def load(cls, serial=None, directory=None):
+        """
+        Return the profile of a controller, falling back on the default
+        profile then on the built-in constants
+
+        @param str serial       controller serial number or None
+        @param str directory    profiles directory, configDir() by default
+        """
+        for name in (serial, None) if serial else (None,):
+            try:
+                with open(cls.path(name, directory)) as f:
+                    calibration = cls.fromDict(json.load(f))
+            except (IOError, OSError, ValueError, TypeError):
+                continue
+            calibration.serial = serial
+            return calibration
+        return cls(serial)
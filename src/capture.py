@@ -0,0 +1,409 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Capture of raw Steam Controller reports and replay transport
+
+A capture file is a fixed size header followed by fixed size records, each
+holding a timestamp in ns since the beginning of the capture and a raw 64
+bytes report. Records are only appended and sorted by time, so the file can
+be memory mapped and searched by time without a separate index.
+
+Replay is done by a fake libusb context given to SteamController, reports go
+through the normal _processReceivedData and callback path:
+
+    reader = CaptureReader('session.sccap')
+    sc = SteamController(callback, ctx=ReplayContext(reader, speed=1.0))
+    sc.run()
+"""
+
+import os
+import mmap
+from struct import Struct
+from time import monotonic, sleep, time
+
+from steamcontroller import VENDOR_ID
+from steamcontroller.decoder import REPORT_SIZE
+from steamcontroller.tools import LazyModule
+
+usb1 = LazyModule('usb1')
+
+
+MAGIC = b'SCCAP'
+VERSION = 1
+
+# magic, version, product id, record size, capture wall clock start time,
+# controller serial number (NUL padded, empty when unknown)
+_HEADER = Struct('<5sBHHd14s')
+# timestamp in ns, raw report
+_RECORD = Struct('<Q{:d}s'.format(REPORT_SIZE))
+
+# Layout for direct access to the records (ie numpy.memmap), the raw report
+# of a record follows its timestamp
+HEADER_SIZE = _HEADER.size
+RECORD_SIZE = _RECORD.size
+
+
+class CaptureWriter(object):
+    """
+    Append raw reports to a capture file
+
+    Give it to SteamController.setCapture() to record everything received
+    from the controller.
+    """
+
+    def __init__(self, path, pid=0x1102, serial=None):
+        """
+        Constructor
+
+        @param str path         capture file, appended to if it already exists
+        @param int pid          USB product id of the captured controller
+        @param str serial       serial number of the captured controller
+        """
+        self._offset = 0
+        if os.path.exists(path) and os.path.getsize(path) >= _HEADER.size:
+            with CaptureReader(path) as reader:
+                if len(reader):
+                    # Continue after the last record of previous captures
+                    self._offset = reader.timestamp(len(reader) - 1) + 0.001
+                count = len(reader)
+            self._file = open(path, 'r+b')
+            # Drop a partially written record
+            self._file.truncate(_HEADER.size + count * _RECORD.size)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(path, 'wb')
+            self._file.write(_HEADER.pack(MAGIC, VERSION, pid, _RECORD.size, time(),
+                                          (serial or '').encode('ascii')))
+        self._start = None
+        self.count = 0
+
+    def write(self, data, now=None):
+        """
+        Append a report
+
+        @param data             64 bytes raw report
+        @param float now        monotonic receive time, current time if None
+        """
+        if now is None:
+            now = monotonic()
+        if self._start is None:
+            self._start = now - self._offset
+        self._file.write(_RECORD.pack(int(round((now - self._start) * 1e9)), bytes(data)))
+        self.count += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CaptureReader(object):
+    """Memory mapped read access to a capture file"""
+
+    def __init__(self, path):
+        """
+        Constructor
+
+        @param str path         capture file
+
+        Raise ValueError if the file is not a capture
+        """
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise ValueError('{}: not a Steam Controller capture'.format(path))
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.pid, record, self.start, serial = _HEADER.unpack_from(self._map)
+        self.serial = serial.rstrip(b'\x00').decode('ascii', 'replace') or None
+        if magic != MAGIC or version != VERSION or record != _RECORD.size:
+            self._map.close()
+            raise ValueError('{}: not a Steam Controller capture'.format(path))
+        self._count = (size - _HEADER.size) // _RECORD.size
+
+    def __len__(self):
+        return self._count
+
+    def timestamp(self, index):
+        """Return the time in s of a record since the beginning of the capture"""
+        return _RECORD.unpack_from(self._map, _HEADER.size + index * _RECORD.size)[0] / 1e9
+
+    def __getitem__(self, index):
+        """
+        Return a record
+
+        @return (float, bytes)  timestamp in s and raw report
+        """
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('record index out of range')
+        offset = _HEADER.size + index * _RECORD.size
+        return (self.timestamp(index),
+                self._map[offset + _RECORD.size - REPORT_SIZE:offset + _RECORD.size])
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+    def find(self, t):
+        """
+        Return the index of the first record at or after a time
+
+        @param float t          time in s since the beginning of the capture
+        """
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamp(mid) < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def duration(self):
+        """Return the time in s of the last record"""
+        return self.timestamp(self._count - 1) if self._count else 0.0
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _ReplaySetting(object):
+    def __init__(self, number):
+        self._number = number
+
+    def getNumber(self):
+        return self._number
+
+
+class _ReplayTransfer(object):
+    def __init__(self, ctx):
+        self._ctx = ctx
+        self._callback = None
+        self._submitted = False
+        self._status = None
+        self._control = False
+        self._buffer = bytearray(REPORT_SIZE)
+        self._length = 0
+
+    def setInterrupt(self, endpoint, length, callback):
+        self._control = False
+        self._callback = callback
+
+    def setControl(self, request_type, request, value, index, buffer_or_len,
+                   callback=None, user_data=None, timeout=0):
+        self._control = True
+        self._callback = callback
+
+    def submit(self):
+        self._submitted = True
+        self._status = None
+        if self._control:
+            self._ctx._controls.append(self)
+        else:
+            self._ctx._submitted.append(self)
+
+    def cancel(self):
+        if self._submitted:
+            self._ctx._cancel(self)
+
+    def isSubmitted(self):
+        return self._submitted
+
+    def getStatus(self):
+        return self._status
+
+    def getActualLength(self):
+        return self._length
+
+    def getBuffer(self):
+        return memoryview(self._buffer)
+
+    def _complete(self, status, data=None):
+        self._submitted = False
+        self._status = status
+        if data is not None:
+            self._buffer[:] = data
+            self._length = len(data)
+        else:
+            self._length = 0
+        if self._callback is not None:
+            self._callback(self)
+
+
+class _ReplayHandle(object):
+    def __init__(self, ctx):
+        self._ctx = ctx
+        self._last = b''
+
+    def kernelDriverActive(self, number):
+        return False
+
+    def claimInterface(self, number):
+        pass
+
+    def releaseInterface(self, number):
+        pass
+
+    def resetDevice(self):
+        pass
+
+    def close(self):
+        pass
+
+    def getTransfer(self):
+        return _ReplayTransfer(self._ctx)
+
+    def controlWrite(self, request_type, request, value, index, data, timeout=0):
+        self._last = bytes(data)
+        return len(data)
+
+    def controlRead(self, request_type, request, value, index, length, timeout=0):
+        # Only the serial number request is answered, from the capture header
+        serial = self._ctx._reader.serial
+        if serial is None or self._last[:3] != b'\xae\x15\x01':
+            return bytes(length)
+        return (self._last[:3] + serial.encode('ascii')).ljust(length, b'\x00')[:length]
+
+
+class _ReplayDevice(object):
+    def __init__(self, ctx):
+        self._ctx = ctx
+
+    def __getitem__(self, index):
+        return [[_ReplaySetting(x)] for x in range(5)]
+
+    def getVendorID(self):
+        return VENDOR_ID
+
+    def getProductID(self):
+        return self._ctx._reader.pid
+
+    def open(self):
+        return _ReplayHandle(self._ctx)
+
+
+class ReplayContext(object):
+    """
+    Fake libusb context feeding captured reports to SteamController
+
+    Reports are delivered at their captured time scaled by speed, or as fast
+    as the controller resubmits its transfers when speed is 0. A report is
+    lost, as on the real bus, when no transfer is submitted at its time.
+    Transfers complete with TRANSFER_NO_DEVICE at the end of the capture.
+    """
+
+    def __init__(self, reader, speed=1.0, start=0.0):
+        """
+        Constructor
+
+        @param CaptureReader reader  capture to replay
+        @param float speed           time scale, 1.0 is real time, 0 is maximum speed
+        @param float start           replay from this time in s of the capture
+        """
+        self._reader = reader
+        self._speed = speed
+        self._index = reader.find(start)
+        self._origin = reader.timestamp(self._index) if self._index < len(reader) else 0.0
+        self._t0 = None
+        self._submitted = []
+        self._controls = []
+        self.lost = 0
+
+    def getDeviceIterator(self, skip_on_error=False):
+        if self._index >= len(self._reader):
+            return []
+        return [_ReplayDevice(self)]
+
+    def _cancel(self, transfer):
+        for queue in (self._submitted, self._controls):
+            if transfer in queue:
+                queue.remove(transfer)
+        transfer._complete(usb1.TRANSFER_CANCELLED)
+
+    def _due(self):
+        """Return the monotonic time of the next record"""
+        if self._t0 is None:
+            self._t0 = monotonic()
+        return self._t0 + (self._reader.timestamp(self._index) - self._origin) / self._speed
+
+    def handleEventsTimeout(self, tv=0):
+        self._handle(tv)
+
+    def handleEvents(self):
+        self._handle(None)
+
+    def _handle(self, tv):
+        ready = []
+        while self._controls:
+            ready.append((self._controls.pop(0), usb1.TRANSFER_COMPLETED, None))
+
+        reader = self._reader
+        if self._index >= len(reader):
+            while self._submitted:
+                ready.append((self._submitted.pop(0), usb1.TRANSFER_NO_DEVICE, None))
+        elif self._speed <= 0:
+            while self._submitted and self._index < len(reader):
+                ready.append((self._submitted.pop(0), usb1.TRANSFER_COMPLETED,
+                              reader[self._index][1]))
+                self._index += 1
+        else:
+            if not ready:
+                wait = self._due() - monotonic()
+                if tv is not None:
+                    wait = min(wait, tv)
+                if wait > 0:
+                    sleep(wait)
+            now = monotonic()
+            while self._index < len(reader) and self._due() <= now:
+                if self._submitted:
+                    ready.append((self._submitted.pop(0), usb1.TRANSFER_COMPLETED,
+                                  reader[self._index][1]))
+                else:
+                    self.lost += 1
+                self._index += 1
+
+        for transfer, status, data in ready:
+            transfer._complete(status, data)
+
+    def getNextTimeout(self):
+        return None
+
+    def interruptEventHandler(self):
+        pass
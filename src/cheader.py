@@ -22,164 +22,464 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+"""
+Minimal C preprocessor used to extract integer #define from kernel headers
+
+Comments and line continuations are removed with regular expressions, then
+only directives are processed: conditionals, #define (object and function
+like), #undef and #include. Include guards are detected so a guarded header
+is read once. Values are the macros that expand to integer constant
+expressions once the whole include tree is parsed, like with cpp -dM.
+"""
+
 import os
-import ast
+import re
 import sys
-import shlex
-import operator as op
+import json
+import hashlib
 from collections import OrderedDict
 
 
-OPERATORS = {
-    ast.Add    : op.add,
-    ast.Sub    : op.sub,
-    ast.Mult   : op.mul,
-    ast.Div    : op.floordiv,
-    ast.Mod    : op.mod,
-    ast.LShift : op.lshift,
-    ast.RShift : op.rshift,
-    ast.BitOr  : op.or_,
-    ast.BitXor : op.xor,
-    ast.BitAnd : op.and_,
-    ast.Invert : op.invert,
-    ast.Not    : op.not_,
-    ast.UAdd   : op.pos,
-    ast.USub   : op.neg,
-    ast.And    : op.and_,
-    ast.Or     : op.or_,
-    ast.Eq     : op.eq,
-    ast.NotEq  : op.ne,
-    ast.Lt     : op.lt,
-    ast.LtE    : op.le,
-    ast.Gt     : op.gt,
-    ast.GtE    : op.ge,
+# Bump when the parser changes to invalidate cached results
+CACHE_VERSION = 2
+
+_COMMENTS = re.compile(r'//[^\n]*|/\*.*?\*/|("(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')', re.S)
+_DIRECTIVE = re.compile(r'^[ \t]*#[ \t]*(\w*)[ \t]*(.*)$', re.M)
+_TOKENS = re.compile(r'0[xX][0-9a-fA-F]+\w*|\d+\w*|[A-Za-z_]\w*|"(?:\\.|[^"\\])*"|'
+                     r"'(?:\\.|[^'\\])*'|##|<<|>>|<=|>=|==|!=|&&|\|\||\.\.\.|\S")
+_MACRO = re.compile(r'([A-Za-z_]\w*)(\(([^)]*)\))?')
+_INCLUDE = re.compile(r'[<"]([^>"]+)[>"]')
+_NUMBER = re.compile(r'(0[xX][0-9a-fA-F]+|0[0-7]*|[1-9]\d*)[uUlL]*$')
+
+# Binary operators precedence, ternary is handled apart with lowest priority
+_BINARY = {
+    '||': 1, '&&': 2, '|': 3, '^': 4, '&': 5,
+    '==': 6, '!=': 6, '<': 7, '<=': 7, '>': 7, '>=': 7,
+    '<<': 8, '>>': 8, '+': 9, '-': 9, '*': 10, '/': 10, '%': 10,
 }
 
 
-def eval_expr(expr):
-    """Eval and expression inside a #define using a support of Python grammar"""
-    def _eval(node):
-        if isinstance(node, ast.Num):
-            return node.n
-        if isinstance(node, ast.BinOp):
-            return OPERATORS[type(node.op)](_eval(node.left), _eval(node.right))
-        if isinstance(node, ast.UnaryOp):
-            return OPERATORS[type(node.op)](_eval(node.operand))
-        if isinstance(node, ast.BoolOp):
-            values = [_eval(x) for x in node.values]
-            return OPERATORS[type(node.op)](**values)
-        raise TypeError(node)
-
-    return _eval(ast.parse(expr, mode='eval').body)
-
-
-def defines(base, include):
-    """Extract #define from base/include following #includes"""
-    parsed = set()
-    filename = os.path.normpath(os.path.abspath(os.path.join(base, include)))
-    parsed.add(filename)
-
-    lexer = shlex.shlex(open(filename), posix=True)
-
-    lexer.whitespace = ' \t\r'
-    lexer.commenters = ''
-    lexer.quotes = '"'
-
-    out = OrderedDict()
-
-    def parse_c_comments(lexer, tok, ntok):
-        if tok != '/' or ntok != '*':
-            return False
-        quotes = lexer.quotes
-        lexer.quotes = ''
+def _div(a, b):
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
+_APPLY = {
+    '||': lambda a, b: int(bool(a) or bool(b)),
+    '&&': lambda a, b: int(bool(a) and bool(b)),
+    '|': lambda a, b: a | b,
+    '^': lambda a, b: a ^ b,
+    '&': lambda a, b: a & b,
+    '==': lambda a, b: int(a == b),
+    '!=': lambda a, b: int(a != b),
+    '<': lambda a, b: int(a < b),
+    '<=': lambda a, b: int(a <= b),
+    '>': lambda a, b: int(a > b),
+    '>=': lambda a, b: int(a >= b),
+    '<<': lambda a, b: a << b,
+    '>>': lambda a, b: a >> b,
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': _div,
+    '%': lambda a, b: a - _div(a, b) * b,
+}
+
+
+def tokenize(text):
+    """Split a C source line into tokens"""
+    return _TOKENS.findall(text)
+
+
+def eval_tokens(tokens):
+    """
+    Evaluate an integer constant expression given as C tokens
+
+    Raise ValueError if the expression is not an integer constant one
+    """
+    pos = [0]
+
+    def _peek():
+        return tokens[pos[0]] if pos[0] < len(tokens) else None
+
+    def _next():
+        tok = _peek()
+        if tok is None:
+            raise ValueError('unexpected end of expression')
+        pos[0] += 1
+        return tok
+
+    def _unary():
+        tok = _next()
+        if tok == '(':
+            val = _ternary()
+            if _next() != ')':
+                raise ValueError('missing )')
+            return val
+        if tok == '-':
+            return -_unary()
+        if tok == '+':
+            return _unary()
+        if tok == '~':
+            return ~_unary()
+        if tok == '!':
+            return int(not _unary())
+        match = _NUMBER.match(tok)
+        if match:
+            num = match.group(1)
+            if num.startswith(('0x', '0X')):
+                return int(num, 16)
+            return int(num, 8) if num.startswith('0') else int(num)
+        if len(tok) == 3 and tok[0] == tok[2] == "'":
+            return ord(tok[1])
+        raise ValueError('unexpected token {}'.format(tok))
+
+    def _binary(level):
+        left = _unary()
         while True:
-            tok = lexer.get_token()
-            ntok = lexer.get_token()
-            if tok == '*' and ntok == '/':
-                lexer.quotes = quotes
-                break
-            lexer.push_token(ntok)
-        return True
-
-    def parse_cpp_comments(lexer, tok, ntok):
-        if tok != '/' or ntok != '/':
+            op = _peek()
+            prec = _BINARY.get(op)
+            if prec is None or prec < level:
+                return left
+            pos[0] += 1
+            left = _APPLY[op](left, _binary(prec + 1))
+
+    def _ternary():
+        cond = _binary(1)
+        if _peek() != '?':
+            return cond
+        pos[0] += 1
+        a = _ternary()
+        if _next() != ':':
+            raise ValueError('missing :')
+        b = _ternary()
+        return a if cond else b
+
+    try:
+        val = _ternary()
+    except ZeroDivisionError:
+        raise ValueError('division by zero')
+    if pos[0] != len(tokens):
+        raise ValueError('trailing tokens')
+    return val
+
+
+def eval_expr(expr):
+    """Eval an expression inside a #define"""
+    return eval_tokens(tokenize(expr))
+
+
+class Preprocessor(object):
+    """
+    Process directives of a header and of its includes
+
+    @param list paths       include directories
+    """
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self.macros = OrderedDict()
+        self.files = []
+        self._guards = {}
+        self._once = set()
+
+    def _find(self, name, current, quoted):
+        dirs = self.paths
+        if quoted:
+            dirs = [os.path.dirname(current)] + dirs
+        for d in dirs:
+            filename = os.path.normpath(os.path.abspath(os.path.join(d, name)))
+            if os.path.isfile(filename):
+                return filename
+        return None
+
+    def _args(self, tokens, i):
+        """Collect function like macro arguments starting after the ("""
+        args = [[]]
+        depth = 0
+        while i < len(tokens):
+            tok = tokens[i]
+            i += 1
+            if tok == '(':
+                depth += 1
+            elif tok == ')':
+                if not depth:
+                    return args, i
+                depth -= 1
+            elif tok == ',' and not depth:
+                args.append([])
+                continue
+            args[-1].append(tok)
+        return None, i
+
+    def _substitute(self, params, body, args, disabled):
+        if params and params[-1] == '...':
+            params = params[:-1] + ['__VA_ARGS__']
+            rest = args[len(params) - 1:]
+            args = args[:len(params) - 1] + [sum([x + [','] for x in rest], [])[:-1]]
+        if len(args) != len(params) and not (not params and args == [[]]):
+            raise ValueError('wrong number of macro arguments')
+        out = []
+        j = 0
+        while j < len(body):
+            tok = body[j]
+            if tok == '#' and j + 1 < len(body) and body[j + 1] in params:
+                out.append('"{}"'.format(' '.join(args[params.index(body[j + 1])])))
+                j += 2
+                continue
+            if tok in params:
+                arg = args[params.index(tok)]
+                # ## operands are not macro expanded
+                if (j + 1 < len(body) and body[j + 1] == '##') or (out and out[-1] == '##'):
+                    out.extend(arg)
+                else:
+                    out.extend(self.expand(arg, disabled))
+            else:
+                out.append(tok)
+            j += 1
+        while '##' in out:
+            k = out.index('##')
+            if 0 < k < len(out) - 1:
+                out[k - 1:k + 2] = [out[k - 1] + out[k + 1]]
+            else:
+                del out[k]
+        return out
+
+    def expand(self, tokens, disabled=frozenset()):
+        """Return tokens with macros expanded"""
+        out = []
+        i = 0
+        while i < len(tokens):
+            tok = tokens[i]
+            macro = self.macros.get(tok)
+            if macro is None or tok in disabled:
+                out.append(tok)
+                i += 1
+                continue
+            params, body = macro
+            if params is None:
+                out.extend(self.expand(body, disabled | {tok}))
+                i += 1
+                continue
+            if i + 1 >= len(tokens) or tokens[i + 1] != '(':
+                out.append(tok)
+                i += 1
+                continue
+            args, i = self._args(tokens, i + 2)
+            if args is None:
+                raise ValueError('unterminated macro call')
+            out.extend(self.expand(self._substitute(params, body, args, disabled), disabled | {tok}))
+        return out
+
+    def _condition(self, text):
+        tokens = tokenize(text)
+        out = []
+        i = 0
+        while i < len(tokens):
+            if tokens[i] == 'defined':
+                if i + 1 < len(tokens) and tokens[i + 1] == '(':
+                    name = tokens[i + 2] if i + 2 < len(tokens) else ''
+                    i += 4
+                else:
+                    name = tokens[i + 1] if i + 1 < len(tokens) else ''
+                    i += 2
+                out.append('1' if name in self.macros else '0')
+            else:
+                out.append(tokens[i])
+                i += 1
+        out = ['0' if re.match(r'[A-Za-z_]', x) else x for x in self.expand(out)]
+        try:
+            return bool(eval_tokens(out))
+        except ValueError:
             return False
-        quotes = lexer.quotes
-        lexer.quotes = ''
-        while True:
-            tok = lexer.get_token()
-            if tok == '\n':
-                lexer.quotes = quotes
-                lexer.push_token(tok)
-                break
-        return True
-
-    while True:
-        tok = lexer.get_token()
-        if not tok:
-            break
-        ntok = lexer.get_token()
-
-        if parse_c_comments(lexer, tok, ntok):
-            continue
-        if parse_cpp_comments(lexer, tok, ntok):
-            continue
-
-        if tok != '\n' or ntok != '#':
-            lexer.push_token(ntok)
-            continue
-
-        tok = lexer.get_token()
-        if tok == 'define':
-            name = lexer.get_token()
-            expr = ''
-            while True:
-                tok = lexer.get_token()
-                ntok = lexer.get_token()
-
-                if parse_c_comments(lexer, tok, ntok):
-                    continue
-                if parse_cpp_comments(lexer, tok, ntok):
+
+    def define(self, text):
+        match = _MACRO.match(text)
+        if not match:
+            return
+        name = match.group(1)
+        if match.group(2) is not None:
+            params = [x.strip() for x in match.group(3).split(',') if x.strip()]
+            body = text[match.end():]
+        else:
+            params = None
+            body = text[match.end(1):]
+        self.macros.pop(name, None)
+        self.macros[name] = (params, tokenize(body))
+
+    def include(self, filename):
+        """Process a header file"""
+        guard = self._guards.get(filename)
+        if filename in self._once or (guard is not None and guard in self.macros):
+            return
+        if filename not in self.files:
+            self.files.append(filename)
+        with open(filename) as f:
+            text = f.read()
+        text = _COMMENTS.sub(lambda m: m.group(1) or ' ', text.replace('\\\n', ''))
+
+        # Stack of (active, taken) conditional states
+        stack = []
+        active = True
+        first = []
+        closed = None
+        count = 0
+        for match in _DIRECTIVE.finditer(text):
+            directive, arg = match.group(1), match.group(2).strip()
+            count += 1
+            if len(first) < 2:
+                first.append((directive, arg.split()[0] if arg else ''))
+
+            if directive in ('if', 'ifdef', 'ifndef'):
+                stack.append((active, False))
+                if active:
+                    if directive == 'if':
+                        cond = self._condition(arg)
+                    else:
+                        cond = (arg.split()[0] in self.macros) == (directive == 'ifdef')
+                    active = cond
+                    stack[-1] = (stack[-1][0], cond)
+                continue
+            if directive in ('elif', 'else'):
+                if not stack:
                     continue
-                lexer.push_token(ntok)
+                parent, taken = stack[-1]
+                if not parent or taken:
+                    active = False
+                else:
+                    active = directive == 'else' or self._condition(arg)
+                    stack[-1] = (parent, active)
+                continue
+            if directive == 'endif':
+                if stack:
+                    active = stack.pop()[0]
+                    if not stack and closed is None:
+                        closed = count
+                continue
+            if not active:
+                continue
 
-                if not tok:
-                    break
-                if tok == '\n':
-                    lexer.push_token(tok)
-                    break
+            if directive == 'define':
+                self.define(arg)
+            elif directive == 'undef':
+                self.macros.pop(arg.split()[0] if arg else '', None)
+            elif directive == 'include':
+                match = _INCLUDE.match(arg)
+                if match:
+                    name = self._find(match.group(1), filename, arg.startswith('"'))
+                    if name is not None:
+                        self.include(name)
+            elif directive == 'pragma' and arg == 'once':
+                self._once.add(filename)
 
-                if tok in out:
-                    tok = str(out[tok])
-                expr = expr + tok
+        if (len(first) == 2 and first[0][0] == 'ifndef' and first[1] == ('define', first[0][1]) and
+                closed == count):
+            self._guards[filename] = first[0][1]
 
+    def values(self):
+        """Return integer values of object like macros"""
+        out = OrderedDict()
+        for name, (params, body) in self.macros.items():
+            if params is not None or not body:
+                continue
             try:
-                val = eval_expr(expr)
-                out[name] = val
-            except (SyntaxError, TypeError):
+                out[name] = eval_tokens(self.expand(body, frozenset([name])))
+            except (ValueError, RecursionError):
                 pass
-        elif tok == 'include':
-            tok = lexer.get_token()
-            if tok == '<':
-                name = ''
-                while True:
-                    tok = lexer.get_token()
-                    if tok == '>':
-                        break
-                    name = name + tok
-            else:
-                name = tok
-            filename = os.path.normpath(os.path.abspath(os.path.join(base, name)))
-            if os.path.isfile(filename) and filename not in parsed:
-                parsed.add(filename)
-                lexer.push_source(open(filename))
-        else:
-            lexer.push_token(tok)
+        return out
+
 
+def defines(base, include, files=None, predefined=None):
+    """
+    Extract integer #define from base/include following #includes
+
+    @param base             include directory or list of include directories
+    @param str include      header path relative to an include directory
+    @param list files       if given, parsed file names are appended to it
+    @param list predefined  macros defined before parsing, as #define
+                            arguments (ie 'NAME value' or 'F(x) x')
+    """
+    paths = [base] if isinstance(base, str) else list(base)
+    cpp = Preprocessor(paths)
+    for macro in predefined or []:
+        cpp.define(macro)
+    filename = cpp._find(include, paths[0], False)
+    if filename is None:
+        raise IOError('{}: header not found'.format(include))
+    cpp.include(filename)
+    if files is not None:
+        files.extend(cpp.files)
+    return cpp.values()
+
+
+def cacheDir():
+    """Return the directory of cached parsed headers"""
+    cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache, 'steamcontroller')
+
+
+def _stamp(filename):
+    st = os.stat(filename)
+    return [filename, st.st_mtime_ns, st.st_size]
+
+
+def cachedDefines(base, include, cache_dir=None):
+    """
+    Same as defines() but the result is cached on disk
+
+    The cache is keyed by the header path and checked against mtime and size
+    of every parsed file, it is silently skipped if it can not be written.
+
+    @param str cache_dir    cache directory, see cacheDir() by default
+    """
+    if cache_dir is None:
+        cache_dir = cacheDir()
+    path = os.path.join(cache_dir, 'defines-{}.json'.format(
+        hashlib.sha1(repr((base, include)).encode('utf-8')).hexdigest()[:16]))
+
+    try:
+        with open(path) as f:
+            cache = json.load(f, object_pairs_hook=OrderedDict)
+        if (cache['version'] == CACHE_VERSION and cache['files'] and
+                all(_stamp(x[0]) == x for x in cache['files'])):
+            return cache['defines']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    files = []
+    out = defines(base, include, files)
+
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        tmp = '{}.{:d}'.format(path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(OrderedDict([('version', CACHE_VERSION),
+                                   ('files', [_stamp(x) for x in files]),
+                                   ('defines', out)]), f)
+        os.rename(tmp, path)
+    except OSError:
+        pass
     return out
 
 
+def snapshot(defs, source):
+    """Return the source of a Python module holding defs as a DEFINES dict"""
+    lines = ['# Generated from {} by "python cheader.py -s", do not edit'.format(source),
+             '# Used when kernel headers are not installed',
+             '',
+             'from collections import OrderedDict',
+             '',
+             'DEFINES = OrderedDict([']
+    lines.extend('    ({!r}, {!r}),'.format(k, v) for k, v in defs.items())
+    lines.append('])')
+    return '\n'.join(lines) + '\n'
+
+
 if __name__ == '__main__':
-    definesDict = defines(sys.argv[1], sys.argv[2])
-    for k, v in definesDict.items():
-        print('{}:\t{}'.format(k, v))
+    if sys.argv[1] == '-s':
+        print(snapshot(defines(sys.argv[2], sys.argv[3]), sys.argv[3]), end='')
+    else:
+        definesDict = defines(sys.argv[1], sys.argv[2])
+        for k, v in definesDict.items():
+            print('{}:\t{}'.format(k, v))
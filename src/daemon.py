@@ -12,15 +12,21 @@ import signal
 import syslog
 import traceback
 
-import psutil
+from steamcontroller.watcher import SteamWatcher
 
 
 class Daemon(object):
     """A generic daemon class.
 
-    Usage: subclass the daemon class and override the run() method."""
-    def __init__(self, pidfile):
+    Usage: subclass the daemon class and override the run() method.
+
+    run() is only called while the Steam client is not running, controllers
+    given to serve() are released as soon as it starts."""
+    def __init__(self, pidfile, detector=None):
         self.pidfile = pidfile
+        self._detector = detector
+        self._watcher = None
+        self._served = None
 
     def daemonize(self):
         """Daemonize class. UNIX double fork mechanism."""
@@ -87,18 +93,58 @@ class Daemon(object):
         # Start the daemon
         self.daemonize()
         syslog.syslog(syslog.LOG_INFO, '{}: started'.format(os.path.basename(sys.argv[0])))
-        while True:
-            # Check if Steam is running
-            if not [p for p in psutil.process_iter() if p.name() == 'steam']:
+        # stop() sends SIGTERM: leave the loop so teardown() and atexit run
+        signal.signal(signal.SIGTERM, self._terminate)
+        self.setup()
+        try:
+            self._watcher = SteamWatcher(on_start=self._steamStarted, detector=self._detector)
+            self._watcher.start()
+            while True:
+                # Wait for the Steam client to exit
+                if self._watcher.running:
+                    syslog.syslog(syslog.LOG_INFO, '{}: steam client is running'.format(os.path.basename(sys.argv[0])))
+                    self._watcher.waitIdle()
                 try:
                     self.run()
                 except Exception as e:
                     syslog.syslog(syslog.LOG_ERR, '{}: {!s}'.format(os.path.basename(sys.argv[0]), e))
                     syslog.syslog(syslog.LOG_ERR, traceback.format_exc())
                     gc.collect()
-            else:
-                syslog.syslog(syslog.LOG_INFO, '{}: steam client is running'.format(os.path.basename(sys.argv[0])))
-            time.sleep(2)
+                if not self._watcher.running:
+                    # Back off after an error, keep_alive controllers wait for
+                    # hotplug arrivals themselves
+                    time.sleep(2)
+        finally:
+            self.teardown()
+
+    @staticmethod
+    def _terminate(signum, frame):
+        """SIGTERM handler, the next ones sent by stop() are ignored"""
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        sys.exit(0)
+
+    def _steamStarted(self, pid):
+        """Called from the watcher thread when the Steam client starts"""
+        served = self._served
+        if served is not None:
+            syslog.syslog(syslog.LOG_INFO, '{}: steam client started, releasing controller'.format(
+                os.path.basename(sys.argv[0])))
+            served.release()
+
+    def serve(self, sc):
+        """
+        Run a controller until it is gone or the Steam client starts
+
+        @param sc               SteamController or SteamControllerManager
+        """
+        self._served = sc
+        try:
+            # Steam may have started since run() was called
+            if self._watcher is not None and self._watcher.running:
+                sc.release()
+            sc.run()
+        finally:
+            self._served = None
 
     def stop(self):
         """Stop the daemon."""
@@ -134,6 +180,17 @@ class Daemon(object):
         self.stop()
         self.start()
 
+    def setup(self):
+        """Override this method to build what outlives run() calls, ie the
+        virtual devices. It is called once after the process has been
+        daemonized.
+        """
+
+    def teardown(self):
+        """Override this method to release what setup() built, ie destroy the
+        virtual devices. It is called once when the daemon stops.
+        """
+
     def run(self):
         """You should override this method when you subclass Daemon.
 
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Steam Controller USB report decoders"""
+
+from enum import IntEnum
+from struct import Struct
+from collections import namedtuple
+
+
+REPORT_SIZE = 64
+
+STEAM_CONTROLLER_FORMAT = [
+    ('x',   'ukn_00'),
+    ('x',   'ukn_01'),
+    ('B',   'status'),
+    ('x',   'ukn_02'),
+    ('H',   'seq'),
+    ('x',   'ukn_03'),
+    ('I',   'buttons'),
+    ('B',   'ltrig'),
+    ('B',   'rtrig'),
+    ('x',   'ukn_04'),
+    ('x',   'ukn_05'),
+    ('x',   'ukn_06'),
+    ('h',   'lpad_x'),
+    ('h',   'lpad_y'),
+    ('h',   'rpad_x'),
+    ('h',   'rpad_y'),
+    ('10x', 'ukn_07'),
+    ('h',   'gpitch'),
+    ('h',   'groll'),
+    ('h',   'gyaw'),
+    ('h',   'q1'),
+    ('h',   'q2'),
+    ('h',   'q3'),
+    ('h',   'q4'),
+    ('16x', 'ukn_08'),
+]
+
+# Hotplug report (wireless dongle only), byte 4 hold the connection state
+STEAM_CONTROLLER_HOTPLUG_FORMAT = [
+    ('x',   'ukn_00'),
+    ('x',   'ukn_01'),
+    ('B',   'status'),
+    ('x',   'ukn_02'),
+    ('B',   'state'),
+    ('59x', 'ukn_03'),
+]
+
+# Idle report, sent periodically when nothing moves, carry the battery state
+STEAM_CONTROLLER_IDLE_FORMAT = [
+    ('x',   'ukn_00'),
+    ('x',   'ukn_01'),
+    ('B',   'status'),
+    ('x',   'ukn_02'),
+    ('I',   'seq'),
+    ('4x',  'ukn_03'),
+    ('H',   'voltage'),
+    ('B',   'battery'),
+    ('49x', 'ukn_04'),
+]
+
+_FORMATS, _NAMES = zip(*STEAM_CONTROLLER_FORMAT)
+
+
+def _compile(fmt):
+    """Return a compiled Struct and the field names of a report format"""
+    formats, names = zip(*fmt)
+    return Struct('<' + ''.join(formats)), ' '.join([x for x in names if not x.startswith('ukn_')])
+
+
+_INPUT_STRUCT, _INPUT_FIELDS = _compile(STEAM_CONTROLLER_FORMAT)
+_HOTPLUG_STRUCT, _HOTPLUG_FIELDS = _compile(STEAM_CONTROLLER_HOTPLUG_FORMAT)
+_IDLE_STRUCT, _IDLE_FIELDS = _compile(STEAM_CONTROLLER_IDLE_FORMAT)
+
+SteamControllerInput = namedtuple('SteamControllerInput', _INPUT_FIELDS)
+SteamControllerHotplug = namedtuple('SteamControllerHotplug', _HOTPLUG_FIELDS)
+SteamControllerIdle = namedtuple('SteamControllerIdle', _IDLE_FIELDS)
+
+SCI_NULL = SteamControllerInput._make(_INPUT_STRUCT.unpack(b'\x00' * REPORT_SIZE))
+
+
+class SCStatus(IntEnum):
+    INPUT = 0x01
+    HOTPLUG = 0x03
+    IDLE = 0x04
+
+
+class SCHotplug(IntEnum):
+    """Connection state given by hotplug reports"""
+    DISCONNECTED = 0x01
+    CONNECTED = 0x02
+
+
+def _decoder(struct, cls):
+    """Build a decoder unpacking a report directly from the transfer buffer"""
+    unpack_from = struct.unpack_from
+    new = tuple.__new__
+
+    def _decode(data):
+        return new(cls, unpack_from(data))
+    return _decode
+
+
+decodeInput = _decoder(_INPUT_STRUCT, SteamControllerInput)
+decodeHotplug = _decoder(_HOTPLUG_STRUCT, SteamControllerHotplug)
+decodeIdle = _decoder(_IDLE_STRUCT, SteamControllerIdle)
+
+DECODERS = {
+    SCStatus.INPUT: decodeInput,
+    SCStatus.HOTPLUG: decodeHotplug,
+    SCStatus.IDLE: decodeIdle,
+}
+
+
+def decode(data):
+    """
+    Decode a raw report
+
+    @param data             64 bytes buffer (bytes, bytearray or memoryview)
+
+    @return namedtuple      typed report or None for unknown status
+    """
+    try:
+        return DECODERS[data[2]](data)
+    except KeyError:
+        return None
@@ -25,16 +25,22 @@
 """Event mapper class and enums used to map steamcontroller inputs to uinput events"""
 
 import math
-from time import time
+from time import time, monotonic
+from functools import partial
 from enum import IntEnum
-from collections import deque
 
 import steamcontroller.uinput as sui
+from steamcontroller.filters import MovingAverage
+from steamcontroller.calibration import Calibration
+from steamcontroller.gyro import Gyro, GyroAxes, SensitivityCurve
 from steamcontroller import SCStatus, SCButtons, SCI_NULL
 
 
 EXIT_PRESS_DURATION = 2.0
 
+# Stick range used by stick buttons
+STICK_MAX = 32000
+
 
 class Pos(IntEnum):
     """Specify which pad or trig is used"""
@@ -42,6 +48,33 @@ class Pos(IntEnum):
     LEFT = 1
 
 
+# Buttons and report fields of each Pos (RIGHT, LEFT), pad y follows pad x
+_STEAM = int(SCButtons.STEAM)
+_TOUCH = (int(SCButtons.RPADTOUCH), int(SCButtons.LPADTOUCH))
+_CLICK = (int(SCButtons.RPAD), int(SCButtons.LPAD))
+_PAD_X = (SCI_NULL._fields.index('rpad_x'), SCI_NULL._fields.index('lpad_x'))
+_TRIG = (SCI_NULL._fields.index('rtrig'), SCI_NULL._fields.index('ltrig'))
+
+# Default gyro sensitivities, mouse units by degree and deg/s giving a full
+# stick deflection, and speed in deg/s below which the output is tightened
+GYRO_MOUSE_SENS = 15.0
+GYRO_STICK_RATE = 360.0
+GYRO_TIGHTEN = 2.0
+
+
+def _clamp(val):
+    return -32768 if val < -32768 else 32767 if val > 32767 else val
+
+
+def _timestamp(sc):
+    """
+    Arrival time of the report being processed, reports delivered in a batch
+    are not spread over the callback time (see SteamController.timestamp)
+    """
+    now = getattr(sc, 'timestamp', None)
+    return monotonic() if now is None else now
+
+
 class PadModes(IntEnum):
     """Possible pads modes"""
     NOACTION = 0
@@ -66,18 +99,35 @@ class StickModes(IntEnum):
     BUTTON = 2
 
 
+class GyroModes(IntEnum):
+    """Possible gyro modes"""
+    NOACTION = 0
+    AXIS = 1
+    MOUSE = 2
+
+
 class EventMapper(object):
     """
     Event mapper class permit to configure events and provide the process event
     callback to be registered to a SteamController instance
 
+    The set* methods only record the configuration, it is compiled on the next
+    processed report into a dispatch plan holding the bound buttons and one
+    handler by configured pad, trigger and stick, so the cost of a report only
+    depends on what is bound.
+
     @param uinput_devices: Optional. Input devices to register. Defaults to
                            `(sui.Gamepad(), sui.Keyboard(), sui.Mouse())`
                             where `sui` is `steamcontroller.uinput`
     @type uinput_devices: Tuple or List of steamcontroller.uinput.UInput instances`
+
+    @param calibration: Optional. Correction constants of the controller, by
+                        default the profile of its serial number is loaded
+                        when the mapper is first called by a controller
+    @type calibration: steamcontroller.calibration.Calibration
     """
 
-    def __init__(self, uinput_devices=None):
+    def __init__(self, uinput_devices=None, calibration=None):
         if uinput_devices is None:
             self._uips = (sui.Gamepad(), sui.Keyboard(), sui.Mouse())
         else:
@@ -89,7 +139,8 @@ class EventMapper(object):
 
         self._pad_modes = [PadModes.NOACTION, PadModes.NOACTION]
         self._pad_dzones = [0, 0]
-        self._pad_evts = [[(None, 0)] * 4] * 2
+        self._pad_evts = [[], []]
+        self._pad_callbacks = [[], []]
         self._pad_revs = [False, False]
 
         self._trig_modes = [TrigModes.NOACTION, TrigModes.NOACTION]
@@ -101,11 +152,13 @@ class EventMapper(object):
 
         self._sci_prev = SCI_NULL
 
-        self._xdq = [deque(maxlen=8), deque(maxlen=8)]
-        self._ydq = [deque(maxlen=8), deque(maxlen=8)]
+        self._pad_filters = [MovingAverage(), MovingAverage()]
+        self._pad_smoothed = [False, False]
+        self._pad_out = [(0, 0), (0, 0)]
 
         self._onkeys = set()
         self._onabs = {}
+        self._syn = set()
 
         self._stick_tys = None
         self._stick_lxs = None
@@ -120,12 +173,29 @@ class EventMapper(object):
         self._moved = [0, 0]
         self._steam_pressed_time = 0.0
 
+        self._calibration = calibration or Calibration()
+        self._calibration_auto = calibration is None
+
+        self._gyro_mode = GyroModes.NOACTION
+        self._gyro = Gyro(self._calibration.gyro_bias)
+        self._gyro_evts = [(None, 0)] * 2
+        self._gyro_rev = False
+        self._gyro_enable = (0, False)
+
+        self._plan = None
+        self._sc = None
+
     def __del__(self):
         if hasattr(self, '_uip') and self._uips:
             for u in self._uips:
                 del u
             self._uips = []
 
+    @property
+    def devices(self):
+        """uinput devices of the mapper"""
+        return tuple(self._uips)
+
     def _get_uip_idx_by_keyManaged(self, key, fail=True):
         for idx, uip in enumerate(self._uips):
             if uip.keyManaged(key):
@@ -161,367 +231,514 @@ class EventMapper(object):
         if fail:
             raise RuntimeError('no uinput_device of class %s' % cls)
 
-    def process(self, sc, sci):
-        """
-        Process SteamController inputs to generate events
+    def _attach(self, sc):
+        """Let the controller event loop drive the timers of the uinput devices"""
+        self._sc = sc
+        if sc is not None:
+            if self._calibration_auto:
+                self._calibration = Calibration.load(sc.serial)
+                self._gyro.setBias(self._calibration.gyro_bias)
+            self._plan = None
+            for uip in self._uips:
+                for timer in uip.timers():
+                    sc.addTimer(timer)
 
-        @param SteamController sc       steamcontroller class used to get input
-        @param SteamControllerInput sci inputs from the steam controller
+    def _compile(self):
         """
-        if sci.status != SCStatus.INPUT:
-            return
-
-        sci_p = self._sci_prev
-        self._sci_prev = sci
+        Build the dispatch plan from the current configuration
 
-        _xor = sci_p.buttons ^ sci.buttons
-        btn_rem = _xor & sci_p.buttons
-        btn_add = _xor & sci.buttons
+        @return tuple   mask of the bound buttons, (mask, uip_idx, event) of each
+                        bound button and handlers called with (sc, sci, sci_p)
+        """
+        buttons = []
+        btn_mask = 0
+        for btn, (uip_idx, ev) in self._btn_map.items():
+            if uip_idx is None and not callable(ev):
+                continue
+            buttons.append((int(btn), uip_idx, ev))
+            btn_mask |= btn
 
+        handlers = []
         uip_mouse = self._get_uip_idx_by_instance(sui.Mouse, fail=False)
+        for pos in (Pos.LEFT, Pos.RIGHT):
+            mode = self._pad_modes[pos]
+            callbacks = tuple(self._pad_callbacks[pos])
+            averaged = True
+            if mode in (PadModes.MOUSE, PadModes.MOUSESCROLL) and uip_mouse is not None:
+                handlers.append(partial(self._padMouse, pos, self._uips[uip_mouse],
+                                        mode == PadModes.MOUSESCROLL))
+            elif mode == PadModes.AXIS:
+                (x_uip_idx, xev), (y_uip_idx, yev) = self._pad_evts[pos]
+                handlers.append(partial(self._padAxes, pos, x_uip_idx, xev, y_uip_idx, yev,
+                                        self._pad_revs[pos], self._pad_smoothed[pos]))
+            elif mode in (PadModes.BUTTONTOUCH, PadModes.BUTTONCLICK):
+                touch = _TOUCH[pos]
+                if mode == PadModes.BUTTONTOUCH:
+                    on_test, off_test = touch, touch
+                else:
+                    on_test, off_test = _CLICK[pos] | touch, _CLICK[pos]
+                cos, sin = self._calibration.padRotation(pos == Pos.LEFT)
+                handlers.append(partial(self._padButtons, pos, tuple(self._pad_evts[pos]),
+                                        callbacks, on_test, off_test, self._pad_dzones[pos],
+                                        self._pad_revs[pos], mode == PadModes.BUTTONTOUCH,
+                                        cos, sin))
+                averaged = bool(callbacks)
+            else:
+                averaged = False
+            if not averaged:
+                # The filter is not fed, do not keep stale positions
+                self._pad_filters[pos].reset()
 
-        syn = set()
+        for pos in (Pos.LEFT, Pos.RIGHT):
+            uip_idx, ev = self._trig_evts[pos]
+            if self._trig_axes_callbacks[pos]:
+                handlers.append(partial(self._trigCallback, pos, self._trig_axes_callbacks[pos]))
+            elif self._trig_modes[pos] == TrigModes.AXIS:
+                handlers.append(partial(self._trigAxis, pos, uip_idx, ev))
+            if self._trig_modes[pos] == TrigModes.BUTTON:
+                handlers.append(partial(self._trigButton, pos, uip_idx, ev))
+
+        center = self._calibration.stick_center
+        if self._stick_axes_callback is not None:
+            handlers.append(partial(self._stickAxesCallback, center))
+        if self._stick_mode == StickModes.AXIS:
+            (x_uip_idx, xev), (y_uip_idx, yev) = self._stick_evts
+            handlers.append(partial(self._stickAxes, x_uip_idx, xev, y_uip_idx, yev,
+                                    self._stick_rev, center))
+        elif self._stick_mode == StickModes.BUTTON:
+            handlers.append(partial(self._stickButtons, tuple(self._stick_evts), center,
+                                    self._calibration.stickHysteresis()))
+        if self._stick_pressed_callback is not None:
+            handlers.append(self._stickPressedCallback)
+
+        enable, ratchet = self._gyro_enable
+        if self._gyro_mode == GyroModes.MOUSE and uip_mouse is not None:
+            handlers.append(partial(self._gyroMouse, uip_mouse, enable, ratchet))
+        elif self._gyro_mode == GyroModes.AXIS:
+            (x_uip_idx, xev), (y_uip_idx, yev) = self._gyro_evts
+            handlers.append(partial(self._gyroAxes, x_uip_idx, xev, y_uip_idx, yev,
+                                    self._gyro_rev, enable, ratchet))
+
+        self._plan = (btn_mask, tuple(buttons), tuple(handlers))
+        return self._plan
+
+    def _absPressed(self, uip_idx, ev, val):
+        if self._onabs.get(ev) != val:
+            self._uips[uip_idx].axisEvent(ev, val)
+            self._syn.add(uip_idx)
+            self._onabs[ev] = val
+            return True
+        return False
+
+    def _absReleased(self, uip_idx, ev):
+        if not self._onabs.get(ev):
+            return False
+        self._uips[uip_idx].axisEvent(ev, 0)
+        self._syn.add(uip_idx)
+        self._onabs[ev] = 0
+        return True
+
+    def _keyPressed(self, uip_idx, ev):
+        """Generate a key press if not already pressed, return True if generated"""
+        if ev in self._onkeys:
+            return False
+        self._uips[uip_idx].keyEvent(ev, 1)
+        self._syn.add(uip_idx)
+        self._onkeys.add(ev)
+        return True
+
+    def _keyReleased(self, uip_idx, ev):
+        """Generate a key release if pressed, return True if generated"""
+        if ev not in self._onkeys:
+            return False
+        self._onkeys.remove(ev)
+        self._uips[uip_idx].keyEvent(ev, 0)
+        self._syn.add(uip_idx)
+        return True
+
+    def _padFilter(self, pos, x, y, touched_prev, now):
+        """
+        Feed a touched position to the pad filter, now is the report time
 
-        def _abspressed(uip_idx, ev, val):
-            if ev not in self._onabs or self._onabs[ev] != val:
-                self._uips[uip_idx].axisEvent(ev, val)
-                syn.add(uip_idx)
-                self._onabs[ev] = val
-                return True
-            else:
-                return False
+        @return tuple   previous and new filtered position (xm_p, ym_p, xm, ym)
+        """
+        flt = self._pad_filters[pos]
+        last = flt.last
+        xm, ym = flt.update(x, y, now)
+        if last is None or not touched_prev:
+            return xm, ym, xm, ym
+        return last[0], last[1], xm, ym
+
+    def _padMouse(self, pos, mouse, scroll, sc, sci, sci_p):
+        touch = _TOUCH[pos]
+        dx = dy = 0
+        free = sci.buttons & touch != touch
+        if free:
+            self._pad_filters[pos].reset()
+        else:
+            xi = _PAD_X[pos]
+            touched_prev = sci_p.buttons & touch == touch
+            xm_p, ym_p, xm, ym = self._padFilter(pos, sci[xi], sci[xi + 1], touched_prev,
+                                                  _timestamp(sc))
+            if touched_prev:
+                dx = xm - xm_p
+                dy = ym - ym_p
+
+        if not scroll:
+            self._moved[pos] += int(mouse.moveEvent(dx, -dy, free))
+            # FIXME: make haptic configurable
+            if self._moved[pos] >= 4000:
+                if not free:
+                    sc.addFeedback(pos, amplitude=100)
+                self._moved[pos] %= 4000
+        elif mouse.scrollEvent(dx, dy, free):
+            # FIXME: make haptic configurable
+            if not free:
+                sc.addFeedback(pos, amplitude=256)
+
+    def _padAxes(self, pos, x_uip_idx, xev, y_uip_idx, yev, revert, smoothed, sc, sci, sci_p):
+        touch = _TOUCH[pos]
+        xi = _PAD_X[pos]
+        x, y = sci[xi], sci[xi + 1]
+        if sci.buttons & touch == touch:
+            xm_p, ym_p, xm, ym = self._padFilter(pos, x, y, sci_p.buttons & touch == touch,
+                                                  _timestamp(sc))
+            # FIXME: make haptic configurable
+            self._moved[pos] += math.sqrt((xm - xm_p) ** 2 + (ym - ym_p) ** 2)
+            if self._moved[pos] >= 4000:
+                sc.addFeedback(pos, amplitude=100)
+                self._moved[pos] %= 4000
+            if smoothed:
+                x, y = xm, ym
+        else:
+            self._pad_filters[pos].reset()
 
-        def _absreleased(uip_idx, ev):
-            if ev not in self._onabs or self._onabs[ev] == 0:
-                return False
-            else:
-                self._uips[uip_idx].axisEvent(ev, 0)
-                syn.add(uip_idx)
-                self._onabs[ev] = 0
-                return True
-
-        def _keypressed(uip_idx, ev):
-            """Private function used to generate different kind of key press"""
-            if ev not in self._onkeys:
-                self._uips[uip_idx].keyEvent(ev, 1)
-                syn.add(uip_idx)
-            if ev in self._onkeys:
-                return False
-            else:
-                self._onkeys.add(ev)
-                return True
-
-        def _keyreleased(uip_idx, ev):
-            """Private function used to generate different kind of key release"""
-            if ev in self._onkeys:
-                self._onkeys.remove(ev)
-                self._uips[uip_idx].keyEvent(ev, 0)
-                syn.add(uip_idx)
-                return True
+        if smoothed:
+            x_p, y_p = self._pad_out[pos]
+            self._pad_out[pos] = (x, y)
+        else:
+            x_p, y_p = sci_p[xi], sci_p[xi + 1]
+
+        if x != x_p:
+            self._uips[x_uip_idx].axisEvent(xev, x)
+            self._syn.add(x_uip_idx)
+        if y != y_p:
+            self._uips[y_uip_idx].axisEvent(yev, y if not revert else -y)
+            self._syn.add(y_uip_idx)
+
+    def _padButtons(self, pos, evts, callbacks, on_test, off_test, dzone, revert, haptic_on,
+                    cos, sin, sc, sci, sci_p):
+        buttons = sci.buttons
+        xi = _PAD_X[pos]
+        x, y = sci[xi], sci[xi + 1]
+        haptic = False
+
+        if callbacks:
+            touch = _TOUCH[pos]
+            if buttons & touch == touch:
+                _, _, xm, ym = self._padFilter(pos, x, y, sci_p.buttons & touch == touch,
+                                               _timestamp(sc))
             else:
-                return False
+                self._pad_filters[pos].reset()
 
-        # Manage long Steam press to exit
-        if btn_add & SCButtons.STEAM == SCButtons.STEAM:
-            self._steam_pressed_time = time()
-        if (sci.buttons & SCButtons.STEAM == SCButtons.STEAM and
-                time() - self._steam_pressed_time > EXIT_PRESS_DURATION):
-            for uip in self._uips:
-                uip.destroyDevice()
-            sc.addExit()
+        if buttons & on_test == on_test:
+            for callback in callbacks:
+                callback(self, pos, xm, ym)
 
-        # Manage buttons
-        for btn, (uip_idx, ev) in self._btn_map.items():
-            if uip_idx is None:
-                continue
+            # Correct weird rotational offset of d-touch-pad
+            xm_cor = cos * x - sin * y
+            ym_cor = sin * x + cos * y
 
-            if btn & btn_add:
-                if uip_idx is None:
-                    ev(self, btn, True)
+            if len(evts) == 4:
+                # Key or buttons
+                (t_uip_idx, tev), (l_uip_idx, lev), (b_uip_idx, bev), (r_uip_idx, rev) = evts
+
+                # Top
+                if ym_cor >= dzone:
+                    haptic |= self._keyPressed(t_uip_idx, tev)
                 else:
-                    _keypressed(uip_idx, ev)
-            elif btn & btn_rem:
-                if uip_idx is None:
-                    ev(self, btn, False)
+                    haptic |= self._keyReleased(t_uip_idx, tev)
+
+                # Left
+                if xm_cor <= -dzone:
+                    haptic |= self._keyPressed(l_uip_idx, lev)
                 else:
-                    _keyreleased(uip_idx, ev)
+                    haptic |= self._keyReleased(l_uip_idx, lev)
 
-        # Manage pads
-        for pos in [Pos.LEFT, Pos.RIGHT]:
-            if pos == Pos.LEFT:
-                x, y = sci.lpad_x, sci.lpad_y
-                x_p, y_p = sci_p.lpad_x, sci_p.lpad_y
-                touch = SCButtons.LPADTOUCH
-                click = SCButtons.LPAD
-            else:
-                x, y = sci.rpad_x, sci.rpad_y
-                x_p, y_p = sci_p.rpad_x, sci_p.rpad_y
-                touch = SCButtons.RPADTOUCH
-                click = SCButtons.RPAD
-
-            if sci.buttons & touch == touch:
-                # Compute mean pos
-                try:
-                    xm_p = int(sum(self._xdq[pos]) / len(self._xdq[pos]))
-                except ZeroDivisionError:
-                    xm_p = 0
-
-                try:
-                    ym_p = int(sum(self._ydq[pos]) / len(self._ydq[pos]))
-                except ZeroDivisionError:
-                    ym_p = 0
-
-                self._xdq[pos].append(x)
-                self._ydq[pos].append(y)
-                try:
-                    xm = int(sum(self._xdq[pos]) / len(self._xdq[pos]))
-                except ZeroDivisionError:
-                    xm = 0
-
-                try:
-                    ym = int(sum(self._ydq[pos]) / len(self._ydq[pos]))
-                except ZeroDivisionError:
-                    ym = 0
-
-                if not sci_p.buttons & touch == touch:
-                    xm_p, ym_p = xm, ym
-
-            # Mouse and mouse scroll modes
-            if (self._pad_modes[pos] in (PadModes.MOUSE, PadModes.MOUSESCROLL)
-                    and uip_mouse is not None):
-                _free = True
-                _dx = 0
-                _dy = 0
-
-                if sci.buttons & touch == touch:
-                    _free = False
-                    if sci_p.buttons & touch == touch:
-                        _dx = xm - xm_p
-                        _dy = ym - ym_p
-
-                if self._pad_modes[pos] == PadModes.MOUSE:
-                    self._moved[pos] += int(self._uips[uip_mouse].moveEvent(_dx, -_dy, _free))
-                    # FIXME: make haptic configurable
-                    if self._moved[pos] >= 4000:
-                        if not _free:
-                            sc.addFeedback(pos, amplitude=100)
-                        self._moved[pos] %= 4000
+                # Bottom
+                if ym_cor <= -dzone:
+                    haptic |= self._keyPressed(b_uip_idx, bev)
                 else:
-                    if self._uips[uip_mouse].scrollEvent(_dx, _dy, _free):
-                        # FIXME: make haptic configurable
-                        if not _free:
-                            sc.addFeedback(pos, amplitude=256)
-
-            # Axis mode
-            elif self._pad_modes[pos] == PadModes.AXIS:
-                revert = self._pad_revs[pos]
-                (x_uip_idx, xev), (y_uip_idx, yev) = self._pad_evts[pos]
-                if x_uip_idx is not None:
-                    # FIXME: make haptic configurable
-                    if sci.buttons & touch == touch:
-                        self._moved[pos] += math.sqrt((xm - xm_p) ** 2 + (ym - ym_p) ** 2)
-                        if self._moved[pos] >= 4000:
-                            sc.addFeedback(pos, amplitude=100)
-                            self._moved[pos] %= 4000
-
-                    if x != x_p:
-                        self._uips[x_uip_idx].axisEvent(xev, x)
-                        syn.add(x_uip_idx)
-                    if y != y_p:
-                        self._uips[y_uip_idx].axisEvent(yev, y if not revert else -y)
-                        syn.add(y_uip_idx)
-
-            # Button touch mode
-            elif (self._pad_modes[pos] == PadModes.BUTTONTOUCH
-                  or self._pad_modes[pos] == PadModes.BUTTONCLICK):
-                if self._pad_modes[pos] == PadModes.BUTTONTOUCH:
-                    on_test = touch
-                    off_test = touch
+                    haptic |= self._keyReleased(b_uip_idx, bev)
+
+                # Right
+                if xm_cor >= dzone:
+                    haptic |= self._keyPressed(r_uip_idx, rev)
                 else:
-                    on_test = click | touch
-                    off_test = click
-
-                haptic = False
-
-                if sci.buttons & on_test == on_test:
-                    # Get callback events
-                    callbacks = []
-                    for evt in self._pad_evts[pos]:
-                        if evt[0] is None:
-                            callbacks.append(evt)
-                    for callback_evt in callbacks:
-                        callback_evt[1](self, pos, xm, ym)
-
-                    dzone = self._pad_dzones[pos]
-                    if len(self._pad_evts[pos]) == 4:
-                        # Key or buttons
-                        t_uip_idx, tev = self._pad_evts[pos][0]
-                        l_uip_idx, lev = self._pad_evts[pos][1]
-                        b_uip_idx, bev = self._pad_evts[pos][2]
-                        r_uip_idx, rev = self._pad_evts[pos][3]
-
-                        # Correct weird rotational offset of d-touch-pad
-                        angle = -0.35877  # Roughly 20.556 degrees
-                        cos = math.cos(angle)
-                        sin = math.sin(angle)
-                        xm_cor = cos * x - sin * y
-                        ym_cor = sin * x + cos * y
-
-                        # Top
-                        if ym_cor >= dzone:
-                            haptic |= _keypressed(t_uip_idx, tev)
-                        else:
-                            haptic |= _keyreleased(t_uip_idx, tev)
-
-                        # Left
-                        if xm_cor <= -dzone:
-                            haptic |= _keypressed(l_uip_idx, lev)
-                        else:
-                            haptic |= _keyreleased(l_uip_idx, lev)
-
-                        # Bottom
-                        if ym_cor <= -dzone:
-                            haptic |= _keypressed(b_uip_idx, bev)
-                        else:
-                            haptic |= _keyreleased(b_uip_idx, bev)
-
-                        # Right
-                        if xm_cor >= dzone:
-                            haptic |= _keypressed(r_uip_idx, rev)
-                        else:
-                            haptic |= _keyreleased(r_uip_idx, rev)
-
-                    elif len(self._pad_evts[pos]) == 2:
-                        x_uip_idx, xev = self._pad_evts[pos][0]
-                        y_uip_idx, yev = self._pad_evts[pos][1]
-                        rev = self._pad_revs[pos]
-
-                        # Correct weird rotational offset of d-touch-pad
-                        angle = -0.35877  # Roughly 20.556 degrees
-                        cos = math.cos(angle)
-                        sin = math.sin(angle)
-                        xm_cor = cos * x - sin * y
-                        ym_cor = sin * x + cos * y
-
-                        if ym_cor > dzone:  # Top
-                            haptic |= _abspressed(y_uip_idx, yev,
-                                                  -1 if rev else 1)
-                        elif ym_cor < -dzone:  # Bottom
-                            haptic |= _abspressed(y_uip_idx, yev,
-                                                  1 if rev else -1)
-                        else:
-                            haptic |= _absreleased(y_uip_idx, yev)
-
-                        if xm_cor < -dzone:  # Left
-                            haptic |= _abspressed(x_uip_idx, xev, -1)
-                        elif xm_cor > dzone:  # Right
-                            haptic |= _abspressed(x_uip_idx, xev, 1)
-                        else:
-                            haptic |= _absreleased(x_uip_idx, xev)
-
-                if sci.buttons & off_test != off_test and sci_p.buttons & on_test == on_test:
-                    if len(self._pad_evts[pos]) == 4:
-                        for uip_idx, ev in self._pad_evts[pos]:
-                            haptic |= _keyreleased(uip_idx, ev)
-                    elif len(self._pad_evts[pos]) == 2:
-                        for uip_idx, ev in self._pad_evts[pos]:
-                            haptic |= _absreleased(uip_idx, ev)
-
-                if haptic and self._pad_modes[pos] == PadModes.BUTTONTOUCH:
-                    sc.addFeedback(pos, amplitude=300)
-
-            if sci.buttons & touch != touch:
-                xm_p, ym_p, xm, ym = 0, 0, 0, 0
-                self._xdq[pos].clear()
-                self._ydq[pos].clear()
-
-        # Manage Trig
-        for pos in [Pos.LEFT, Pos.RIGHT]:
-            trigval = sci.ltrig if pos == Pos.LEFT else sci.rtrig
-            trigval_prev = sci_p.ltrig if pos == Pos.LEFT else sci_p.rtrig
-            uip_idx, ev = self._trig_evts[pos]
+                    haptic |= self._keyReleased(r_uip_idx, rev)
+
+            elif len(evts) == 2:
+                (x_uip_idx, xev), (y_uip_idx, yev) = evts
 
-            if trigval != trigval_prev:
-                if self._trig_axes_callbacks[pos]:
-                    self._trig_axes_callbacks[pos](self, pos, trigval)
-                elif self._trig_modes[pos] == TrigModes.AXIS:
-                    syn.add(uip_idx)
-                    self._uips[uip_idx].axisEvent(ev, trigval)
-
-            elif self._trig_modes[pos] == TrigModes.BUTTON:
-                if self._trig_s[pos] is None and trigval > min(trigval_prev + 10, 200):
-                    self._trig_s[pos] = max(0, min(trigval - 10, 180))
-                    _keypressed(uip_idx, ev)
-                elif self._trig_s[pos] is not None and trigval <= self._trig_s[pos]:
-                    self._trig_s[pos] = None
-                    _keyreleased(uip_idx, ev)
-
-        # Manage Stick
+                if ym_cor > dzone:  # Top
+                    haptic |= self._absPressed(y_uip_idx, yev, -1 if revert else 1)
+                elif ym_cor < -dzone:  # Bottom
+                    haptic |= self._absPressed(y_uip_idx, yev, 1 if revert else -1)
+                else:
+                    haptic |= self._absReleased(y_uip_idx, yev)
+
+                if xm_cor < -dzone:  # Left
+                    haptic |= self._absPressed(x_uip_idx, xev, -1)
+                elif xm_cor > dzone:  # Right
+                    haptic |= self._absPressed(x_uip_idx, xev, 1)
+                else:
+                    haptic |= self._absReleased(x_uip_idx, xev)
+
+        if buttons & off_test != off_test and sci_p.buttons & on_test == on_test:
+            if len(evts) == 4:
+                for uip_idx, ev in evts:
+                    haptic |= self._keyReleased(uip_idx, ev)
+            elif len(evts) == 2:
+                for uip_idx, ev in evts:
+                    haptic |= self._absReleased(uip_idx, ev)
+
+        if haptic and haptic_on:
+            sc.addFeedback(pos, amplitude=300)
+
+    def _trigCallback(self, pos, callback, sc, sci, sci_p):
+        ti = _TRIG[pos]
+        if sci[ti] != sci_p[ti]:
+            callback(self, pos, sci[ti])
+
+    def _trigAxis(self, pos, uip_idx, ev, sc, sci, sci_p):
+        ti = _TRIG[pos]
+        if sci[ti] != sci_p[ti]:
+            self._syn.add(uip_idx)
+            self._uips[uip_idx].axisEvent(ev, sci[ti])
+
+    def _trigButton(self, pos, uip_idx, ev, sc, sci, sci_p):
+        ti = _TRIG[pos]
+        trigval = sci[ti]
+        trigval_prev = sci_p[ti]
+        if trigval != trigval_prev:
+            return
+        if self._trig_s[pos] is None and trigval > min(trigval_prev + 10, 200):
+            self._trig_s[pos] = max(0, min(trigval - 10, 180))
+            self._keyPressed(uip_idx, ev)
+        elif self._trig_s[pos] is not None and trigval <= self._trig_s[pos]:
+            self._trig_s[pos] = None
+            self._keyReleased(uip_idx, ev)
+
+    def _stickAxesCallback(self, center, sc, sci, sci_p):
         if sci.buttons & SCButtons.LPADTOUCH != SCButtons.LPADTOUCH:
-            x, y = sci.lpad_x, sci.lpad_y
-            x_p, y_p = sci_p.lpad_x, sci_p.lpad_y
+            if sci.lpad_x != sci_p.lpad_x or sci.lpad_y != sci_p.lpad_y:
+                self._stick_axes_callback(self, _clamp(sci.lpad_x - center[0]),
+                                          _clamp(sci.lpad_y - center[1]))
 
-            if self._stick_axes_callback is not None and (x != x_p or y != y_p):
-                self._stick_axes_callback(self, x, y)
+    def _stickAxes(self, x_uip_idx, xev, y_uip_idx, yev, revert, center, sc, sci, sci_p):
+        if sci.buttons & SCButtons.LPADTOUCH != SCButtons.LPADTOUCH:
+            if sci.lpad_x != sci_p.lpad_x:
+                self._syn.add(x_uip_idx)
+                self._uips[x_uip_idx].axisEvent(xev, _clamp(sci.lpad_x - center[0]))
+            if sci.lpad_y != sci_p.lpad_y:
+                y = _clamp(sci.lpad_y - center[1])
+                self._syn.add(y_uip_idx)
+                self._uips[y_uip_idx].axisEvent(yev, y if not revert else -y)
+
+    def _stickButtons(self, evts, center, hyst, sc, sci, sci_p):
+        if sci.buttons & SCButtons.LPADTOUCH == SCButtons.LPADTOUCH:
+            return
 
-            if self._stick_mode == StickModes.AXIS:
-                revert = self._stick_rev
-                (x_uip_idx, xev), (y_uip_idx, yev) = self._stick_evts
-                if x != x_p:
-                    syn.add(x_uip_idx)
-                    self._uips[x_uip_idx].axisEvent(xev, x)
-                if y != y_p:
-                    syn.add(y_uip_idx)
-                    self._uips[y_uip_idx].axisEvent(yev, y if not revert else -y)
-
-            elif self._stick_mode == StickModes.BUTTON:
-                t_uip_idx, tev = self._stick_evts[0]
-                l_uip_idx, lev = self._stick_evts[1]
-                b_uip_idx, bev = self._stick_evts[2]
-                r_uip_idx, rev = self._stick_evts[3]
+        cx, cy = center
+        x, y = sci.lpad_x - cx, sci.lpad_y - cy
+        x_p, y_p = sci_p.lpad_x - cx, sci_p.lpad_y - cy
+        rel = STICK_MAX - hyst // 2
+        (t_uip_idx, tev), (l_uip_idx, lev), (b_uip_idx, bev), (r_uip_idx, rev) = evts
+
+        # Top
+        if self._stick_tys is None and y > 0 and y > min(y_p + hyst, STICK_MAX):
+            self._stick_tys = max(0, min(y - hyst, rel))
+            self._keyPressed(t_uip_idx, tev)
+        elif self._stick_tys is not None and y <= self._stick_tys:
+            self._stick_tys = None
+            self._keyReleased(t_uip_idx, tev)
+
+        # Left
+        if self._stick_lxs is None and x < 0 and x < max(x_p - hyst, -STICK_MAX):
+            self._stick_lxs = min(0, max(x + hyst, -rel))
+            self._keyPressed(l_uip_idx, lev)
+        elif self._stick_lxs is not None and x >= self._stick_lxs:
+            self._stick_lxs = None
+            self._keyReleased(l_uip_idx, lev)
+
+        # Bottom
+        if self._stick_bys is None and y < 0 and y < max(y_p - hyst, -STICK_MAX):
+            self._stick_bys = min(0, max(y + hyst, -rel))
+            self._keyPressed(b_uip_idx, bev)
+        elif self._stick_bys is not None and y >= self._stick_bys:
+            self._stick_bys = None
+            self._keyReleased(b_uip_idx, bev)
+
+        # Right
+        if self._stick_rxs is None and x > 0 and x > min(x_p + hyst, STICK_MAX):
+            self._stick_rxs = max(0, min(x - hyst, rel))
+            self._keyPressed(r_uip_idx, rev)
+        elif self._stick_rxs is not None and x <= self._stick_rxs:
+            self._stick_rxs = None
+            self._keyReleased(r_uip_idx, rev)
+
+    def _stickPressedCallback(self, sc, sci, sci_p):
+        if sci.buttons & (SCButtons.LPADTOUCH | SCButtons.LPAD) == SCButtons.LPAD:
+            self._stick_pressed_callback(self)
+
+    def _gyroMouse(self, uip_idx, enable, ratchet, sc, sci, sci_p):
+        if sci is sci_p:
+            # Last report sent again by the event loop, nothing was measured
+            return
+        gyro = self._gyro
+        dt = gyro.update(sci.gpitch, sci.groll, sci.gyaw, _timestamp(sc))
+        if enable and (sci.buttons & enable == enable) == ratchet:
+            gyro.reset()
+            return
+        dx, dy = gyro.move(dt)
+        if dx or dy:
+            mouse = self._uips[uip_idx]
+            if dx:
+                mouse.relEvent(sui.Rels.REL_X, dx)
+            if dy:
+                mouse.relEvent(sui.Rels.REL_Y, dy)
+            self._syn.add(uip_idx)
+
+    def _gyroAxes(self, x_uip_idx, xev, y_uip_idx, yev, revert, enable, ratchet, sc, sci, sci_p):
+        if sci is sci_p:
+            return
+        gyro = self._gyro
+        gyro.update(sci.gpitch, sci.groll, sci.gyaw, _timestamp(sc))
+        if enable and (sci.buttons & enable == enable) == ratchet:
+            x = y = 0
+        else:
+            x = _clamp(int(gyro.x))
+            y = _clamp(int(-gyro.y if revert else gyro.y))
+        self._absPressed(x_uip_idx, xev, x)
+        self._absPressed(y_uip_idx, yev, y)
 
-                # Top
-                if self._stick_tys is None and y > 0 and y > min(y_p + 2000, 32000):
-                    self._stick_tys = max(0, min(y - 2000, 31000))
-                    _keypressed(t_uip_idx, tev)
-                elif self._stick_tys is not None and y <= self._stick_tys:
-                    self._stick_tys = None
-                    _keyreleased(t_uip_idx, tev)
+    def process(self, sc, sci):
+        """
+        Process SteamController inputs to generate events
 
-                # Left
-                if self._stick_lxs is None and x < 0 and x < max(x_p - 2000, -32000):
-                    self._stick_lxs = min(0, max(x + 2000, -31000))
-                    _keypressed(l_uip_idx, lev)
-                elif self._stick_lxs is not None and x >= self._stick_lxs:
-                    self._stick_lxs = None
-                    _keyreleased(l_uip_idx, lev)
+        @param SteamController sc       steamcontroller class used to get input
+        @param SteamControllerInput sci inputs from the steam controller
+        """
+        if sci.status != SCStatus.INPUT:
+            return
 
-                # Bottom
-                if self._stick_bys is None and y < 0 and y < max(y_p - 2000, -32000):
-                    self._stick_bys = min(0, max(y + 2000, -31000))
-                    _keypressed(b_uip_idx, bev)
-                elif self._stick_bys is not None and y >= self._stick_bys:
-                    self._stick_bys = None
-                    _keyreleased(b_uip_idx, bev)
+        if sc is not None and sc.connected is False:
+            # Controller gone, release what it was holding
+            if self._sci_prev is not SCI_NULL:
+                self.reset()
+            return
 
-                # Right
-                if self._stick_rxs is None and x > 0 and x > min(x_p + 2000, 32000):
-                    self._stick_rxs = max(0, min(x - 2000, 31000))
-                    _keypressed(r_uip_idx, rev)
-                elif self._stick_rxs is not None and x <= self._stick_rxs:
-                    self._stick_rxs = None
-                    _keyreleased(r_uip_idx, rev)
+        if sc is not self._sc:
+            self._attach(sc)
+
+        plan = self._plan
+        if plan is None:
+            plan = self._compile()
+            if self._gyro_mode != GyroModes.NOACTION and sc is not None:
+                sc.setGyro(True)
+        btn_mask, buttons, handlers = plan
+
+        sci_p = self._sci_prev
+        self._sci_prev = sci
+
+        pressed = sci.buttons
+        changed = sci_p.buttons ^ pressed
+
+        # Manage long Steam press to exit
+        if changed & pressed & _STEAM:
+            self._steam_pressed_time = time()
+        if pressed & _STEAM and time() - self._steam_pressed_time > EXIT_PRESS_DURATION:
+            # End the session, the devices are kept for the next one
+            self.reset()
+            sc.addExit()
+            return
 
-            if sci.buttons & SCButtons.LPAD == SCButtons.LPAD:
-                if self._stick_pressed_callback is not None:
-                    self._stick_pressed_callback(self)
+        # Manage buttons
+        if changed & btn_mask:
+            for btn, uip_idx, ev in buttons:
+                if not btn & changed:
+                    continue
+                if uip_idx is None:
+                    ev(self, SCButtons(btn), bool(btn & pressed))
+                elif btn & pressed:
+                    self._keyPressed(uip_idx, ev)
+                else:
+                    self._keyReleased(uip_idx, ev)
 
-        for i in list(syn):
-            self._uips[i].synEvent()
+        # Manage pads, trigs and stick
+        for handler in handlers:
+            handler(sc, sci, sci_p)
+
+        syn = self._syn
+        if syn:
+            for i in syn:
+                self._uips[i].synEvent()
+            syn.clear()
+
+    def reset(self):
+        """
+        Release held keys and buttons, center the axes and stop the trackball
+        as if the controller was left alone, ie when it disconnects. The
+        uinput devices are kept, the mapper attaches again to the controller
+        of the next report.
+        """
+        if self._sci_prev is not SCI_NULL:
+            for ev in list(self._onkeys):
+                self._keyReleased(self._get_uip_idx_by_keyManaged(ev), ev)
+            for ev, val in list(self._onabs.items()):
+                if val:
+                    self._absReleased(self._get_uip_idx_by_axisManaged(ev), ev)
+
+            held = self._sci_prev.buttons
+            for btn, (uip_idx, ev) in self._btn_map.items():
+                if uip_idx is None and callable(ev) and held & btn:
+                    ev(self, btn, False)
+
+            axes = []
+            for pos in (Pos.LEFT, Pos.RIGHT):
+                if self._pad_modes[pos] == PadModes.AXIS:
+                    axes.extend(self._pad_evts[pos])
+                if self._trig_modes[pos] == TrigModes.AXIS:
+                    axes.append(self._trig_evts[pos])
+            if self._stick_mode == StickModes.AXIS:
+                axes.extend(self._stick_evts)
+            for uip_idx, ev in axes:
+                self._uips[uip_idx].axisEvent(ev, 0)
+                self._syn.add(uip_idx)
+
+            for i in self._syn:
+                self._uips[i].synEvent()
+            self._syn.clear()
+
+        for uip in self._uips:
+            for timer in uip.timers():
+                timer.stop()
+        for flt in self._pad_filters:
+            flt.reset()
+        self._gyro.reset()
+        self._stick_tys = None
+        self._stick_lxs = None
+        self._stick_bys = None
+        self._stick_rxs = None
+        self._trig_s = [None, None]
+        self._moved = [0, 0]
+        self._sci_prev = SCI_NULL
+        self._sc = None
 
     def setButtonAction(self, btn, key_event):
         uip_idx = self._get_uip_idx_by_keyManaged(key_event)
         self._btn_map[btn] = (uip_idx, key_event)
+        self._plan = None
 
     def setButtonCallback(self, btn, callback):
         """
@@ -533,6 +750,7 @@ class EventMapper(object):
         @param function callback        Callback function
         """
         self._btn_map[btn] = (None, callback)
+        self._plan = None
 
     def setPadButtons(self, pos, key_events, deadzone=0.6, clicked=False):
         """
@@ -560,6 +778,7 @@ class EventMapper(object):
                 self._btn_map[SCButtons.LPAD] = (None, 0)
             else:
                 self._btn_map[SCButtons.RPAD] = (None, 0)
+        self._plan = None
 
     def setPadButtonCallback(self, pos, callback, clicked=False):
         """
@@ -573,13 +792,14 @@ class EventMapper(object):
         """
         if not clicked:
             self._pad_modes[pos] = PadModes.BUTTONTOUCH
-            self._pad_evts[pos].append((None, callback))
+            self._pad_callbacks[pos].append(callback)
         else:
             self._pad_modes[pos] = PadModes.BUTTONCLICK
             if pos == Pos.LEFT:
                 self._btn_map[SCButtons.LPAD] = (None, callback)
             else:
                 self._btn_map[SCButtons.RPAD] = (None, callback)
+        self._plan = None
 
     def setPadAxesAsButtons(self, pos, abs_events, deadzone=0.6, clicked=False, revert=True):
         """
@@ -609,49 +829,84 @@ class EventMapper(object):
                 self._btn_map[SCButtons.LPAD] = (None, 0)
             else:
                 self._btn_map[SCButtons.RPAD] = (None, 0)
+        self._plan = None
 
     def setPadMouse(self, pos,
                     trackball=True,
                     friction=sui.Mouse.DEFAULT_FRICTION,
                     xscale=sui.Mouse.DEFAULT_XSCALE,
-                    yscale=sui.Mouse.DEFAULT_XSCALE):
+                    yscale=sui.Mouse.DEFAULT_XSCALE,
+                    smoothing=None):
+        """
+        Set pad as mouse
+
+        @param Pos pos              designate left or right pad
+        @param bool trackball       keep moving with inertia when the pad is released
+        @param float friction       trackball friction
+        @param float xscale         x moves scale
+        @param float yscale         y moves scale
+        @param PadFilter smoothing  filter of the touched positions, see
+                                    steamcontroller.filters, 8 positions
+                                    MovingAverage by default
+        """
         if not trackball:
             friction = 100.0
         uip_idx = self._get_uip_idx_by_instance(sui.Mouse)
         self._uips[uip_idx].updateParams(friction=friction, xscale=xscale, yscale=yscale)
         self._pad_modes[pos] = PadModes.MOUSE
+        self._pad_filters[pos] = smoothing or MovingAverage()
+        self._plan = None
 
     def setPadScroll(self, pos,
                      trackball=True,
                      friction=sui.Mouse.DEFAULT_SCR_FRICTION,
                      xscale=sui.Mouse.DEFAULT_SCR_XSCALE,
-                     yscale=sui.Mouse.DEFAULT_SCR_XSCALE):
+                     yscale=sui.Mouse.DEFAULT_SCR_XSCALE,
+                     smoothing=None):
         if not trackball:
             friction = 100.0
         uip_idx = self._get_uip_idx_by_instance(sui.Mouse)
         self._uips[uip_idx].updateScrollParams(friction=friction, xscale=xscale, yscale=yscale)
         self._pad_modes[pos] = PadModes.MOUSESCROLL
+        self._pad_filters[pos] = smoothing or MovingAverage()
+        self._plan = None
 
-    def setPadAxes(self, pos, abs_x_event, abs_y_event, revert=True):
+    def setPadAxes(self, pos, abs_x_event, abs_y_event, revert=True, smoothing=None):
+        """
+        Set pad as axes
+
+        @param Pos pos              designate left or right pad
+        @param abs_x_event          x axis event
+        @param abs_y_event          y axis event
+        @param bool revert          revert y axis
+        @param PadFilter smoothing  filter of the touched positions, see
+                                    setPadMouse, raw positions by default
+        """
         uip_idx_x = self._get_uip_idx_by_axisManaged(abs_x_event)
         uip_idx_y = self._get_uip_idx_by_axisManaged(abs_y_event)
         self._pad_modes[pos] = PadModes.AXIS
         self._pad_evts[pos] = [(uip_idx_x, abs_x_event), (uip_idx_y, abs_y_event)]
         self._pad_revs[pos] = revert
+        self._pad_filters[pos] = smoothing or MovingAverage()
+        self._pad_smoothed[pos] = smoothing is not None
+        self._plan = None
 
     def setTrigButton(self, pos, key_event):
         self._trig_modes[pos] = TrigModes.BUTTON
         uip_idx = self._get_uip_idx_by_keyManaged(key_event)
         self._trig_evts[pos] = (uip_idx, key_event)
+        self._plan = None
 
     def setTrigAxis(self, pos, abs_event):
         uip_idx = self._get_uip_idx_by_axisManaged(abs_event)
         self._trig_modes[pos] = TrigModes.AXIS
         self._trig_evts[pos] = (uip_idx, abs_event)
+        self._plan = None
 
     def setTrigAxesCallback(self, pos, callback):
         self._trig_modes[pos] = StickModes.AXIS
         self._trig_axes_callbacks[pos] = callback
+        self._plan = None
 
     def setStickAxes(self, abs_x_event, abs_y_event, revert=True):
         uip_idx_x = self._get_uip_idx_by_axisManaged(abs_x_event)
@@ -659,6 +914,7 @@ class EventMapper(object):
         self._stick_mode = StickModes.AXIS
         self._stick_evts = [(uip_idx_x, abs_x_event), (uip_idx_y, abs_y_event)]
         self._stick_rev = revert
+        self._plan = None
 
     def setStickAxesCallback(self, callback):
         """
@@ -668,6 +924,7 @@ class EventMapper(object):
         @param function callback       the callback function
         """
         self._stick_axes_callback = callback
+        self._plan = None
 
     def setStickButtons(self, key_events):
         """
@@ -683,6 +940,7 @@ class EventMapper(object):
         for ev in key_events:
             uip_idx = self._get_uip_idx_by_keyManaged(ev)
             self._stick_evts.append((uip_idx, ev))
+        self._plan = None
 
     def setStickPressedCallback(self, callback):
         """
@@ -692,3 +950,77 @@ class EventMapper(object):
         @param function Callback function      function that is called on button press.
         """
         self._stick_pressed_callback = callback
+        self._plan = None
+
+    def setGyroMouse(self, xcurve=None, ycurve=None, xaxis=GyroAxes.YAW, yaxis=GyroAxes.PITCH,
+                     enable=None, ratchet=False):
+        """
+        Set gyro as mouse, the angular speed is integrated on every report
+
+        The gyro is enabled on the controller when the mapper is first called.
+        With an enable button the gyro only moves the mouse while it is held,
+        with ratchet it moves the mouse except while it is held, like lifting
+        a mouse to recenter it.
+
+        @param SensitivityCurve xcurve  horizontal mouse units by degree, see
+                                        steamcontroller.gyro, GYRO_MOUSE_SENS
+                                        with tightening by default
+        @param SensitivityCurve ycurve  vertical mouse units by degree
+        @param GyroAxes xaxis           rotation moving the mouse horizontally
+        @param GyroAxes yaxis           rotation moving the mouse vertically
+        @param SCButtons enable         button engaging the gyro (ie RGRIP)
+        @param bool ratchet             disengage the gyro while enable is held
+        """
+        self._get_uip_idx_by_instance(sui.Mouse)
+        self._setGyro(GyroModes.MOUSE,
+                      xcurve or SensitivityCurve(-GYRO_MOUSE_SENS, tighten=GYRO_TIGHTEN),
+                      ycurve or SensitivityCurve(-GYRO_MOUSE_SENS, tighten=GYRO_TIGHTEN),
+                      xaxis, yaxis, enable, ratchet)
+
+    def setGyroAxes(self, abs_x_event, abs_y_event, xcurve=None, ycurve=None,
+                    xaxis=GyroAxes.YAW, yaxis=GyroAxes.PITCH, revert=True,
+                    enable=None, ratchet=False):
+        """
+        Set gyro as stick, the deflection follows the angular speed
+
+        @param abs_x_event              x axis event
+        @param abs_y_event              y axis event
+        @param SensitivityCurve xcurve  stick units by deg/s, a full deflection
+                                        at GYRO_STICK_RATE by default
+        @param SensitivityCurve ycurve  stick units by deg/s
+        @param GyroAxes xaxis           rotation deflecting the x axis
+        @param GyroAxes yaxis           rotation deflecting the y axis
+        @param bool revert              revert y axis
+        @param SCButtons enable         button engaging the gyro, see setGyroMouse
+        @param bool ratchet             disengage the gyro while enable is held
+        """
+        uip_idx_x = self._get_uip_idx_by_axisManaged(abs_x_event)
+        uip_idx_y = self._get_uip_idx_by_axisManaged(abs_y_event)
+        self._gyro_evts = [(uip_idx_x, abs_x_event), (uip_idx_y, abs_y_event)]
+        self._gyro_rev = revert
+        sens = STICK_MAX / GYRO_STICK_RATE
+        self._setGyro(GyroModes.AXIS,
+                      xcurve or SensitivityCurve(-sens, tighten=GYRO_TIGHTEN),
+                      ycurve or SensitivityCurve(sens, tighten=GYRO_TIGHTEN),
+                      xaxis, yaxis, enable, ratchet)
+
+    def _setGyro(self, mode, xcurve, ycurve, xaxis, yaxis, enable, ratchet):
+        self._gyro_mode = mode
+        gyro = self._gyro
+        gyro.xcurve, gyro.ycurve = xcurve, ycurve
+        gyro.xaxis, gyro.yaxis = int(xaxis), int(yaxis)
+        gyro.reset()
+        self._gyro_enable = (int(enable or 0), bool(ratchet))
+        self._plan = None
+
+    def setCalibration(self, calibration):
+        """
+        Set the correction constants of the controller, the profile of its
+        serial number is then no longer loaded
+
+        @param Calibration calibration  see steamcontroller.calibration
+        """
+        self._calibration = calibration
+        self._calibration_auto = False
+        self._gyro.setBias(calibration.gyro_bias)
+        self._plan = None
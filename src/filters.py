@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Trackpad position smoothing filters"""
+
+import math
+from collections import deque
+
+
+# Nominal period between two input reports, used when no time elapsed
+PERIOD = 0.004
+
+
+class PadFilter(object):
+    """
+    Base class of the pad filters
+
+    A filter is fed with the touched positions of one pad and returns the
+    smoothed position as integers. It is reset when the pad is released, the
+    last returned position is kept in `last` (None after a reset).
+    """
+
+    def __init__(self):
+        self.last = None
+
+    def reset(self):
+        """Forget the previous positions"""
+        self.last = None
+
+    def update(self, x, y, t):
+        """
+        Add a position
+
+        @param int x            raw x position
+        @param int y            raw y position
+        @param float t          time of the report in s
+
+        @return tuple           filtered (x, y)
+        """
+        self.last = (x, y)
+        return self.last
+
+
+class MovingAverage(PadFilter):
+    """
+    Mean of the last positions, kept with running sums
+
+    @param int size         number of averaged positions
+    """
+
+    def __init__(self, size=8):
+        super(MovingAverage, self).__init__()
+        self._size = size
+        self._xs = deque()
+        self._ys = deque()
+        self._xsum = 0
+        self._ysum = 0
+
+    def reset(self):
+        self.last = None
+        self._xs.clear()
+        self._ys.clear()
+        self._xsum = 0
+        self._ysum = 0
+
+    def update(self, x, y, t):
+        xs = self._xs
+        ys = self._ys
+        if len(xs) == self._size:
+            self._xsum -= xs.popleft()
+            self._ysum -= ys.popleft()
+        xs.append(x)
+        ys.append(y)
+        self._xsum += x
+        self._ysum += y
+        n = len(xs)
+        self.last = (int(self._xsum / n), int(self._ysum / n))
+        return self.last
+
+
+class ExponentialAverage(PadFilter):
+    """
+    Exponential moving average
+
+    @param float alpha      weight of the new position from 0.0 (frozen) to 1.0 (raw)
+    """
+
+    def __init__(self, alpha=0.4):
+        assert 0.0 < alpha <= 1.0
+        super(ExponentialAverage, self).__init__()
+        self._alpha = alpha
+        self._x = 0.0
+        self._y = 0.0
+
+    def update(self, x, y, t):
+        if self.last is None:
+            self._x = float(x)
+            self._y = float(y)
+        else:
+            self._x += self._alpha * (x - self._x)
+            self._y += self._alpha * (y - self._y)
+        self.last = (int(self._x), int(self._y))
+        return self.last
+
+
+class OneEuroFilter(PadFilter):
+    """
+    Speed adaptive low pass filter, see Casiez et al. "1 Euro Filter: A Simple
+    Speed-based Low-pass Filter for Noisy Input in Interactive Systems"
+
+    The cutoff frequency rises with the speed of the finger: slow moves are
+    strongly smoothed to remove jitter while fast moves are followed with
+    little lag. Speed is in pad units (-32768 to 32767) by second.
+
+    @param float mincutoff  cutoff frequency in Hz when the finger does not move
+    @param float beta       cutoff increase in Hz by unit/s of speed
+    @param float dcutoff    cutoff frequency in Hz of the speed estimation
+    """
+
+    def __init__(self, mincutoff=2.0, beta=0.0005, dcutoff=1.0):
+        super(OneEuroFilter, self).__init__()
+        self._mincutoff = mincutoff
+        self._beta = beta
+        self._dcutoff = dcutoff
+        self._t = 0.0
+        self._x = 0.0
+        self._y = 0.0
+        self._dx = 0.0
+        self._dy = 0.0
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        return 1.0 / (1.0 + 1.0 / (2.0 * math.pi * cutoff * dt))
+
+    def update(self, x, y, t):
+        if self.last is None:
+            self._x = float(x)
+            self._y = float(y)
+            self._dx = 0.0
+            self._dy = 0.0
+        else:
+            dt = t - self._t
+            if dt <= 0.0:
+                dt = PERIOD
+            a = self._alpha(self._dcutoff, dt)
+            self._dx += a * ((x - self._x) / dt - self._dx)
+            self._dy += a * ((y - self._y) / dt - self._dy)
+            self._x += self._alpha(self._mincutoff + self._beta * abs(self._dx), dt) * (x - self._x)
+            self._y += self._alpha(self._mincutoff + self._beta * abs(self._dy), dt) * (y - self._y)
+        self._t = t
+        self.last = (int(self._x), int(self._y))
+        return self.last
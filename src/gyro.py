@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Gyro rates processing for gyro aiming"""
+
+from enum import IntEnum
+
+
+# Raw gyro units by deg/s (2000 deg/s full scale on 16 bits)
+UNITS_PER_DPS = 16.384
+
+# The controller is still when every rate stays within STILL_RATE deg/s of
+# the bias for STILL_TIME s, the bias then follows the rates with a
+# BIAS_TIME s time constant
+STILL_RATE = 2.0
+STILL_TIME = 0.5
+BIAS_TIME = 2.0
+
+# Longest time step integrated, reports are expected every few ms
+MAX_STEP = 0.02
+
+
+class GyroAxes(IntEnum):
+    """Rotation axes of the controller, index in (gpitch, groll, gyaw)"""
+    PITCH = 0
+    ROLL = 1
+    YAW = 2
+
+
+class SensitivityCurve(object):
+    """
+    Output by angular speed
+
+    The sensitivity goes linearly from slow below slow_rate to fast above
+    fast_rate, so slow turns are precise and flicks cover large angles. Below
+    tighten the sensitivity is scaled down with the speed, it hides the
+    residual sensor noise without the dead spot of a deadzone. A negative
+    sensitivity inverts the axis.
+
+    @param float slow       output by degree at low speed (mouse units by
+                            degree, stick units by deg/s for axes)
+    @param float fast       output by degree at high speed, slow by default
+    @param float slow_rate  speed in deg/s up to which slow is used
+    @param float fast_rate  speed in deg/s from which fast is used
+    @param float tighten    speed in deg/s below which the output is tightened
+    """
+
+    def __init__(self, slow=1.0, fast=None, slow_rate=0.0, fast_rate=0.0, tighten=0.0):
+        self.slow = float(slow)
+        self.fast = self.slow if fast is None else float(fast)
+        self.slow_rate = float(slow_rate)
+        self.fast_rate = max(float(fast_rate), self.slow_rate)
+        self.tighten = float(tighten)
+        if self.fast_rate > self.slow_rate:
+            self._slope = (self.fast - self.slow) / (self.fast_rate - self.slow_rate)
+        else:
+            self._slope = 0.0
+
+    def apply(self, rate):
+        """
+        Return the output of an angular speed
+
+        @param float rate       angular speed in deg/s
+        """
+        speed = rate if rate >= 0.0 else -rate
+        if speed >= self.fast_rate:
+            sens = self.fast
+        elif speed <= self.slow_rate:
+            sens = self.slow
+        else:
+            sens = self.slow + (speed - self.slow_rate) * self._slope
+        if speed < self.tighten:
+            sens *= speed / self.tighten
+        return rate * sens
+
+
+class Gyro(object):
+    """
+    Gyro rates of the input reports with online bias tracking
+
+    Each report the bias is removed from the raw rates and the two selected
+    axes go through their sensitivity curves. The bias starts from the
+    calibration and is refined while the controller lies still. Only floats
+    are kept in attributes, nothing is allocated per report.
+
+    @param tuple bias       (pitch, roll, yaw) raw rates at rest
+    @param SensitivityCurve xcurve  horizontal output
+    @param SensitivityCurve ycurve  vertical output
+    @param GyroAxes xaxis   rotation giving the horizontal output
+    @param GyroAxes yaxis   rotation giving the vertical output
+    """
+
+    def __init__(self, bias=(0, 0, 0), xcurve=None, ycurve=None,
+                 xaxis=GyroAxes.YAW, yaxis=GyroAxes.PITCH):
+        self.xcurve = xcurve or SensitivityCurve()
+        self.ycurve = ycurve or SensitivityCurve()
+        self.xaxis = int(xaxis)
+        self.yaxis = int(yaxis)
+        self.x = 0.0
+        self.y = 0.0
+        self._last = None
+        self.setBias(bias)
+        self.reset()
+
+    def setBias(self, bias):
+        """Set the raw rates at rest, ie Calibration.gyro_bias"""
+        self._bp, self._br, self._by = (float(b) for b in bias)
+        self._still_time = 0.0
+
+    @property
+    def bias(self):
+        return (self._bp, self._br, self._by)
+
+    def reset(self):
+        """Forget the move remainders, ie when the gyro is disengaged"""
+        self._rx = 0.0
+        self._ry = 0.0
+
+    def update(self, pitch, roll, yaw, now):
+        """
+        Feed the raw rates of a report, the outputs are set in x and y
+
+        @param int pitch        raw pitch rate
+        @param int roll         raw roll rate
+        @param int yaw          raw yaw rate
+        @param float now        time of the report in s
+
+        @return float           time step since the previous report
+        """
+        last = self._last
+        self._last = now
+        dt = 0.0 if last is None else min(max(now - last, 0.0), MAX_STEP)
+
+        dp = pitch - self._bp
+        dr = roll - self._br
+        dy = yaw - self._by
+        lim = STILL_RATE * UNITS_PER_DPS
+        if -lim < dp < lim and -lim < dr < lim and -lim < dy < lim:
+            self._still_time += dt
+            if self._still_time >= STILL_TIME:
+                k = dt / BIAS_TIME
+                self._bp += dp * k
+                self._br += dr * k
+                self._by += dy * k
+        else:
+            self._still_time = 0.0
+
+        xaxis, yaxis = self.xaxis, self.yaxis
+        x = dp if xaxis == 0 else dr if xaxis == 1 else dy
+        y = dp if yaxis == 0 else dr if yaxis == 1 else dy
+        self.x = self.xcurve.apply(x / UNITS_PER_DPS)
+        self.y = self.ycurve.apply(y / UNITS_PER_DPS)
+        return dt
+
+    def move(self, dt):
+        """
+        Integrate the outputs over a time step, the sub unit remainders are
+        kept for the next move
+
+        @return tuple           integer (dx, dy) move
+        """
+        self._rx += self.x * dt
+        self._ry += self.y * dt
+        dx = int(self._rx)
+        dy = int(self._ry)
+        self._rx -= dx
+        self._ry -= dy
+        return dx, dy
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Fixed rate kinetic integrator for trackball and scroll wheel inertia"""
+
+import math
+from time import monotonic
+
+
+# Default integration rate in Hz
+RATE = 1000
+
+# Maximum time integrated in one tick after the loop was late
+MAX_CATCHUP = 0.1
+
+
+class Inertia(object):
+    """
+    Free spinning ball slowed down by a constant friction deceleration
+
+    The ball is thrown with a velocity and then integrated at a fixed rate on
+    the monotonic clock, whatever the arrival of USB reports. Each tick the
+    exact displacement since the previous one is added to the sub unit
+    remainders and the whole units are emitted in a single batch. Once the
+    ball stops the integrator sleeps: timeout() returns None until the next
+    throw, so an idle ball does not wake up the event loop.
+
+    Velocity and deceleration are in ball units (ie radians), moves are
+    scaled to output units (ie pixels) on each axis.
+
+    @param callable emit    called with the integer (dx, dy) move of a tick
+    @param float decel      friction deceleration in ball units by s^2
+    @param float xscale     output units by ball unit on x-axis
+    @param float yscale     output units by ball unit on y-axis
+    @param int rate         integration rate in Hz
+    """
+
+    def __init__(self, emit, decel, xscale, yscale, rate=RATE):
+        self._emit = emit
+        self._speed = 0.0
+        self._ux = 0.0
+        self._uy = 0.0
+        self._dx = 0.0
+        self._dy = 0.0
+        self._next = None
+        self.ticks = 0
+        self.setParams(decel, xscale, yscale, rate)
+
+    def setParams(self, decel, xscale, yscale, rate=RATE):
+        """
+        Update the ball model, see constructor
+        """
+        assert rate > 0
+        self._decel = decel
+        self._xscale = xscale
+        self._yscale = yscale
+        self._period = 1.0 / rate
+
+    def throw(self, xvel, yvel, now=None):
+        """
+        Start a glide
+
+        @param float xvel       velocity in ball units by s on x-axis
+        @param float yvel       velocity in ball units by s on y-axis
+        @param float now        monotonic time of the throw
+        """
+        speed = math.sqrt(xvel ** 2 + yvel ** 2)
+        if not speed:
+            self.stop()
+            return
+        self._speed = speed
+        self._ux = xvel / speed
+        self._uy = yvel / speed
+        self._next = (monotonic() if now is None else now) + self._period
+
+    def stop(self):
+        """Stop the ball and drop the sub unit remainders"""
+        self._speed = 0.0
+        self._dx = 0.0
+        self._dy = 0.0
+        self._next = None
+
+    def moving(self):
+        """Return True while the ball is gliding"""
+        return self._next is not None
+
+    def velocity(self):
+        """Return current (xvel, yvel) in ball units by s"""
+        return self._speed * self._ux, self._speed * self._uy
+
+    def timeout(self, now):
+        """
+        Return time in s before next tick, None while the ball is stopped
+        """
+        if self._next is None:
+            return None
+        return max(0.0, self._next - now)
+
+    def tick(self, now):
+        """
+        Integrate whole periods elapsed up to now and emit the move
+
+        @param float now        monotonic time
+
+        @return float           distance in ball units travelled this tick,
+                                0.0 while no period has elapsed
+        """
+        if self._next is None or now < self._next:
+            return 0.0
+
+        steps = int((now - self._next) / self._period) + 1
+        dt = min(steps * self._period, MAX_CATCHUP)
+        self._next = now + self._period - (now - self._next) % self._period
+        self.ticks += 1
+
+        # Constant deceleration along the direction of the ball
+        speed = self._speed
+        if self._decel * dt >= speed:
+            dist = speed * speed / (2.0 * self._decel)
+            self._speed = 0.0
+            self._next = None
+        else:
+            dist = (speed - 0.5 * self._decel * dt) * dt
+            self._speed = speed - self._decel * dt
+
+        self._dx += dist * self._ux * self._xscale
+        self._dy += dist * self._uy * self._yscale
+        dx = int(self._dx)
+        dy = int(self._dy)
+        if self._next is None:
+            self._dx = 0.0
+            self._dy = 0.0
+        else:
+            self._dx -= dx
+            self._dy -= dy
+        if dx or dy:
+            self._emit(dx, dy)
+        return dist
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Serve every Steam Controller from one process and one USB context"""
+
+from time import monotonic
+
+from steamcontroller import (
+    SteamController,
+    TRANSFERS,
+    VENDOR_ID,
+    INTERFACES,
+    ARRIVAL_RETRY,
+    openSlots,
+    claimSlot,
+)
+import steamcontroller
+from steamcontroller.tools import LazyModule
+
+usb1 = LazyModule('usb1')
+
+
+class SteamControllerManager(object):
+    """
+    Claim all available controller interfaces (wired controllers and the four
+    slots of each wireless dongle) after a single bus enumeration and route
+    the reports of each one to its own callback from a single event loop.
+    Controllers plugged later are served too: the bus is scanned again on
+    hotplug arrivals, or every RECONNECT_POLL without hotplug support.
+
+    @param factory          function called with the SCSlot of each claimed
+                            interface, it returns the callback of this
+                            controller, ie DevicePool.lease
+    @param int transfers    interrupt transfers kept in flight by controller
+    @param release          optional function called with the callback of a
+                            controller once it is gone, ie DevicePool.release
+    @param ctx              optional libusb context, a new one by default
+    """
+
+    def __init__(self, factory, transfers=TRANSFERS, release=None, ctx=None):
+        self._ctx = ctx if ctx is not None else usb1.USBContext()
+        self._factory = factory
+        self._release = release
+        self._transfers = transfers
+        self._controllers = []
+        self._handles = []
+        self._released = False
+        self._hotplug_handle = None
+        self._arrived = False
+        self._departed = False
+        self._open()
+
+    def _open(self):
+        slots = openSlots(self._ctx)
+        if not slots:
+            raise ValueError('No SteamController Device found')
+        self._serve(slots)
+        if not self._controllers:
+            raise ValueError('All SteamController are busy')
+
+    def _rescan(self):
+        """
+        Serve the controllers plugged since the last scan
+
+        @return bool            None if there is no new controller, False if
+                                none of them could be claimed (ie busy)
+        """
+        served = set((handle.getDevice().getBusNumber(),
+                      handle.getDevice().getDeviceAddress()) for handle in self._handles)
+        slots, duplicates = [], set()
+        for slot in openSlots(self._ctx):
+            device = slot.handle.getDevice()
+            if (device.getBusNumber(), device.getDeviceAddress()) in served:
+                # Already served from another handle, claiming would fail busy
+                duplicates.add(slot.handle)
+            else:
+                slots.append(slot)
+        for handle in duplicates:
+            handle.close()
+        if not slots:
+            return None
+        return self._serve(slots) > 0
+
+    def _serve(self, slots):
+        """
+        Claim the slots and build their controllers, handles left without
+        controller are closed
+
+        @return int             number of new controllers
+        """
+        count = len(self._controllers)
+        claimed = [slot for slot in slots if claimSlot(slot)]
+
+        for slot in claimed:
+            try:
+                # keep_alive: exit command turns the controller off, the
+                # slot stay claimed for the next connection
+                self._controllers.append(SteamController(callback=self._factory(slot),
+                                                         keep_alive=True,
+                                                         transfers=self._transfers,
+                                                         ctx=self._ctx,
+                                                         slot=slot))
+            except usb1.USBError:
+                # The failed open released the slot
+                pass
+
+        used = set(sc._slot.handle for sc in self._controllers)
+        for handle in set(x.handle for x in slots):
+            if handle in used:
+                self._handles.append(handle)
+            else:
+                handle.close()
+        return len(self._controllers) - count
+
+    def _hotplug(self):
+        """
+        Register the hotplug callback on first call
+
+        @return bool            False if libusb has no hotplug support
+        """
+        if self._hotplug_handle is None:
+            self._hotplug_handle = False
+            try:
+                if self._ctx.hasCapability(usb1.CAP_HAS_HOTPLUG):
+                    self._hotplug_handle = self._ctx.hotplugRegisterCallback(
+                        self._hotplugEvent, vendor_id=VENDOR_ID)
+            except (AttributeError, usb1.USBError):
+                pass
+        return self._hotplug_handle is not False
+
+    def _hotplugEvent(self, ctx, device, event):
+        """libusb hotplug callback, devices can not be opened from here"""
+        if device.getProductID() not in INTERFACES:
+            return False
+        if event == usb1.HOTPLUG_EVENT_DEVICE_ARRIVED:
+            self._arrived = True
+        else:
+            self._departed = True
+        return False
+
+    @property
+    def controllers(self):
+        """List of served SteamController"""
+        return list(self._controllers)
+
+    def run(self):
+        """Process USB events of all controllers until released"""
+        try:
+            hotplug = self._hotplug()
+            # Next scan of the bus and delays before the following ones: a new
+            # controller may not be ready at its arrival, or stays busy (ie
+            # claimed by Steam) and is polled until it leaves
+            scan = None if hotplug else monotonic() + steamcontroller.RECONNECT_POLL
+            retries = []
+            while not self._released:
+                now = monotonic()
+                if self._arrived:
+                    self._arrived = False
+                    self._departed = False
+                    scan, retries = now, list(ARRIVAL_RETRY)
+                elif self._departed and not retries:
+                    self._departed = False
+                    if hotplug:
+                        scan = None
+                if scan is not None and now >= scan:
+                    added = self._rescan()
+                    if added is False and retries:
+                        scan = now + retries.pop(0)
+                    elif added is False or not hotplug:
+                        scan = now + steamcontroller.RECONNECT_POLL
+                    else:
+                        scan, retries = None, []
+
+                timeouts = []
+                if scan is not None:
+                    timeouts.append(max(0.0, scan - now))
+                for sc in self._controllers:
+                    sc._flush()
+                    timeout = sc._timeout()
+                    if timeout is not None:
+                        timeouts.append(timeout)
+
+                if timeouts:
+                    self._ctx.handleEventsTimeout(tv=min(timeouts))
+                else:
+                    self._ctx.handleEvents()
+
+                for sc in list(self._controllers):
+                    sc._flush()
+                    sc._tick()
+                    sc._sendPending()
+                    if not sc.isOpen():
+                        self._remove(sc)
+        except usb1.USBErrorInterrupted:
+            pass
+        finally:
+            self.close()
+
+    def _remove(self, sc):
+        """Drop a controller that is gone, and its handle once unused"""
+        self._controllers.remove(sc)
+        try:
+            sc._close()
+        except usb1.USBError:
+            pass
+        sc._disconnect()
+        if self._release is not None:
+            self._release(sc._cb)
+        handle = sc._slot.handle
+        if all(other._slot.handle is not handle for other in self._controllers):
+            self._handles.remove(handle)
+            try:
+                handle.close()
+            except usb1.USBError:
+                pass
+
+    def release(self):
+        """
+        Give all controllers back, ie to the Steam client: run() closes them
+        without turning them off and returns. Can be called from any thread.
+        """
+        self._released = True
+        try:
+            self._ctx.interruptEventHandler()
+        except (AttributeError, usb1.USBError):
+            pass
+
+    def close(self):
+        """Release all controllers and devices"""
+        for sc in self._controllers:
+            try:
+                sc._close(turnoff=not self._released)
+            except usb1.USBError:
+                pass
+            sc._disconnect()
+        self._controllers = []
+        for handle in self._handles:
+            try:
+                handle.resetDevice()
+                handle.close()
+            except usb1.USBError:
+                pass
+        self._handles = []
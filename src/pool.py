@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Long lived event mappers and virtual devices shared by controller sessions"""
+
+import threading
+
+from steamcontroller import SCStatus
+
+
+class _Lease(object):
+    """
+    Controller callback acquiring a mapper of the pool on its first input
+    report: the empty slots of a dongle never send one and get no devices
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self.mapper = None
+
+    def __call__(self, sc, sci):
+        if self.mapper is None:
+            if sci.status != SCStatus.INPUT:
+                return
+            self.mapper = self._pool.acquire()
+        self.mapper.process(sc, sci)
+
+
+class DevicePool(object):
+    """
+    Event mappers and their uinput devices kept across controller reconnects
+
+    Mappers are built once and their devices are created eagerly, in
+    parallel, so the first report does not pay the device creation and games
+    keep seeing the same devices when the controller reconnects. Only the USB
+    side is reopened: each session acquires the first free mappers in order,
+    more are built on demand, reset() ends the session and releases what the
+    controllers were holding.
+
+    @param factory          function returning a configured EventMapper, ie evminit
+    @param int size         number of mappers built at once
+    """
+
+    def __init__(self, factory, size=1):
+        self._factory = factory
+        self._mappers = []
+        self._held = set()
+        self._lock = threading.Lock()
+        self._grow(size)
+
+    def _grow(self, count):
+        """Build count mappers and create their devices in parallel"""
+        mappers = [None] * count
+        errors = []
+
+        def _build(i):
+            try:
+                mappers[i] = self._factory()
+            except Exception as e:
+                errors.append(e)
+
+        def _create(uip):
+            try:
+                uip.createDevice()
+            except Exception as e:
+                errors.append(e)
+
+        # Factories may already create some devices, ie Keyboard delay setup
+        self._parallel(_build, range(count))
+        if not errors:
+            self._parallel(_create, [uip for evm in mappers for uip in evm.devices
+                                     if not uip.created])
+        if errors:
+            for evm in mappers:
+                if evm is not None:
+                    for uip in evm.devices:
+                        uip.destroyDevice()
+            raise errors[0]
+        self._mappers.extend(mappers)
+
+    @staticmethod
+    def _parallel(target, items):
+        threads = [threading.Thread(target=target, args=(item,)) for item in items]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def __len__(self):
+        return len(self._mappers)
+
+    def __getitem__(self, index):
+        return self._mappers[index]
+
+    def acquire(self):
+        """
+        Return the first free mapper of the session, the same controller
+        order gives the same devices after a reconnect
+
+        @return EventMapper
+        """
+        with self._lock:
+            index = next((i for i in range(len(self._mappers)) if i not in self._held), None)
+            if index is None:
+                self._grow(1)
+                index = len(self._mappers) - 1
+            self._held.add(index)
+            return self._mappers[index]
+
+    def lease(self, slot=None):
+        """
+        Return a controller callback acquiring its mapper on the first input
+        report, ie the factory of SteamControllerManager
+
+        @param slot             SCSlot of the controller, unused
+        """
+        return _Lease(self)
+
+    def release(self, mapper):
+        """
+        Give a mapper back before the end of the session, ie when its
+        controller is gone: held keys are released, axes centered
+
+        @param mapper           EventMapper returned by acquire() or callback
+                                returned by lease()
+        """
+        if isinstance(mapper, _Lease):
+            lease = mapper
+            mapper, lease.mapper = lease.mapper, None
+            if mapper is None:
+                return
+        with self._lock:
+            for index, evm in enumerate(self._mappers):
+                if evm is mapper and index in self._held:
+                    evm.reset()
+                    self._held.discard(index)
+
+    def reset(self):
+        """End the session: held keys are released, axes centered"""
+        with self._lock:
+            for index in self._held:
+                self._mappers[index].reset()
+            self._held = set()
+
+    def close(self):
+        """Destroy all devices"""
+        with self._lock:
+            for evm in self._mappers:
+                for uip in evm.devices:
+                    uip.destroyDevice()
+            self._mappers = []
+            self._held = set()
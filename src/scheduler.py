@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Control message scheduler"""
+
+from time import monotonic
+from collections import deque
+from enum import IntEnum
+
+
+# Default control messages budget in messages per second and burst size
+RATE = 200.0
+BURST = 4
+
+# Maximum number of queued messages by priority
+QUEUE_SIZE = 32
+
+
+class Priority(IntEnum):
+    """Control messages priorities, lower is sent first"""
+    EXIT = 0
+    SETTINGS = 1
+    HAPTIC = 2
+
+
+class ControlScheduler(object):
+    """
+    Control message scheduler
+
+    Messages are sent by priority then in order. A message pushed with a key
+    replace the pending message with the same key (ie a newer haptic pulse on
+    the same pad replace the pending one). A token bucket limits the number of
+    messages sent per second, exit messages are never delayed.
+
+    @param float rate       messages per second
+    @param int burst        messages that can be sent at once
+    @param int queue_size   maximum number of pending messages by priority
+    @param clock            function returning the current time in s
+    """
+
+    def __init__(self, rate=RATE, burst=BURST, queue_size=QUEUE_SIZE, clock=monotonic):
+        self._rate = float(rate)
+        self._burst = float(burst)
+        self._tokens = float(burst)
+        self._clock = clock
+        self._last = clock()
+        self._queues = dict((prio, deque()) for prio in Priority)
+        self._keyed = {}
+        self._queue_size = queue_size
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def push(self, data, priority=Priority.SETTINGS, key=None):
+        """
+        Queue a control message
+
+        @param bytes data       message
+        @param Priority priority
+        @param key              coalescing key or None
+        """
+        if key is not None:
+            entry = self._keyed.get(key)
+            if entry is not None:
+                entry[0] = data
+                self.coalesced += 1
+                return
+        queue = self._queues[priority]
+        if len(queue) >= self._queue_size:
+            _, old_key = queue.popleft()
+            if old_key is not None:
+                del self._keyed[old_key]
+            self.dropped += 1
+        entry = [data, key]
+        queue.append(entry)
+        if key is not None:
+            self._keyed[key] = entry
+
+    def _refill(self, now):
+        self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+        self._last = now
+
+    def pop(self, now=None):
+        """
+        Return the next message allowed by the budget or None
+        """
+        if now is None:
+            now = self._clock()
+        self._refill(now)
+        for prio in Priority:
+            queue = self._queues[prio]
+            if not queue:
+                continue
+            if prio != Priority.EXIT and self._tokens < 1.0:
+                return None
+            data, key = queue.popleft()
+            if key is not None:
+                del self._keyed[key]
+            self._tokens -= 1.0
+            self.sent += 1
+            return data
+        return None
+
+    def timeout(self, now=None):
+        """
+        Return time in s before a pending message can be sent, None if queue is empty
+        """
+        if not len(self):
+            return None
+        if now is None:
+            now = self._clock()
+        self._refill(now)
+        if self._queues[Priority.EXIT] or self._tokens >= 1.0:
+            return 0.0
+        return (1.0 - self._tokens) / self._rate
+
+    def clear(self):
+        """Forget all pending messages"""
+        for queue in self._queues.values():
+            queue.clear()
+        self._keyed = {}
+
+    def stats(self):
+        """Return queue depth and counters"""
+        return {
+            'depth': len(self),
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+        }
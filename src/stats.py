@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""USB link statistics computed from received reports"""
+
+from bisect import bisect_left
+from time import monotonic
+
+from steamcontroller.decoder import SCStatus
+
+
+# Upper bounds in ms of the inter-arrival histogram buckets, last bucket is open
+JITTER_BUCKETS = (1, 2, 4, 6, 8, 12, 16, 32, 64, 128)
+
+# Sequence numbers of dropped reports remembered to recognize late ones
+REORDER_WINDOW = 64
+
+
+def _statusName(status):
+    try:
+        return SCStatus(status).name
+    except ValueError:
+        return '0x{:02x}'.format(status)
+
+
+class LinkStats(object):
+    """
+    Running link statistics of a SteamController
+
+    Sequence gaps on input reports are counted as dropped reports (lost on the
+    radio link or on the bus) until they arrive late, while the callback time
+    tells how long the event mapper kept the USB thread busy.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Reset all counters"""
+        self.received = 0
+        self.dropped = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.status = {}
+        self.jitter = [0] * (len(JITTER_BUCKETS) + 1)
+        self.callbacks = 0
+        self.callback_time = 0.0
+        self.callback_max = 0.0
+        self._seq = None
+        self._missing = set()
+        self._last = {}
+        self._start = monotonic()
+
+    def resync(self):
+        """Forget the last sequence number, used when a controller (re)connects"""
+        self._seq = None
+        self._missing = set()
+
+    def report(self, status, now):
+        """
+        Account a received report
+
+        @param int status       report status
+        @param float now        monotonic arrival time
+        """
+        self.received += 1
+        self.status[status] = self.status.get(status, 0) + 1
+        last = self._last.get(status)
+        self._last[status] = now
+        if status == SCStatus.INPUT and last is not None:
+            self.jitter[bisect_left(JITTER_BUCKETS, (now - last) * 1000.0)] += 1
+
+    def sequence(self, seq):
+        """
+        Account the sequence number of an input report
+
+        @param int seq          16 bits sequence number
+        """
+        if self._seq is None:
+            self._seq = seq
+            return
+        delta = (seq - self._seq) & 0xffff
+        if delta == 0:
+            self.duplicates += 1
+        elif delta >= 0x8000:
+            self.reordered += 1
+            # Counted as dropped with the gap it left
+            if seq in self._missing:
+                self._missing.discard(seq)
+                self.dropped -= 1
+        else:
+            self.dropped += delta - 1
+            self._seq = seq
+            if delta > 1:
+                self._missing = set(x for x in self._missing
+                                    if (seq - x) & 0xffff < REORDER_WINDOW)
+                self._missing.update((seq - i) & 0xffff
+                                     for i in range(1, min(delta, REORDER_WINDOW)))
+
+    def callback(self, duration):
+        """
+        Account the time spent in the user callback
+
+        @param float duration   callback duration in s
+        """
+        self.callbacks += 1
+        self.callback_time += duration
+        if duration > self.callback_max:
+            self.callback_max = duration
+
+    def since(self, status):
+        """
+        Return time in s since the last report of given status or None
+        """
+        last = self._last.get(status)
+        if last is None:
+            return None
+        return monotonic() - last
+
+    def snapshot(self):
+        """Return a dict with a copy of all statistics"""
+        total = self.status.get(SCStatus.INPUT, 0) + self.dropped
+        return {
+            'elapsed': monotonic() - self._start,
+            'received': self.received,
+            'dropped': self.dropped,
+            'loss': float(self.dropped) / total if total else 0.0,
+            'duplicates': self.duplicates,
+            'reordered': self.reordered,
+            'status': dict((_statusName(k), v) for k, v in self.status.items()),
+            'jitter': dict(zip([str(b) for b in JITTER_BUCKETS] + ['inf'], self.jitter)),
+            'since_input': self.since(SCStatus.INPUT),
+            'since_idle': self.since(SCStatus.IDLE),
+            'callbacks': self.callbacks,
+            'callback_mean': self.callback_time / self.callbacks if self.callbacks else 0.0,
+            'callback_max': self.callback_max,
+        }
+
+    def __str__(self):
+        snap = self.snapshot()
+
+        def _ms(val):
+            return '-' if val is None else '{:.1f}ms'.format(val * 1000.0)
+
+        lines = [
+            'received {received:d}, dropped {dropped:d} ({0:.2f}%), '
+            'duplicates {duplicates:d}, reordered {reordered:d}'.format(snap['loss'] * 100.0, **snap),
+            'status ' + ', '.join('{}: {}'.format(k, v) for k, v in sorted(snap['status'].items())),
+            'inter-arrival ' + ', '.join('<={}ms: {}'.format(b, n) for b, n in
+                                         zip(list(JITTER_BUCKETS) + ['inf'], self.jitter) if n),
+            'since input {}, since idle {}'.format(_ms(snap['since_input']), _ms(snap['since_idle'])),
+            'callback mean {}, max {}'.format(_ms(snap['callback_mean']), _ms(snap['callback_max'])),
+        ]
+        return '\n'.join(lines)
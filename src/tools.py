@@ -24,7 +24,8 @@
 
 """Misc Tools"""
 
-import imp
+from importlib import import_module
+from importlib.machinery import EXTENSION_SUFFIXES
 
 
 def static_vars(**kwargs):
@@ -39,6 +40,27 @@ def static_vars(**kwargs):
 
 def get_so_extensions():
     """Return so file extension compatible with Python and PyPy"""
-    for ext, _, typ in imp.get_suffixes():
-        if typ == imp.C_EXTENSION:
-            yield ext
+    for ext in EXTENSION_SUFFIXES:
+        yield ext
+
+
+class LazyModule(object):
+    """
+    Module imported on first attribute access
+
+    Attributes are cached on the proxy once read, so later accesses cost a
+    plain attribute lookup:
+
+        usb1 = LazyModule('usb1')
+    """
+
+    def __init__(self, name):
+        self.__name = name
+        self.__module = None
+
+    def __getattr__(self, attr):
+        if self.__module is None:
+            self.__module = import_module(self.__name)
+        value = getattr(self.__module, attr)
+        setattr(self, attr, value)
+        return value
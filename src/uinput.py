@@ -26,164 +26,601 @@
 import os
 import time
 import math
+import errno
+import fcntl
 import ctypes
+from array import array
+from struct import Struct
 from enum import IntEnum
 from collections import deque
 
-import _ctypes
-
-from steamcontroller.cheader import defines
 from steamcontroller.tools import get_so_extensions
+from steamcontroller.inertia import Inertia
+
+
+# Event types and codes used by the backends, part of the kernel ABI
+EV_SYN = 0x00
+EV_KEY = 0x01
+EV_REL = 0x02
+EV_ABS = 0x03
+EV_MSC = 0x04
+EV_REP = 0x14
+SYN_REPORT = 0
+MSC_SCAN = 0x04
+REP_DELAY = 0x00
+REP_PERIOD = 0x01
+
+# struct input_event, time is set by the kernel on uinput writes
+INPUT_EVENT = Struct('@llHHi')
+
+BUS_USB = 0x03
+ABS_CNT = 0x40
+
+
+def _IOC(direction, nr, size):
+    return (direction << 30) | (size << 16) | (ord('U') << 8) | nr
+
+
+# struct uinput_setup, struct uinput_abs_setup and legacy struct uinput_user_dev
+_UINPUT_SETUP = Struct('@4H80sI')
+_UINPUT_ABS_SETUP = Struct('@H6i')
+_UINPUT_USER_DEV = Struct('@80s4HI{0:d}i{0:d}i{0:d}i{0:d}i'.format(ABS_CNT))
+
+UI_DEV_CREATE = _IOC(0, 1, 0)
+UI_DEV_DESTROY = _IOC(0, 2, 0)
+UI_DEV_SETUP = _IOC(1, 3, _UINPUT_SETUP.size)
+UI_ABS_SETUP = _IOC(1, 4, _UINPUT_ABS_SETUP.size)
+UI_SET_EVBIT = _IOC(1, 100, 4)
+UI_SET_KEYBIT = _IOC(1, 101, 4)
+UI_SET_RELBIT = _IOC(1, 102, 4)
+UI_SET_ABSBIT = _IOC(1, 103, 4)
+UI_SET_MSCBIT = _IOC(1, 104, 4)
+
+# Maximum number of events buffered for a frame before a write is forced
+FRAME_EVENTS = 64
+
+# Kernel headers defines and the enums built from them are only loaded on
+# first access (see __getattr__) as parsing them is slow
+_LAZY = ('CHEAD', 'Keys', 'KeysOnly', 'Axes', 'Rels', 'scans')
+
+
+def _load():
+    """Get defines from Linux headers and build the enums, done once"""
+    g = globals()
+    if 'scans' in g:
+        return
+
+    from steamcontroller.cheader import cachedDefines
+
+    # Get all defines from Linux headers, parsed once and cached, or from the
+    # bundled snapshot if headers are not installed
+    if os.path.exists('/usr/include/linux/input-event-codes.h'):
+        CHEAD = cachedDefines('/usr/include', 'linux/input-event-codes.h')
+    elif os.path.exists('/usr/include/linux/input.h'):
+        CHEAD = cachedDefines('/usr/include', 'linux/input.h')
+    else:
+        from steamcontroller.inputcodes import DEFINES as CHEAD
+
+    # Keys enum contains all keys and button from linux/uinput.h (KEY_* BTN_*)
+    Keys = IntEnum('Keys', {i: CHEAD[i] for i in CHEAD.keys() if (i.startswith('KEY_') or
+                                                                  i.startswith('BTN_'))})
+    # Keys enum contains all keys and button from linux/uinput.h (KEY_* BTN_*)
+    KeysOnly = IntEnum('KeysOnly', {i: CHEAD[i] for i in CHEAD.keys() if i.startswith('KEY_')})
+
+    # Axes enum contains all axes from linux/uinput.h (ABS_*)
+    Axes = IntEnum('Axes', {i: CHEAD[i] for i in CHEAD.keys() if i.startswith('ABS_')})
+
+    # Rels enum contains all rels from linux/uinput.h (REL_*)
+    Rels = IntEnum('Rels', {i: CHEAD[i] for i in CHEAD.keys() if i.startswith('REL_')})
+
+    # Scan codes for each key (taken from a logitech keyboard)
+    scans = {
+        Keys.KEY_ESC: 0x70029,
+        Keys.KEY_F1: 0x7003a,
+        Keys.KEY_F2: 0x7003b,
+        Keys.KEY_F3: 0x7003c,
+        Keys.KEY_F4: 0x7003d,
+        Keys.KEY_F5: 0x7003e,
+        Keys.KEY_F6: 0x7003f,
+        Keys.KEY_F7: 0x70040,
+        Keys.KEY_F8: 0x70041,
+        Keys.KEY_F9: 0x70042,
+        Keys.KEY_F10: 0x70043,
+        Keys.KEY_F11: 0x70044,
+        Keys.KEY_F12: 0x70045,
+        Keys.KEY_SYSRQ: 0x70046,
+        Keys.KEY_SCROLLLOCK: 0x70047,
+        Keys.KEY_PAUSE: 0x70048,
+        Keys.KEY_GRAVE: 0x70035,
+        Keys.KEY_1: 0x7001e,
+        Keys.KEY_2: 0x7001f,
+        Keys.KEY_3: 0x70020,
+        Keys.KEY_4: 0x70021,
+        Keys.KEY_5: 0x70022,
+        Keys.KEY_6: 0x70023,
+        Keys.KEY_7: 0x70024,
+        Keys.KEY_8: 0x70025,
+        Keys.KEY_9: 0x70026,
+        Keys.KEY_0: 0x70027,
+        Keys.KEY_MINUS: 0x7002d,
+        Keys.KEY_EQUAL: 0x7002e,
+        Keys.KEY_BACKSPACE: 0x7002a,
+        Keys.KEY_TAB: 0x7002b,
+        Keys.KEY_Q: 0x70014,
+        Keys.KEY_W: 0x7001a,
+        Keys.KEY_E: 0x70008,
+        Keys.KEY_R: 0x70015,
+        Keys.KEY_T: 0x70017,
+        Keys.KEY_Y: 0x7001c,
+        Keys.KEY_U: 0x70018,
+        Keys.KEY_I: 0x7000c,
+        Keys.KEY_O: 0x70012,
+        Keys.KEY_P: 0x70013,
+        Keys.KEY_LEFTBRACE: 0x7002f,
+        Keys.KEY_RIGHTBRACE: 0x70030,
+        Keys.KEY_ENTER: 0x70028,
+        Keys.KEY_CAPSLOCK: 0x70039,
+        Keys.KEY_A: 0x70004,
+        Keys.KEY_S: 0x70016,
+        Keys.KEY_D: 0x70007,
+        Keys.KEY_F: 0x70009,
+        Keys.KEY_G: 0x7000a,
+        Keys.KEY_H: 0x7000b,
+        Keys.KEY_J: 0x7000d,
+        Keys.KEY_K: 0x7000e,
+        Keys.KEY_L: 0x7000f,
+        Keys.KEY_SEMICOLON: 0x70033,
+        Keys.KEY_APOSTROPHE: 0x70034,
+        Keys.KEY_BACKSLASH: 0x70032,
+        Keys.KEY_LEFTSHIFT: 0x700e1,
+        Keys.KEY_102ND: 0x70064,
+        Keys.KEY_Z: 0x7001d,
+        Keys.KEY_X: 0x7001b,
+        Keys.KEY_C: 0x70006,
+        Keys.KEY_V: 0x70019,
+        Keys.KEY_B: 0x70005,
+        Keys.KEY_N: 0x70011,
+        Keys.KEY_M: 0x70010,
+        Keys.KEY_COMMA: 0x70036,
+        Keys.KEY_DOT: 0x70037,
+        Keys.KEY_SLASH: 0x70038,
+        Keys.KEY_RIGHTSHIFT: 0x700e5,
+        Keys.KEY_LEFTCTRL: 0x700e0,
+        Keys.KEY_LEFTMETA: 0x700e3,
+        Keys.KEY_LEFTALT: 0x700e2,
+        Keys.KEY_SPACE: 0x7002c,
+        Keys.KEY_RIGHTALT: 0x700e6,
+        Keys.KEY_RIGHTMETA: 0x700e7,
+        Keys.KEY_COMPOSE: 0x70065,
+        Keys.KEY_RIGHTCTRL: 0x700e4,
+        Keys.KEY_INSERT: 0x70049,
+        Keys.KEY_HOME: 0x7004a,
+        Keys.KEY_PAGEUP: 0x7004b,
+        Keys.KEY_DELETE: 0x7004c,
+        Keys.KEY_END: 0x7004d,
+        Keys.KEY_PAGEDOWN: 0x7004e,
+        Keys.KEY_UP: 0x70052,
+        Keys.KEY_LEFT: 0x70050,
+        Keys.KEY_DOWN: 0x70051,
+        Keys.KEY_RIGHT: 0x7004f,
+        Keys.KEY_NUMLOCK: 0x70053,
+        Keys.KEY_KPSLASH: 0x70054,
+        Keys.KEY_KPASTERISK: 0x70055,
+        Keys.KEY_KPMINUS: 0x70056,
+        Keys.KEY_KP7: 0x7005f,
+        Keys.KEY_KP8: 0x70060,
+        Keys.KEY_KP9: 0x70061,
+        Keys.KEY_KPPLUS: 0x70057,
+        Keys.KEY_KP4: 0x7005c,
+        Keys.KEY_KP5: 0x7005d,
+        Keys.KEY_KP6: 0x7005e,
+        Keys.KEY_KP1: 0x70059,
+        Keys.KEY_KP2: 0x7005a,
+        Keys.KEY_KP3: 0x7005b,
+        Keys.KEY_KPENTER: 0x70058,
+        Keys.KEY_KP0: 0x70062,
+        Keys.KEY_KPDOT: 0x70063,
+        Keys.KEY_CONFIG: 0xc0183,
+        Keys.KEY_PLAYPAUSE: 0xc00cd,
+        Keys.KEY_MUTE: 0xc00e2,
+        Keys.KEY_VOLUMEDOWN: 0xc00ea,
+        Keys.KEY_VOLUMEUP: 0xc00e9,
+        Keys.KEY_HOMEPAGE: 0xc0223,
+
+        Keys.KEY_PREVIOUSSONG: 0xc00f0,
+        Keys.KEY_NEXTSONG: 0xc00f1,
+
+        Keys.KEY_BACK: 0xc00f2,
+        Keys.KEY_FORWARD: 0xc00f3,
+    }
+
+    g.update(CHEAD=CHEAD, Keys=Keys, KeysOnly=KeysOnly, Axes=Axes, Rels=Rels, scans=scans)
+
+
+def __getattr__(name):
+    # PEP 562 module __getattr__, python 3.7+
+    if name in _LAZY:
+        _load()
+        return globals()[name]
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+class UInputBackend(object):
+    """
+    Output backend interface used by UInput
+
+    create() returns a handle given back to all other methods, see
+    LibUInputBackend, NullBackend and RecordBackend
+    """
+
+    def create(self, uip):
+        """
+        Create the output device
+
+        @param UInput uip       device description (keys, axes, rels, ids, name)
+
+        @return                 device handle
+        """
+        raise NotImplementedError
+
+    def destroy(self, fd):
+        pass
+
+    def key(self, fd, key, val):
+        raise NotImplementedError
+
+    def abs(self, fd, axis, val):
+        raise NotImplementedError
+
+    def rel(self, fd, rel, val):
+        raise NotImplementedError
+
+    def scan(self, fd, val):
+        raise NotImplementedError
+
+    def setDelayPeriod(self, fd, delay, period):
+        raise NotImplementedError
+
+    def syn(self, fd):
+        raise NotImplementedError
+
+
+class _Frame(object):
+    """Events of an uinput device waiting for the next syn"""
+    __slots__ = ('fd', 'buf', 'count')
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.buf = bytearray(INPUT_EVENT.size * FRAME_EVENTS)
+        self.count = 0
+
+
+class _FrameBackend(UInputBackend):
+    """
+    Base of the /dev/uinput backends
+
+    Events of a frame are packed in a preallocated buffer and written with a
+    single write() by syn(), see stats() for the saved syscalls.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.events = 0
+        self.writes = 0
+        self.errors = 0
+
+    def _flush(self, frame):
+        """Write buffered events of a frame"""
+        if not frame.count:
+            return
+        self.events += frame.count
+        self.writes += 1
+        try:
+            os.write(frame.fd, memoryview(frame.buf)[:frame.count * INPUT_EVENT.size])
+        except OSError:
+            self.errors += 1
+        frame.count = 0
+
+    def _event(self, frame, typ, code, val):
+        INPUT_EVENT.pack_into(frame.buf, frame.count * INPUT_EVENT.size, 0, 0, typ, code, val)
+        frame.count += 1
+        if frame.count == FRAME_EVENTS:
+            self._flush(frame)
+
+    def key(self, frame, key, val):
+        self._event(frame, EV_KEY, key, val)
+
+    def abs(self, frame, axis, val):
+        self._event(frame, EV_ABS, axis, val)
+
+    def rel(self, frame, rel, val):
+        self._event(frame, EV_REL, rel, val)
+
+    def scan(self, frame, val):
+        self._event(frame, EV_MSC, MSC_SCAN, val)
+
+    def setDelayPeriod(self, frame, delay, period):
+        self._event(frame, EV_REP, REP_DELAY, delay)
+        self._event(frame, EV_REP, REP_PERIOD, period)
+        self._flush(frame)
+
+    def syn(self, frame):
+        self._event(frame, EV_SYN, SYN_REPORT, 0)
+        self.frames += 1
+        self._flush(frame)
+
+    def stats(self):
+        """
+        Return write statistics
+
+        @return dict            frames, events, writes, write errors, syscalls
+                                saved and saved per frame compared to one
+                                write per event
+        """
+        saved = self.events - self.writes
+        return {
+            'frames': self.frames,
+            'events': self.events,
+            'writes': self.writes,
+            'errors': self.errors,
+            'saved': saved,
+            'saved_per_frame': float(saved) / self.frames if self.frames else 0.0,
+        }
+
+
+def findLibUInput():
+    """Return the path of the libuinput C extension or None if not built"""
+    for extension in get_so_extensions():
+        path = os.path.abspath(os.path.normpath(os.path.join(os.path.dirname(__file__),
+                                                             '..',
+                                                             'libuinput' + extension)))
+        if os.path.exists(path):
+            return path
+    return None
+
+
+class LibUInputBackend(_FrameBackend):
+    """Real /dev/uinput devices created by the libuinput C extension"""
+
+    def __init__(self):
+        super(LibUInputBackend, self).__init__()
+        self._lib = None
+
+    def _get_lib(self):
+        if self._lib:
+            return self._lib
+        lib = findLibUInput()
+        if not lib:
+            raise OSError("Can't find libuinput")
+
+        self._lib = ctypes.CDLL(lib)
+        return self._lib
 
+    def create(self, uip):
+        lib = self._get_lib()
+
+        c_k = (ctypes.c_uint16 * len(uip._k))(*uip._k)
+        c_a = (ctypes.c_uint16 * len(uip._a))(*uip._a)
+        c_amin = (ctypes.c_int32 * len(uip._amin))(*uip._amin)
+        c_amax = (ctypes.c_int32 * len(uip._amax))(*uip._amax)
+        c_afuzz = (ctypes.c_int32 * len(uip._afuzz))(*uip._afuzz)
+        c_aflat = (ctypes.c_int32 * len(uip._aflat))(*uip._aflat)
+        c_r = (ctypes.c_uint16 * len(uip._r))(*uip._r)
+        c_vendor = ctypes.c_uint16(uip.vendor)
+        c_product = ctypes.c_uint16(uip.product)
+        c_version = ctypes.c_uint16(uip.version)
+        c_keyboard = ctypes.c_int(uip.keyboard)
+        c_name = ctypes.c_char_p(uip.name)
+
+        fd = lib.uinput_init(ctypes.c_int(len(uip._k)),
+                             c_k,
+                             ctypes.c_int(len(uip._a)),
+                             c_a,
+                             c_amin,
+                             c_amax,
+                             c_afuzz,
+                             c_aflat,
+                             ctypes.c_int(len(uip._r)),
+                             c_r,
+                             c_keyboard,
+                             c_vendor,
+                             c_product,
+                             c_version,
+                             c_name)
+        if fd < 0:
+            raise OSError("Can't create uinput device {} (error {:d})".format(uip.name, fd))
+        return _Frame(fd)
+
+    def destroy(self, frame):
+        self._get_lib().uinput_destroy(frame.fd)
+
+
+class IoctlUInputBackend(_FrameBackend):
+    """
+    Real /dev/uinput devices created with ioctl() calls, no C extension needed
+
+    Devices are set up with UI_DEV_SETUP and UI_ABS_SETUP, or with the legacy
+    uinput_user_dev write on kernels older than 4.5.
+    """
+
+    def create(self, uip):
+        fd = os.open('/dev/uinput', os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            if uip._k:
+                fcntl.ioctl(fd, UI_SET_EVBIT, EV_KEY)
+                for key in uip._k:
+                    fcntl.ioctl(fd, UI_SET_KEYBIT, key)
+            if uip._a:
+                fcntl.ioctl(fd, UI_SET_EVBIT, EV_ABS)
+                for axis in uip._a:
+                    fcntl.ioctl(fd, UI_SET_ABSBIT, axis)
+            if uip._r:
+                fcntl.ioctl(fd, UI_SET_EVBIT, EV_REL)
+                for rel in uip._r:
+                    fcntl.ioctl(fd, UI_SET_RELBIT, rel)
+            if uip.keyboard:
+                fcntl.ioctl(fd, UI_SET_EVBIT, EV_MSC)
+                fcntl.ioctl(fd, UI_SET_MSCBIT, MSC_SCAN)
+                fcntl.ioctl(fd, UI_SET_EVBIT, EV_REP)
+
+            try:
+                fcntl.ioctl(fd, UI_DEV_SETUP, _UINPUT_SETUP.pack(BUS_USB, uip.vendor, uip.product,
+                                                                  uip.version, uip.name, 0))
+                for axis, amin, amax, afuzz, aflat in zip(uip._a, uip._amin, uip._amax,
+                                                          uip._afuzz, uip._aflat):
+                    fcntl.ioctl(fd, UI_ABS_SETUP, _UINPUT_ABS_SETUP.pack(axis, 0, amin, amax,
+                                                                          afuzz, aflat, 0))
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, errno.ENOTTY):
+                    raise
+                absinfo = [[0] * ABS_CNT for _ in range(4)]
+                for i, axis in enumerate(uip._a):
+                    absinfo[0][axis] = uip._amax[i]
+                    absinfo[1][axis] = uip._amin[i]
+                    absinfo[2][axis] = uip._afuzz[i]
+                    absinfo[3][axis] = uip._aflat[i]
+                os.write(fd, _UINPUT_USER_DEV.pack(uip.name, BUS_USB, uip.vendor, uip.product,
+                                                   uip.version, 0, *sum(absinfo, [])))
+
+            fcntl.ioctl(fd, UI_DEV_CREATE)
+        except OSError:
+            os.close(fd)
+            raise
+        return _Frame(fd)
+
+    def destroy(self, frame):
+        try:
+            fcntl.ioctl(frame.fd, UI_DEV_DESTROY)
+        finally:
+            os.close(frame.fd)
+
+
+class NullBackend(UInputBackend):
+    """Discard all events, only count them"""
+
+    def __init__(self):
+        self._devices = 0
+        self.events = 0
+        self.frames = 0
+
+    def create(self, uip):
+        self._devices += 1
+        return self._devices
+
+    def _event(self, fd, *args):
+        self.events += 1
+
+    key = abs = rel = _event
+
+    def scan(self, fd, val):
+        self.events += 1
+
+    def setDelayPeriod(self, fd, delay, period):
+        pass
+
+    def syn(self, fd):
+        self.events += 1
+        self.frames += 1
+
+
+class RecordBackend(UInputBackend):
+    """
+    Record events in memory
+
+    Events are stored as (device, type, code, value) integers in an array,
+    events() gives them back as tuples.
+    """
+
+    def __init__(self):
+        self.devices = {}
+        self._buf = array('i')
+
+    def create(self, uip):
+        fd = len(self.devices) + 1
+        self.devices[fd] = uip
+        return fd
+
+    def destroy(self, fd):
+        self.devices.pop(fd, None)
+
+    def key(self, fd, key, val):
+        self._buf.extend((fd, EV_KEY, key, val))
+
+    def abs(self, fd, axis, val):
+        self._buf.extend((fd, EV_ABS, axis, val))
+
+    def rel(self, fd, rel, val):
+        self._buf.extend((fd, EV_REL, rel, val))
+
+    def scan(self, fd, val):
+        self._buf.extend((fd, EV_MSC, MSC_SCAN, val))
+
+    def setDelayPeriod(self, fd, delay, period):
+        self._buf.extend((fd, EV_REP, REP_DELAY, delay, fd, EV_REP, REP_PERIOD, period))
 
-# Get all defines from Linux headers
-if os.path.exists('/usr/include/linux/input-event-codes.h'):
-    CHEAD = defines('/usr/include', 'linux/input-event-codes.h')
-else:
-    CHEAD = defines('/usr/include', 'linux/input.h')
-
-# Keys enum contains all keys and button from linux/uinput.h (KEY_* BTN_*)
-Keys = IntEnum('Keys', {i: CHEAD[i] for i in CHEAD.keys() if (i.startswith('KEY_') or
-                                                              i.startswith('BTN_'))})
-# Keys enum contains all keys and button from linux/uinput.h (KEY_* BTN_*)
-KeysOnly = IntEnum('KeysOnly', {i: CHEAD[i] for i in CHEAD.keys() if i.startswith('KEY_')})
-
-# Axes enum contains all axes from linux/uinput.h (ABS_*)
-Axes = IntEnum('Axes', {i: CHEAD[i] for i in CHEAD.keys() if i.startswith('ABS_')})
-
-# Rels enum contains all rels from linux/uinput.h (REL_*)
-Rels = IntEnum('Rels', {i: CHEAD[i] for i in CHEAD.keys() if i.startswith('REL_')})
-
-# Scan codes for each key (taken from a logitech keyboard)
-scans = {
-    Keys.KEY_ESC: 0x70029,
-    Keys.KEY_F1: 0x7003a,
-    Keys.KEY_F2: 0x7003b,
-    Keys.KEY_F3: 0x7003c,
-    Keys.KEY_F4: 0x7003d,
-    Keys.KEY_F5: 0x7003e,
-    Keys.KEY_F6: 0x7003f,
-    Keys.KEY_F7: 0x70040,
-    Keys.KEY_F8: 0x70041,
-    Keys.KEY_F9: 0x70042,
-    Keys.KEY_F10: 0x70043,
-    Keys.KEY_F11: 0x70044,
-    Keys.KEY_F12: 0x70045,
-    Keys.KEY_SYSRQ: 0x70046,
-    Keys.KEY_SCROLLLOCK: 0x70047,
-    Keys.KEY_PAUSE: 0x70048,
-    Keys.KEY_GRAVE: 0x70035,
-    Keys.KEY_1: 0x7001e,
-    Keys.KEY_2: 0x7001f,
-    Keys.KEY_3: 0x70020,
-    Keys.KEY_4: 0x70021,
-    Keys.KEY_5: 0x70022,
-    Keys.KEY_6: 0x70023,
-    Keys.KEY_7: 0x70024,
-    Keys.KEY_8: 0x70025,
-    Keys.KEY_9: 0x70026,
-    Keys.KEY_0: 0x70027,
-    Keys.KEY_MINUS: 0x7002d,
-    Keys.KEY_EQUAL: 0x7002e,
-    Keys.KEY_BACKSPACE: 0x7002a,
-    Keys.KEY_TAB: 0x7002b,
-    Keys.KEY_Q: 0x70014,
-    Keys.KEY_W: 0x7001a,
-    Keys.KEY_E: 0x70008,
-    Keys.KEY_R: 0x70015,
-    Keys.KEY_T: 0x70017,
-    Keys.KEY_Y: 0x7001c,
-    Keys.KEY_U: 0x70018,
-    Keys.KEY_I: 0x7000c,
-    Keys.KEY_O: 0x70012,
-    Keys.KEY_P: 0x70013,
-    Keys.KEY_LEFTBRACE: 0x7002f,
-    Keys.KEY_RIGHTBRACE: 0x70030,
-    Keys.KEY_ENTER: 0x70028,
-    Keys.KEY_CAPSLOCK: 0x70039,
-    Keys.KEY_A: 0x70004,
-    Keys.KEY_S: 0x70016,
-    Keys.KEY_D: 0x70007,
-    Keys.KEY_F: 0x70009,
-    Keys.KEY_G: 0x7000a,
-    Keys.KEY_H: 0x7000b,
-    Keys.KEY_J: 0x7000d,
-    Keys.KEY_K: 0x7000e,
-    Keys.KEY_L: 0x7000f,
-    Keys.KEY_SEMICOLON: 0x70033,
-    Keys.KEY_APOSTROPHE: 0x70034,
-    Keys.KEY_BACKSLASH: 0x70032,
-    Keys.KEY_LEFTSHIFT: 0x700e1,
-    Keys.KEY_102ND: 0x70064,
-    Keys.KEY_Z: 0x7001d,
-    Keys.KEY_X: 0x7001b,
-    Keys.KEY_C: 0x70006,
-    Keys.KEY_V: 0x70019,
-    Keys.KEY_B: 0x70005,
-    Keys.KEY_N: 0x70011,
-    Keys.KEY_M: 0x70010,
-    Keys.KEY_COMMA: 0x70036,
-    Keys.KEY_DOT: 0x70037,
-    Keys.KEY_SLASH: 0x70038,
-    Keys.KEY_RIGHTSHIFT: 0x700e5,
-    Keys.KEY_LEFTCTRL: 0x700e0,
-    Keys.KEY_LEFTMETA: 0x700e3,
-    Keys.KEY_LEFTALT: 0x700e2,
-    Keys.KEY_SPACE: 0x7002c,
-    Keys.KEY_RIGHTALT: 0x700e6,
-    Keys.KEY_RIGHTMETA: 0x700e7,
-    Keys.KEY_COMPOSE: 0x70065,
-    Keys.KEY_RIGHTCTRL: 0x700e4,
-    Keys.KEY_INSERT: 0x70049,
-    Keys.KEY_HOME: 0x7004a,
-    Keys.KEY_PAGEUP: 0x7004b,
-    Keys.KEY_DELETE: 0x7004c,
-    Keys.KEY_END: 0x7004d,
-    Keys.KEY_PAGEDOWN: 0x7004e,
-    Keys.KEY_UP: 0x70052,
-    Keys.KEY_LEFT: 0x70050,
-    Keys.KEY_DOWN: 0x70051,
-    Keys.KEY_RIGHT: 0x7004f,
-    Keys.KEY_NUMLOCK: 0x70053,
-    Keys.KEY_KPSLASH: 0x70054,
-    Keys.KEY_KPASTERISK: 0x70055,
-    Keys.KEY_KPMINUS: 0x70056,
-    Keys.KEY_KP7: 0x7005f,
-    Keys.KEY_KP8: 0x70060,
-    Keys.KEY_KP9: 0x70061,
-    Keys.KEY_KPPLUS: 0x70057,
-    Keys.KEY_KP4: 0x7005c,
-    Keys.KEY_KP5: 0x7005d,
-    Keys.KEY_KP6: 0x7005e,
-    Keys.KEY_KP1: 0x70059,
-    Keys.KEY_KP2: 0x7005a,
-    Keys.KEY_KP3: 0x7005b,
-    Keys.KEY_KPENTER: 0x70058,
-    Keys.KEY_KP0: 0x70062,
-    Keys.KEY_KPDOT: 0x70063,
-    Keys.KEY_CONFIG: 0xc0183,
-    Keys.KEY_PLAYPAUSE: 0xc00cd,
-    Keys.KEY_MUTE: 0xc00e2,
-    Keys.KEY_VOLUMEDOWN: 0xc00ea,
-    Keys.KEY_VOLUMEUP: 0xc00e9,
-    Keys.KEY_HOMEPAGE: 0xc0223,
-
-    Keys.KEY_PREVIOUSSONG: 0xc00f0,
-    Keys.KEY_NEXTSONG: 0xc00f1,
-
-    Keys.KEY_BACK: 0xc00f2,
-    Keys.KEY_FORWARD: 0xc00f3,
-}
+    def syn(self, fd):
+        self._buf.extend((fd, EV_SYN, SYN_REPORT, 0))
+
+    def __len__(self):
+        return len(self._buf) // 4
+
+    def events(self, uip=None):
+        """
+        Return recorded events
+
+        @param UInput uip       only return events of this device if given
+
+        @return list of (type, code, value) tuples, (device, type, code, value)
+                if uip is None
+        """
+        buf = self._buf
+        if uip is None:
+            return [tuple(buf[i:i + 4]) for i in range(0, len(buf), 4)]
+        fd = uip._fd
+        return [tuple(buf[i + 1:i + 4]) for i in range(0, len(buf), 4) if buf[i] == fd]
+
+    def clear(self):
+        """Forget recorded events"""
+        self._buf = array('i')
+
+
+_backend = None
+
+
+def getDefaultBackend():
+    """Return the backend used by UInput devices created without one"""
+    global _backend
+    if _backend is None:
+        if findLibUInput():
+            _backend = LibUInputBackend()
+        else:
+            _backend = IoctlUInputBackend()
+    return _backend
+
+
+def setDefaultBackend(backend):
+    """
+    Set the backend used by UInput devices created without one
+
+    @param UInputBackend backend    new default backend, None to select
+                                    libuinput or ioctl on next use
+    """
+    global _backend
+    _backend = backend
 
 
 class UInput(object):
     """
     UInput class permits to create an uinput device.
 
+    Events go through an output backend, the module default one if none is
+    given (see setDefaultBackend).
+
     See Gamepad, Mouse, Keyboard for examples
     """
-    def __init__(self, vendor, product, version, name, keys, axes, rels, keyboard=False):
-        self._lib = None
+    def __init__(self, vendor, product, version, name, keys, axes, rels, keyboard=False,
+                 backend=None):
+        self._backend = backend if backend is not None else getDefaultBackend()
         self._k = keys
         if not axes:
             self._a, self._amin, self._amax, self._afuzz, self._aflat = [[]] * 5
@@ -198,74 +635,19 @@ class UInput(object):
         self.keyboard = keyboard
         self._fd = None
 
-    def _get_lib(self):
-        if self._lib:
-            return self._lib
-        possible_paths = []
-        for extension in get_so_extensions():
-            possible_paths.append(
-                os.path.abspath(
-                    os.path.normpath(
-                        os.path.join(
-                            os.path.dirname(__file__),
-                            '..',
-                            'libuinput' + extension
-                        )
-                    )
-                )
-            )
-        lib = None
-        for path in possible_paths:
-            if os.path.exists(path):
-                lib = path
-                break
-        if not lib:
-            raise OSError("Can't find libuinput. searched at:\n {}".format(
-                '\n'.join(possible_paths)
-            )
-            )
-
-        self._lib = ctypes.CDLL(lib)
-        return self._lib
-
     def createDevice(self):
-        lib = self._get_lib()
-
-        c_k = (ctypes.c_uint16 * len(self._k))(*self._k)
-        c_a = (ctypes.c_uint16 * len(self._a))(*self._a)
-        c_amin = (ctypes.c_int32 * len(self._amin))(*self._amin)
-        c_amax = (ctypes.c_int32 * len(self._amax))(*self._amax)
-        c_afuzz = (ctypes.c_int32 * len(self._afuzz))(*self._afuzz)
-        c_aflat = (ctypes.c_int32 * len(self._aflat))(*self._aflat)
-        c_r = (ctypes.c_uint16 * len(self._r))(*self._r)
-        c_vendor = ctypes.c_uint16(self.vendor)
-        c_product = ctypes.c_uint16(self.product)
-        c_version = ctypes.c_uint16(self.version)
-        c_keyboard = ctypes.c_int(self.keyboard)
-        c_name = ctypes.c_char_p(self.name)
-
-        self._fd = lib.uinput_init(ctypes.c_int(len(self._k)),
-                                   c_k,
-                                   ctypes.c_int(len(self._a)),
-                                   c_a,
-                                   c_amin,
-                                   c_amax,
-                                   c_afuzz,
-                                   c_aflat,
-                                   ctypes.c_int(len(self._r)),
-                                   c_r,
-                                   c_keyboard,
-                                   c_vendor,
-                                   c_product,
-                                   c_version,
-                                   c_name)
+        self._fd = self._backend.create(self)
 
     def destroyDevice(self):
         if self._fd is not None:
-            lib = self._get_lib()
-            lib.uinput_destroy(self._fd)
+            self._backend.destroy(self._fd)
             self._fd = None
 
+    @property
+    def created(self):
+        """True once the device exists, events create it on first use"""
+        return self._fd is not None
+
     def keyEvent(self, key, val):
         """
         Generate a key or btn event
@@ -276,9 +658,7 @@ class UInput(object):
         if self._fd is None:
             self.createDevice()
 
-        self._lib.uinput_key(self._fd,
-                             ctypes.c_uint16(key),
-                             ctypes.c_int32(val))
+        self._backend.key(self._fd, key, val)
 
     def axisEvent(self, axis, val):
         """
@@ -290,9 +670,7 @@ class UInput(object):
         if self._fd is None:
             self.createDevice()
 
-        self._lib.uinput_abs(self._fd,
-                             ctypes.c_uint16(axis),
-                             ctypes.c_int32(val))
+        self._backend.abs(self._fd, axis, val)
 
     def relEvent(self, rel, val):
         """
@@ -304,9 +682,7 @@ class UInput(object):
         if self._fd is None:
             self.createDevice()
 
-        self._lib.uinput_rel(self._fd,
-                             ctypes.c_uint16(rel),
-                             ctypes.c_int32(val))
+        self._backend.rel(self._fd, rel, val)
 
     def scanEvent(self, val):
         """
@@ -317,15 +693,14 @@ class UInput(object):
         if self._fd is None:
             self.createDevice()
 
-        self._lib.uinput_scan(self._fd,
-                              ctypes.c_int32(val))
+        self._backend.scan(self._fd, val)
 
     def synEvent(self):
         """Generate a syn event"""
         if self._fd is None:
             self.createDevice()
 
-        self._lib.uinput_syn(self._fd)
+        self._backend.syn(self._fd)
 
     def setDelayPeriod(self, delay, period):
         """
@@ -337,9 +712,7 @@ class UInput(object):
         if self._fd is None:
             self.createDevice()
 
-        self._lib.uinput_set_delay_period(self._fd,
-                                          ctypes.c_int32(delay),
-                                          ctypes.c_int32(period))
+        self._backend.setDelayPeriod(self._fd, delay, period)
 
     def keyManaged(self, ev):
         return ev in self._k
@@ -350,17 +723,23 @@ class UInput(object):
     def relManaged(self, ev):
         return ev in self._r
 
+    def timers(self):
+        """
+        Return the timers of the device to be driven by the event loop, see
+        SteamController.addTimer
+        """
+        return ()
+
     def __del__(self):
-        if self._lib and self._fd:
-            self._lib.uinput_destroy(self._fd)
+        if self._fd is not None:
+            self._backend.destroy(self._fd)
             self._fd = None
-            _ctypes.dlclose(self._lib._handle)
-            self._lib = None
 
 
 class Gamepad(UInput):
     """Gamepad uinput class, create a gamepad device"""
     def __init__(self):
+        _load()
         super(Gamepad, self).__init__(vendor=0x28de,
                                       product=0xffff,
                                       version=0x001,
@@ -411,7 +790,10 @@ class Mouse(UInput):
 
     DEFAULT_SCR_MEAN_LEN = 10
 
+    DEFAULT_RATE = 1000
+
     def __init__(self):
+        _load()
         super(Mouse, self).__init__(vendor=0x28de,
                                     product=0x1142,
                                     version=1,
@@ -430,14 +812,16 @@ class Mouse(UInput):
         self._dy = 0.0
         self._xvel = 0.0
         self._yvel = 0.0
-        self._lastTime = time.time()
+        self._lastTime = time.monotonic()
+        self._inertia = Inertia(self._glide, 0.0, 0.0, 0.0)
         self.updateParams()
 
         self._scr_dx = 0.0
         self._scr_dy = 0.0
         self._scr_xvel = 0.0
         self._scr_yvel = 0.0
-        self._scr_lastTime = time.time()
+        self._scr_lastTime = time.monotonic()
+        self._scr_inertia = Inertia(self._scrollGlide, 0.0, 0.0, 0.0)
         self.updateScrollParams()
 
     def updateParams(self,
@@ -448,7 +832,8 @@ class Mouse(UInput):
                      degree=40.0,
                      xscale=DEFAULT_XSCALE,
                      yscale=DEFAULT_YSCALE,
-                     mean_len=DEFAULT_MEAN_LEN):
+                     mean_len=DEFAULT_MEAN_LEN,
+                     rate=DEFAULT_RATE):
         """
         Update Movement parameters
 
@@ -459,6 +844,8 @@ class Mouse(UInput):
         @param float degree     degree of rotation of the ball for move from border to border
         @param float xscale     scale applied on move param to input event on-x axis
         @param float yscale     scale applied on move param to input event on-y axis
+        @param int mean_len     number of moves averaged for the throw velocity
+        @param int rate         free ball integration rate in Hz
         """
         self._xscale = xscale
         self._yscale = yscale
@@ -474,6 +861,7 @@ class Mouse(UInput):
 
         self._xvel_dq = deque(maxlen=mean_len)
         self._yvel_dq = deque(maxlen=mean_len)
+        self._inertia.setParams(self._acc, xscale / self._radscale, yscale / self._radscale, rate)
 
     def updateScrollParams(self,
                            mass=20.0,
@@ -483,7 +871,8 @@ class Mouse(UInput):
                            degree=120.0,
                            xscale=DEFAULT_SCR_XSCALE,
                            yscale=DEFAULT_SCR_YSCALE,
-                           mean_len=DEFAULT_SCR_MEAN_LEN):
+                           mean_len=DEFAULT_SCR_MEAN_LEN,
+                           rate=DEFAULT_RATE):
         """
         Update Scroll parameters
 
@@ -494,6 +883,8 @@ class Mouse(UInput):
         @param float degree     degree of rotation of the ball for move from border to border
         @param float xscale     scale applied on move param to input event on x-axis
         @param float yscale     scale applied on move param to input event on y-axis
+        @param int mean_len     number of moves averaged for the throw velocity
+        @param int rate         free ball integration rate in Hz
         """
         self._scr_xscale = xscale
         self._scr_yscale = yscale
@@ -508,11 +899,36 @@ class Mouse(UInput):
 
         self._scr_xvel_dq = deque(maxlen=mean_len)
         self._scr_yvel_dq = deque(maxlen=mean_len)
+        self._scr_inertia.setParams(self._scr_a, xscale / self._scr_radscale,
+                                    yscale / self._scr_radscale, rate)
+
+    def timers(self):
+        return (self._inertia, self._scr_inertia)
+
+    def _glide(self, dx, dy):
+        """Emit a free ball move"""
+        if dx:
+            self.relEvent(rel=Rels.REL_X, val=dx)
+        if dy:
+            self.relEvent(rel=Rels.REL_Y, val=dy)
+        self.synEvent()
+
+    def _scrollGlide(self, dx, dy):
+        """Emit a free ball scroll"""
+        if dx:
+            self.relEvent(rel=Rels.REL_HWHEEL, val=dx)
+        if dy:
+            self.relEvent(rel=Rels.REL_WHEEL, val=dy)
+        self.synEvent()
 
     def moveEvent(self, dx=0, dy=0, free=False):
         """
         Generate move events from parameters and displacement
 
+        When the pad is released the ball is thrown with the mean velocity of
+        the last moves, then glides on the fixed rate integrator ticked by the
+        event loop (see timers), or by the next calls if nothing ticks it.
+
         @param int dx           delta movement from last call on x-axis
         @param int dy           delta movement from last call on y-axis
         @param bool free        set to true for free ball move
@@ -520,11 +936,17 @@ class Mouse(UInput):
         @return float           absolute distance moved this tick
         """
         # Compute time step
-        _tmp = time.time()
+        _tmp = time.monotonic()
         dt = _tmp - self._lastTime
         self._lastTime = _tmp
 
-        def _genevt():
+        if not free:
+            self._inertia.stop()
+
+            # Compute mouse movement from integer part of d * scale
+            self._dx += dx * self._xscale
+            self._dy += dy * self._yscale
+
             _syn = False
             if int(self._dx):
                 self.relEvent(rel=Rels.REL_X, val=int(self._dx))
@@ -537,13 +959,6 @@ class Mouse(UInput):
             if _syn:
                 self.synEvent()
 
-        if not free:
-            # Compute mouse movement from integer part of d * scale
-            self._dx += dx * self._xscale
-            self._dy += dy * self._yscale
-
-            _genevt()
-
             # Compute instant velocity
             try:
                 self._xvel = sum(self._xvel_dq) / len(self._xvel_dq)
@@ -552,43 +967,18 @@ class Mouse(UInput):
                 self._xvel = 0.0
                 self._yvel = 0.0
 
-            self._xvel_dq.append(dx * self._radscale / dt)
-            self._yvel_dq.append(dy * self._radscale / dt)
+            if dt > 0.0:
+                self._xvel_dq.append(dx * self._radscale / dt)
+                self._yvel_dq.append(dy * self._radscale / dt)
 
-        else:
-            # Free movement update velocity and compute movement
+            return math.sqrt((dx ** 2) + (dy ** 2))
+
+        if self._xvel_dq:
+            # Pad released, throw the ball
             self._xvel_dq.clear()
             self._yvel_dq.clear()
-
-            _hyp = math.sqrt((self._xvel ** 2) + (self._yvel ** 2))
-            if _hyp:
-                _ax = self._acc * (abs(self._xvel) / _hyp)
-                _ay = self._acc * (abs(self._yvel) / _hyp)
-            else:
-                _ax = self._acc
-                _ay = self._acc
-
-            # Cap friction deceleration
-            _dvx = min(abs(self._xvel), _ax * dt)
-            _dvy = min(abs(self._yvel), _ay * dt)
-
-            # Compute new velocity
-            _xvel = self._xvel - math.copysign(_dvx, self._xvel)
-            _yvel = self._yvel - math.copysign(_dvy, self._yvel)
-
-            # Compute displacement
-            dx = (((_xvel + self._xvel) / 2) * dt) / self._radscale
-            dy = (((_yvel + self._yvel) / 2) * dt) / self._radscale
-
-            self._xvel = _xvel
-            self._yvel = _yvel
-
-            self._dx += dx * self._xscale
-            self._dy += dy * self._yscale
-
-            _genevt()
-
-        return math.sqrt((dx ** 2) + (dy ** 2))
+            self._inertia.throw(self._xvel, self._yvel, _tmp)
+        return self._inertia.tick(_tmp) / self._radscale
 
     def scrollEvent(self, dx=0, dy=0, free=False):
         """
@@ -598,33 +988,31 @@ class Mouse(UInput):
         @param int dy           delta movement from last call on y-axis
         @param bool free        set to true for free ball move
 
-        @return float           absolute distance moved this tick
+        @return bool            True if events were generated or the free ball moved
         """
         # Compute time step
-        _tmp = time.time()
+        _tmp = time.monotonic()
         dt = _tmp - self._scr_lastTime
         self._scr_lastTime = _tmp
 
-        def _genevt():
-            _syn = False
+        if not free:
+            self._scr_inertia.stop()
+
+            # Compute mouse movement from integer part of d * scale
+            self._scr_dx += dx * self._scr_xscale
+            self._scr_dy += dy * self._scr_yscale
+
+            _nev = False
             if int(self._scr_dx):
                 self.relEvent(rel=Rels.REL_HWHEEL, val=int(math.copysign(1, self._scr_dx)))
                 self._scr_dx -= int(self._scr_dx)
-                _syn = True
+                _nev = True
             if int(self._scr_dy):
                 self.relEvent(rel=Rels.REL_WHEEL, val=int(math.copysign(1, self._scr_dy)))
                 self._scr_dy -= int(self._scr_dy)
-                _syn = True
-            if _syn:
+                _nev = True
+            if _nev:
                 self.synEvent()
-            return _syn
-
-        if not free:
-            # Compute mouse movement from integer part of d * scale
-            self._scr_dx += dx * self._scr_xscale
-            self._scr_dy += dy * self._scr_yscale
-
-            _nev = _genevt()
 
             # Compute instant velocity
             try:
@@ -634,43 +1022,18 @@ class Mouse(UInput):
                 self._scr_xvel = 0.0
                 self._scr_yvel = 0.0
 
-            self._scr_xvel_dq.append(dx * self._scr_radscale / dt)
-            self._scr_yvel_dq.append(dy * self._scr_radscale / dt)
+            if dt > 0.0:
+                self._scr_xvel_dq.append(dx * self._scr_radscale / dt)
+                self._scr_yvel_dq.append(dy * self._scr_radscale / dt)
 
-        else:
-            # Free movement update velocity and compute movement
+            return _nev
+
+        if self._scr_xvel_dq:
+            # Pad released, throw the ball
             self._scr_xvel_dq.clear()
             self._scr_yvel_dq.clear()
-
-            _hyp = math.sqrt((self._scr_xvel ** 2) + (self._scr_yvel ** 2))
-            if _hyp:
-                _ax = self._scr_a * (abs(self._scr_xvel) / _hyp)
-                _ay = self._scr_a * (abs(self._scr_yvel) / _hyp)
-            else:
-                _ax = self._scr_a
-                _ay = self._scr_a
-
-            # Cap friction deceleration
-            _dvx = min(abs(self._scr_xvel), _ax * dt)
-            _dvy = min(abs(self._scr_yvel), _ay * dt)
-
-            # Compute new velocity
-            _xvel = self._scr_xvel - math.copysign(_dvx, self._scr_xvel)
-            _yvel = self._scr_yvel - math.copysign(_dvy, self._scr_yvel)
-
-            # Cfompute displacement
-            dx = (((_xvel + self._scr_xvel) / 2) * dt) / self._scr_radscale
-            dy = (((_yvel + self._scr_yvel) / 2) * dt) / self._scr_radscale
-
-            self._scr_xvel = _xvel
-            self._scr_yvel = _yvel
-
-            self._scr_dx += dx * self._scr_xscale
-            self._scr_dy += dy * self._scr_yscale
-
-            _nev = _genevt()
-
-        return _nev
+            self._scr_inertia.throw(self._scr_xvel, self._scr_yvel, _tmp)
+        return self._scr_inertia.tick(_tmp) > 0.0
 
 
 class Keyboard(UInput):
@@ -684,6 +1047,7 @@ class Keyboard(UInput):
     setDelayPeriod permits to update these values
     """
     def __init__(self):
+        _load()
         super(Keyboard, self).__init__(vendor=0x28de,
                                        product=0x1142,
                                        version=1,
@@ -720,7 +1084,7 @@ class Keyboard(UInput):
         new = [k for k in keys if k not in self._pressed]
         for i in new:
             self.scanEvent(scans[i])
-            self.keyEvent(i, 1)
+            super(Keyboard, self).keyEvent(i, 1)
         if new:
             super(Keyboard, self).synEvent()
             self._pressed |= set(new)
@@ -739,7 +1103,7 @@ class Keyboard(UInput):
             rem = list(self._pressed)
         for i in rem:
             self.scanEvent(scans[i])
-            self.keyEvent(i, 0)
+            super(Keyboard, self).keyEvent(i, 0)
         if rem:
             super(Keyboard, self).synEvent()
             self._pressed -= set(rem)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Stany MARCEL <stanypub@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Steam client watcher, the controller is released as soon as Steam starts"""
+
+import os
+import select
+import threading
+
+
+# Steam client process name (/proc/<pid>/comm)
+STEAM = 'steam'
+
+# Delays in s between two process table scans while Steam is not running,
+# doubled after each scan up to the maximum
+SCAN_MIN = 0.25
+SCAN_MAX = 4.0
+
+# Delay in s between two liveness checks of the Steam pid without pidfd
+POLL = 0.5
+
+
+class ProcDetector(object):
+    """
+    Find processes by name in /proc
+
+    Only the comm file of each pid is read, no command line nor status
+    parsing. Subclass it to watch another process table (ie in tests).
+    """
+
+    def __init__(self, root='/proc'):
+        self._root = root
+
+    def _comm(self, pid):
+        try:
+            with open(os.path.join(self._root, str(pid), 'comm'), 'rb') as f:
+                return f.read().rstrip(b'\n').decode('utf-8', 'replace')
+        except (IOError, OSError):
+            return None
+
+    def find(self, name):
+        """
+        Return the pid of a process named name, None if not running
+
+        @param str name         process name, truncated to 15 characters as
+                                the kernel does
+        """
+        name = name[:15]
+        try:
+            entries = os.listdir(self._root)
+        except OSError:
+            return None
+        for entry in entries:
+            if entry.isdigit() and self._comm(entry) == name:
+                return int(entry)
+        return None
+
+    def alive(self, pid, name):
+        """Return True if pid is still a process named name"""
+        return self._comm(pid) == name[:15]
+
+    def open(self, pid):
+        """
+        Return a pidfd of pid, readable once the process exits, None if not
+        supported (Linux < 5.3, Python < 3.9) or if pid is gone
+        """
+        try:
+            return os.pidfd_open(pid)
+        except (AttributeError, OSError):
+            return None
+
+
+class SteamWatcher(object):
+    """
+    Watch the Steam client from a background thread
+
+    While Steam is not running the process table is scanned with a backoff
+    from SCAN_MIN to SCAN_MAX. Once found its pid is cached and waited on with
+    a pidfd, or checked every POLL s without pidfd support, so a running Steam
+    costs nothing. The callbacks are called from the watcher thread.
+
+    @param callable on_start    called with the pid when Steam starts
+    @param callable on_exit     called when Steam exits
+    @param ProcDetector detector process table, /proc by default
+    @param str name             watched process name
+    """
+
+    def __init__(self, on_start=None, on_exit=None, detector=None, name=STEAM):
+        self._on_start = on_start
+        self._on_exit = on_exit
+        self._detector = detector or ProcDetector()
+        self._name = name
+        self._pid = None
+        self._idle = threading.Event()
+        self._thread = None
+        self._stop = False
+        self._wake_r, self._wake_w = os.pipe()
+        self.scans = 0
+
+    @property
+    def pid(self):
+        """Pid of the running Steam client, None if not running"""
+        return self._pid
+
+    @property
+    def running(self):
+        return self._pid is not None
+
+    def start(self):
+        """Scan once then keep watching from a background thread"""
+        self._check()
+        self._thread = threading.Thread(target=self._run, name='steam-watcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the watcher thread"""
+        self._stop = True
+        os.write(self._wake_w, b'\x00')
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+    def waitIdle(self, timeout=None):
+        """
+        Block until Steam is not running
+
+        @return bool            False on timeout
+        """
+        return self._idle.wait(timeout)
+
+    def _check(self):
+        """Scan the process table, return True if Steam was found"""
+        self.scans += 1
+        pid = self._detector.find(self._name)
+        if pid is None:
+            self._idle.set()
+            return False
+        self._pid = pid
+        self._idle.clear()
+        if self._on_start is not None:
+            self._on_start(pid)
+        return True
+
+    def _sleep(self, timeout, fd=None):
+        """Wait for timeout s, fd readable or stop, return True if fd is readable"""
+        fds = [self._wake_r] if fd is None else [self._wake_r, fd]
+        readable, _, _ = select.select(fds, [], [], timeout)
+        return fd is not None and fd in readable
+
+    def _wait(self, pid):
+        """Return once pid exited or the watcher is stopped"""
+        pidfd = self._detector.open(pid)
+        try:
+            while not self._stop:
+                if pidfd is not None:
+                    if self._sleep(None, pidfd):
+                        return
+                elif not self._detector.alive(pid, self._name):
+                    return
+                else:
+                    self._sleep(POLL)
+        finally:
+            if pidfd is not None:
+                os.close(pidfd)
+
+    def _run(self):
+        delay = SCAN_MIN
+        while not self._stop:
+            if self._pid is None:
+                self._sleep(delay)
+                if self._stop:
+                    break
+                if not self._check():
+                    delay = min(delay * 2, SCAN_MAX)
+                    continue
+            self._wait(self._pid)
+            if self._stop:
+                break
+            self._pid = None
+            self._idle.set()
+            if self._on_exit is not None:
+                self._on_exit()
+            # Steam is often restarted right away
+            delay = SCAN_MIN
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+# asyncio integration: an AsyncSteamController reads the reports of the fake
+# context from an event loop, sends a control message without blocking it,
+# sends the feedback queued from another thread and stops when released from
+# another thread without turning the controller off.
+
+import asyncio
+import threading
+
+import steamcontroller
+from steamcontroller.aio import AsyncSteamController
+
+import fakeusb
+
+REPORTS = 20
+
+
+class FakeContext(fakeusb.FakeContext):
+    """No file descriptor to poll, the loop timer follows getNextTimeout"""
+
+    def __init__(self):
+        super(FakeContext, self).__init__()
+        self.sent = []
+
+    def getPollFDList(self):
+        return []
+
+    def setPollFDNotifiers(self, added=None, removed=None):
+        pass
+
+    def getNextTimeout(self):
+        if self.controls or self._events:
+            return 0
+        return fakeusb.PERIOD if self.plugged and self.submitted else None
+
+    def handleEventsTimeout(self, tv=0):
+        self.sent.extend(bytes(transfer.data) for transfer in self.controls)
+        super(FakeContext, self).handleEventsTimeout(tv)
+
+
+writes = []
+fakeusb.FakeHandle.controlWrite = lambda self, **kwargs: writes.append(bytes(kwargs['data']))
+
+
+async def main():
+    ctx = FakeContext()
+    sc = AsyncSteamController(ctx=ctx)
+    loop = asyncio.get_running_loop()
+
+    # Reports keep coming while the loop is busy elsewhere
+    ticks = [0]
+
+    async def _ticker():
+        while True:
+            ticks[0] += 1
+            await asyncio.sleep(0.001)
+
+    ticker = loop.create_task(_ticker())
+    seqs = []
+    async for sci in sc.reports():
+        seqs.append(sci.seq)
+        if len(seqs) == REPORTS:
+            break
+    print('{:d} reports, {:d} loop ticks meanwhile'.format(len(seqs), ticks[0]))
+    assert seqs == sorted(seqs) and len(set(seqs)) == REPORTS
+    assert ticks[0] > REPORTS / 2, 'loop blocked'
+
+    # Control message completed by the fake context
+    await asyncio.wait_for(sc.sendControl(b'\x8f\x07\x00'), 1.0)
+    assert ctx.sent[-1].startswith(b'\x8f\x07\x00')
+
+    # Feedback queued from another thread is sent by the loop
+    sent = len(ctx.sent)
+    thread = threading.Thread(target=sc.addFeedback, args=(1, 200))
+    thread.start()
+    thread.join()
+    for _ in range(100):
+        if len(ctx.sent) > sent:
+            break
+        await asyncio.sleep(0.005)
+    assert ctx.sent[sent].startswith(b'\x8f\x07\x01'), ctx.sent[sent:]
+
+    # Released from another thread: reports() ends, no exit command
+    received = []
+
+    async def _reader():
+        async for sci in sc.reports():
+            received.append(sci)
+
+    reader = loop.create_task(_reader())
+    await asyncio.sleep(0.05)
+    threading.Thread(target=sc.release).start()
+    await asyncio.wait_for(reader, 1.0)
+    ticker.cancel()
+    print('released after {:d} more reports'.format(len(received)))
+    assert received and ctx.closed == 1
+    assert not any(data.startswith(steamcontroller.EXITCMD) for data in writes + ctx.sent)
+
+
+# Built outside a running loop without one given
+try:
+    AsyncSteamController(ctx=FakeContext())
+except RuntimeError:
+    pass
+else:
+    raise AssertionError('no running loop')
+
+asyncio.run(main())
+print('ok')
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+# Check the events emitted by the uinput devices and EventMapper with the
+# in-memory record backend, no /dev/uinput is needed.
+
+import os
+
+import steamcontroller.uinput as sui
+from steamcontroller import SCStatus, SCButtons, SCI_NULL
+from steamcontroller.uinput import Keys, Axes, Rels
+from steamcontroller.events import EventMapper, Pos
+
+rec = sui.RecordBackend()
+sui.setDefaultBackend(rec)
+
+# Keyboard press and release go out with their scan codes
+kb = sui.Keyboard()
+rec.clear()
+kb.keyEvent(Keys.KEY_Q, 1)
+kb.synEvent()
+kb.keyEvent(Keys.KEY_Q, 0)
+kb.synEvent()
+assert rec.events(kb) == [
+    (sui.EV_MSC, sui.MSC_SCAN, sui.scans[Keys.KEY_Q]),
+    (sui.EV_KEY, Keys.KEY_Q, 1),
+    (sui.EV_SYN, sui.SYN_REPORT, 0),
+    (sui.EV_MSC, sui.MSC_SCAN, sui.scans[Keys.KEY_Q]),
+    (sui.EV_KEY, Keys.KEY_Q, 0),
+    (sui.EV_SYN, sui.SYN_REPORT, 0),
+], rec.events(kb)
+
+# Mapper with a gamepad: a button and the stick
+gp = sui.Gamepad()
+evm = EventMapper(uinput_devices=(gp,))
+evm.setStickAxes(Axes.ABS_X, Axes.ABS_Y)
+evm.setButtonAction(SCButtons.A, Keys.BTN_A)
+rec.clear()
+evm.process(None, SCI_NULL._replace(status=SCStatus.INPUT, buttons=SCButtons.A, lpad_x=1000, lpad_y=-2000))
+events = rec.events(gp)
+assert (sui.EV_KEY, Keys.BTN_A, 1) in events, events
+assert (sui.EV_ABS, Axes.ABS_X, 1000) in events, events
+assert (sui.EV_ABS, Axes.ABS_Y, 2000) in events, events
+assert events[-1] == (sui.EV_SYN, sui.SYN_REPORT, 0), events
+
+# Mouse move
+ms = sui.Mouse()
+rec.clear()
+ms.moveEvent(1000, 0)
+assert rec.events(ms)[0][:2] == (sui.EV_REL, Rels.REL_X), rec.events(ms)
+
+# Null backend only counts
+null = sui.NullBackend()
+gp = sui.Gamepad()
+gp._backend = null
+gp.axisEvent(Axes.ABS_X, 1)
+gp.synEvent()
+assert (null.events, null.frames) == (2, 1)
+
+# libuinput backend writes a whole frame at once, checked on a pipe
+rfd, wfd = os.pipe()
+lib = sui.LibUInputBackend()
+frame = sui._Frame(wfd)
+lib.abs(frame, Axes.ABS_X, 100)
+lib.abs(frame, Axes.ABS_Y, -5)
+lib.key(frame, Keys.BTN_A, 1)
+lib.syn(frame)
+data = os.read(rfd, 4096)
+assert [sui.INPUT_EVENT.unpack_from(data, i)[2:] for i in range(0, len(data), sui.INPUT_EVENT.size)] == [
+    (sui.EV_ABS, Axes.ABS_X, 100),
+    (sui.EV_ABS, Axes.ABS_Y, -5),
+    (sui.EV_KEY, Keys.BTN_A, 1),
+    (sui.EV_SYN, sui.SYN_REPORT, 0),
+]
+assert lib.stats()['writes'] == 1 and lib.stats()['saved'] == 3
+
+print('ok')
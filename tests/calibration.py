@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+# Calibration: sc-calibrate.py fits a synthetic capture with known pad
+# rotation, stick center and gyro bias, also once recorded report by report
+# as sc-dump.py -w does, profiles are saved and loaded by serial number and
+# the mapper applies them. An hour long capture is fitted
+# to check it stays in the seconds range.
+
+import io
+import os
+import sys
+import math
+import time
+import shutil
+import tempfile
+import importlib.util
+
+import numpy as np
+
+import steamcontroller.uinput as sui
+from steamcontroller import SCButtons, SCStatus, SCI_NULL
+from steamcontroller.uinput import Keys
+from steamcontroller.capture import CaptureWriter, CaptureReader, RECORD_SIZE
+from steamcontroller.calibration import Calibration
+from steamcontroller.events import EventMapper, Pos
+
+from profiles import FakeSteamController
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+spec = importlib.util.spec_from_file_location(
+    'sc_calibrate', os.path.join(HERE, '..', 'scripts', 'sc-calibrate.py'))
+scc = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(scc)
+
+ANGLE = 0.3
+CENTER = (700, -400)
+BIAS = (12.0, -5.0, 3.0)
+
+
+def synthetic(count, seed=0):
+    """Input records: right pad swipes, stick at rest then pushed, still then moving gyro"""
+    rnd = np.random.RandomState(seed)
+    rec = np.zeros(count, dtype=scc.RECORD)
+    i = np.arange(count)
+    rec['t'] = i * 4000000
+    rec['status'] = SCStatus.INPUT
+    # Swipes along the pad axes, reported rotated by ANGLE
+    phase = (i // 100) % 4
+    step = (i % 100) * 500.0 - 25000.0
+    x = np.where(phase % 2 == 0, step, 0.0) * np.where(phase < 2, 1, -1)
+    y = np.where(phase % 2 == 1, step, 0.0)
+    cos, sin = math.cos(ANGLE), math.sin(ANGLE)
+    rec['rpad_x'] = cos * x - sin * y
+    rec['rpad_y'] = sin * x + cos * y
+    rec['buttons'] = SCButtons.RPADTOUCH
+    # Stick at rest around CENTER, pushed one third of the time
+    pushed = (i // 300) % 3 == 0
+    rec['lpad_x'] = np.where(pushed, 30000, CENTER[0] + rnd.randint(-100, 101, count))
+    rec['lpad_y'] = np.where(pushed, 0, CENTER[1] + rnd.randint(-100, 101, count))
+    # Gyro still half of the time
+    moving = (i // 1000) % 2 == 1
+    for name, bias in zip(('gpitch', 'groll', 'gyaw'), BIAS):
+        rec[name] = bias + rnd.normal(0, 4, count) + np.where(moving, rnd.normal(0, 3000, count), 0)
+    return rec
+
+
+def write(path, rec, serial):
+    CaptureWriter(path, serial=serial).close()
+    with open(path, 'ab') as f:
+        f.write(rec.tobytes())
+
+
+def record(path, rec, serial):
+    """Record the raw reports one by one through CaptureWriter"""
+    raw = rec.tobytes()
+    with CaptureWriter(path, serial=serial) as capture:
+        for i in range(len(rec)):
+            capture.write(raw[i * RECORD_SIZE + 8:(i + 1) * RECORD_SIZE], now=rec['t'][i] / 1e9)
+
+
+def fitted(paths):
+    """Return the calibration of captures and what was written to stderr"""
+    stderr, sys.stderr = sys.stderr, io.StringIO()
+    try:
+        rec, serial = scc.load(paths)
+        cal, _ = scc.calibrate(rec, serial)
+        return cal, sys.stderr.getvalue()
+    finally:
+        sys.stderr = stderr
+
+
+tmp = tempfile.mkdtemp()
+try:
+    path = os.path.join(tmp, 'session.sccap')
+    write(path, synthetic(20000), 'FAKE0123')
+    with CaptureReader(path) as reader:
+        assert reader.serial == 'FAKE0123' and len(reader) == 20000
+
+    rec, serial = scc.load([path])
+    cal, strength = scc.calibrate(rec, serial)
+    print('angle {:.4f} center {} noise {:d} bias {} strength {:.2f}'.format(
+        cal.rpad_angle, cal.stick_center, cal.stick_noise, cal.gyro_bias, strength[1]))
+    assert abs(cal.rpad_angle + ANGLE) < 0.01
+    assert cal.lpad_angle == Calibration().lpad_angle
+    assert abs(cal.stick_center[0] - CENTER[0]) <= 5 and abs(cal.stick_center[1] - CENTER[1]) <= 5
+    assert 100 <= cal.stick_noise <= 150
+    assert all(abs(b - e) < 0.5 for b, e in zip(cal.gyro_bias, BIAS))
+
+    # Recorded with the gyro enabled the bias is fitted, without gyro data the
+    # default one is kept with a warning
+    recorded = os.path.join(tmp, 'recorded.sccap')
+    record(recorded, synthetic(20000), 'FAKE0123')
+    rcal, warning = fitted([recorded])
+    assert rcal.gyro_bias == cal.gyro_bias and not warning, warning
+    nogyro = synthetic(5000)
+    for name in ('gpitch', 'groll', 'gyaw'):
+        nogyro[name] = 0
+    recorded = os.path.join(tmp, 'nogyro.sccap')
+    record(recorded, nogyro, 'FAKE0123')
+    rcal, warning = fitted([recorded])
+    assert rcal.gyro_bias == Calibration().gyro_bias and 'No gyro data' in warning, warning
+
+    # Save and load by serial, fallback on the default profile
+    cal.save(Calibration.path(cal.serial, tmp))
+    loaded = Calibration.load('FAKE0123', tmp)
+    assert loaded.toDict() == cal.toDict()
+    assert Calibration.load('OTHER', tmp).toDict() == Calibration('OTHER').toDict()
+    Calibration(stick_noise=200).save(Calibration.path(None, tmp))
+    assert Calibration.load('OTHER', tmp).stick_noise == 200
+
+    # The mapper loads the profile of the controller and corrects the pad with
+    # the fitted angle: a swipe to the top reported rotated presses the top
+    # key only
+    os.environ['XDG_CONFIG_HOME'] = tmp
+    cal.save()
+    sc = FakeSteamController()
+    sc.serial = 'FAKE0123'
+    sui.setDefaultBackend(sui.RecordBackend())
+    kb = sui.Keyboard()
+    evm = EventMapper(uinput_devices=(kb,))
+    evm.setPadButtons(Pos.RIGHT, [Keys.KEY_UP, Keys.KEY_LEFT, Keys.KEY_DOWN, Keys.KEY_RIGHT])
+    base = SCI_NULL._replace(status=SCStatus.INPUT)
+    x, y = -math.sin(ANGLE) * 20000, math.cos(ANGLE) * 20000
+    evm.process(sc, base._replace(buttons=SCButtons.RPADTOUCH | SCButtons.RPAD,
+                                  rpad_x=int(x), rpad_y=int(y)))
+    pressed = [e[1] for e in sui.getDefaultBackend().events(kb) if e[0] == sui.EV_KEY and e[2] == 1]
+    assert pressed == [Keys.KEY_UP], pressed
+    assert evm._calibration.toDict() == cal.toDict()
+
+    # Hour long capture at 250Hz
+    big = os.path.join(tmp, 'hour.sccap')
+    write(big, synthetic(3600 * 250), None)
+    start = time.monotonic()
+    rec, serial = scc.load([big])
+    cal, _ = scc.calibrate(rec, serial)
+    elapsed = time.monotonic() - start
+    print('1 hour capture ({:d} reports) fitted in {:.2f}s'.format(len(rec), elapsed))
+    assert serial is None and abs(cal.rpad_angle + ANGLE) < 0.01
+    assert elapsed < 10
+finally:
+    shutil.rmtree(tmp)
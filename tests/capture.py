@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+# Record synthetic reports into a capture file, then replay it through
+# SteamController at maximum and real time speed and check that the same
+# reports reach the callback in the same order, then the last one again
+# once the replay ends, as for a disconnection.
+
+import os
+import tempfile
+from struct import pack
+
+from steamcontroller import SteamController, SCStatus
+from steamcontroller.capture import CaptureWriter, CaptureReader, ReplayContext
+
+PERIOD = 0.004
+REPORTS = 250
+
+path = os.path.join(tempfile.mkdtemp(), 'test.sccap')
+
+with CaptureWriter(path, pid=0x1142) as capture:
+    for seq in range(1, REPORTS + 1):
+        report = bytearray(64)
+        report[2] = SCStatus.INPUT
+        report[4:6] = pack('<H', seq)
+        report[7:11] = pack('<I', seq)
+        capture.write(report, seq * PERIOD)
+
+with CaptureReader(path) as reader:
+    assert len(reader) == REPORTS
+    assert reader.pid == 0x1142
+    assert reader.find(99.5 * PERIOD) == 100
+    print('capture: {:d} records, {:.3f}s, {:d} bytes'.format(
+        len(reader), reader.duration(), os.path.getsize(path)))
+
+    for speed in (0, 1.0):
+        received = []
+        gone = []
+        stamps = []
+
+        def _received(sc, sci):
+            (gone if sc.connected is False else received).append(sci.seq)
+            stamps.append(sc.timestamp)
+
+        ctx = ReplayContext(reader, speed=speed)
+        sc = SteamController(callback=_received, ctx=ctx)
+        sc.run()
+        # Each report keeps its own arrival time
+        assert all(a <= b for a, b in zip(stamps, stamps[1:]))
+        print('speed {}: {:d} reports received, {:d} lost'.format(speed, len(received), ctx.lost))
+        assert received == list(range(1, REPORTS + 1))
+        # The end of the capture is seen as a disconnection
+        assert gone == [REPORTS] and sc.connected is False
+
+os.unlink(path)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+# Golden test of the cheader preprocessor against the system cpp: every macro
+# defined by the kernel headers below is expanded by cpp and compared with the
+# values found by cheader. Then a few preprocessor corner cases and a
+# benchmark against the previous shlex based parser, loaded from the first
+# commit of the repository.
+
+import os
+import re
+import sys
+import timeit
+import subprocess
+import tempfile
+
+from steamcontroller import cheader
+
+INCLUDE = '/usr/include'
+HEADERS = ['linux/input-event-codes.h', 'linux/input.h', 'linux/uinput.h']
+
+
+def multiarch():
+    try:
+        return subprocess.check_output(['gcc', '-print-multiarch']).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+# Compiler builtin macros, so glibc headers take the same branches as with cpp
+BUILTINS = re.findall(r'^#define (.*)$', subprocess.check_output(
+    ['cpp', '-dM', '/dev/null']).decode(), re.M)
+
+PATHS = [INCLUDE] + [p for p in [os.path.join(INCLUDE, multiarch())] if os.path.isdir(p)]
+
+
+def golden(header):
+    """Return {name: value} of object like macros of header as expanded by cpp"""
+    names = re.findall(r'^#define (\w+) ', subprocess.check_output(
+        ['cpp', '-dM', '-include', header, '/dev/null']).decode(), re.M)
+    with tempfile.NamedTemporaryFile('w', suffix='.c', delete=False) as f:
+        f.write('#include <{}>\n'.format(header))
+        for name in names:
+            f.write('"@{0}@" {0}\n'.format(name))
+    out = subprocess.check_output(['cpp', '-P', f.name]).decode()
+    os.unlink(f.name)
+    values = {}
+    for name, expr in re.findall(r'^"@(\w+)@" (.*)$', out, re.M):
+        try:
+            values[name] = cheader.eval_expr(expr)
+        except ValueError:
+            pass
+    return values
+
+
+for header in HEADERS:
+    if not os.path.exists(os.path.join(INCLUDE, header)):
+        print('{}: not installed, skipped'.format(header))
+        continue
+    ref = golden(header)
+    files = []
+    out = cheader.defines(PATHS, header, files, BUILTINS)
+    own = set()
+    for filename in files:
+        if filename.startswith(os.path.join(INCLUDE, 'linux')):
+            own.update(re.findall(r'^\s*#\s*define\s+(\w+)[ \t]', open(filename).read(), re.M))
+    missing = [x for x in ref if x in own and x not in out]
+    wrong = [(x, out[x], ref[x]) for x in out if x in ref and out[x] != ref[x]]
+    print('{}: {:d} values, {:d} files, {:d} missing, {:d} wrong'.format(
+        header, len(out), len(files), len(missing), len(wrong)))
+    assert not missing, missing
+    assert not wrong, wrong
+
+# Corner cases
+tmp = tempfile.mkdtemp()
+with open(os.path.join(tmp, 'guarded.h'), 'w') as f:
+    f.write('#ifndef GUARDED_H\n#define GUARDED_H\n#define INC (COUNT + 1)\n#endif\n')
+with open(os.path.join(tmp, 'test.h'), 'w') as f:
+    f.write('''#define A 1 /* comment
+spanning lines */
+#define B (A << \\
+           4)
+#if A > 1
+#define C 1
+#elif defined(B) && !defined(D)
+#define C 2
+#else
+#define C 3
+#endif
+#ifdef __KERNEL__
+#define K 1
+#endif
+#define F(x, y) ((x) * (y) + A)
+#define G F(B, 2)
+#define CAT(a, b) a ## b
+#define AB 42
+#define H CAT(A, B)
+#define U 7
+#undef U
+#define COUNT 1
+#include "guarded.h"
+#include "guarded.h"
+#define T (A ? 10 : 20)
+#define N -(0x10 | 010)
+''')
+files = []
+out = cheader.defines(tmp, 'test.h', files)
+assert dict(out) == {'A': 1, 'B': 16, 'C': 2, 'G': 33, 'AB': 42, 'H': 42, 'COUNT': 1,
+                     'INC': 2, 'T': 10, 'N': -24}, dict(out)
+assert len(files) == 2
+
+# Benchmark against the previous parser
+root = subprocess.check_output(['git', 'rev-list', '--max-parents=0', 'HEAD'],
+                               cwd=os.path.dirname(os.path.abspath(__file__))).decode().split()[0]
+source = subprocess.check_output(['git', 'show', root + ':src/cheader.py'],
+                                 cwd=os.path.dirname(os.path.abspath(__file__))).decode()
+old = {}
+exec(compile(source.replace("if __name__ == '__main__':", 'if False:'), 'old_cheader', 'exec'), old)
+
+header = 'linux/input-event-codes.h'
+told = timeit.timeit(lambda: old['defines'](INCLUDE, header), number=5) / 5
+tnew = timeit.timeit(lambda: cheader.defines(INCLUDE, header), number=5) / 5
+print('{}: shlex {:.1f}ms, regex {:.1f}ms, x{:.1f}'.format(header, told * 1e3, tnew * 1e3, told / tnew))
+assert old['defines'](INCLUDE, header) == cheader.defines(INCLUDE, header)
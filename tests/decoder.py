@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+import timeit
+from struct import pack, unpack
+
+from steamcontroller.decoder import (
+    STEAM_CONTROLLER_FORMAT,
+    SteamControllerInput,
+    SCStatus,
+    decode,
+)
+
+_FORMATS, _NAMES = zip(*STEAM_CONTROLLER_FORMAT)
+
+report = bytearray(64)
+report[2] = SCStatus.INPUT
+report[4:6] = pack('<H', 1234)
+report[7:11] = pack('<I', 0x00008000)
+report[16:24] = pack('<hhhh', -1200, 300, 25000, -32000)
+data = memoryview(report)
+
+
+def old():
+    return SteamControllerInput._make(unpack('<' + ''.join(_FORMATS), data))
+
+
+def new():
+    return decode(data)
+
+
+assert old() == new()
+
+n = 200000
+t_old = min(timeit.repeat(old, number=n, repeat=5))
+t_new = min(timeit.repeat(new, number=n, repeat=5))
+print('old decoder: {:.3f} us/report'.format(t_old / n * 1e6))
+print('new decoder: {:.3f} us/report'.format(t_new / n * 1e6))
+print('speedup x{:.2f}'.format(t_old / t_new))
@@ -0,0 +1,241 @@
+# Fake usb1 objects shared by the tests driving SteamController without a
+# controller: FakeContext replaces usb1.USBContext and produces the reports by
+# completing the submitted interrupt transfers.
+
+import time
+import threading
+from struct import pack
+
+import usb1
+import steamcontroller
+from steamcontroller import SCStatus
+
+PERIOD = 0.004
+
+
+class FakeSetting(object):
+    def __init__(self, number):
+        self._number = number
+
+    def getNumber(self):
+        return self._number
+
+    def getClass(self):
+        return 3
+
+    def getSubClass(self):
+        return 0
+
+    def getProtocol(self):
+        return 0
+
+
+class FakeTransfer(object):
+    def __init__(self, ctx):
+        self._ctx = ctx
+        self._submitted = False
+        self._status = None
+        self._buffer = bytearray(64)
+        self.data = None
+
+    def setInterrupt(self, endpoint, length, callback):
+        self._callback = callback
+
+    def setControl(self, request_type, request, value, index, data, callback=None, timeout=0):
+        self.data = bytes(data)
+        self._callback = callback
+
+    def submit(self):
+        if not self._ctx.plugged:
+            raise usb1.USBErrorNoDevice()
+        self._submitted = True
+        self._status = None
+        if self.data is not None:
+            self._ctx.controls.append(self)
+        else:
+            self._ctx.submitted.append(self)
+
+    def cancel(self):
+        pass
+
+    def isSubmitted(self):
+        return self._submitted
+
+    def getStatus(self):
+        return self._status
+
+    def getActualLength(self):
+        return len(self._buffer)
+
+    def getBuffer(self):
+        return memoryview(self._buffer)
+
+    def complete(self, status, seq=0):
+        """End the transfer, an interrupt one receives input report seq"""
+        self._submitted = False
+        self._status = status
+        if self.data is not None:
+            self._callback(self)
+            return
+        self._buffer[2] = SCStatus.INPUT
+        self._buffer[4:6] = pack('<H', seq & 0xffff)
+        self._callback(self)
+
+
+class FakeDevice(object):
+    def __init__(self, ctx):
+        self._ctx = ctx
+
+    def __getitem__(self, index):
+        return [[FakeSetting(0)], [FakeSetting(1)], [FakeSetting(2)]]
+
+    def getVendorID(self):
+        return 0x28de
+
+    def getProductID(self):
+        return self._ctx.pid
+
+    def getBusNumber(self):
+        return 1
+
+    def getDeviceAddress(self):
+        return self._ctx.address
+
+    def open(self):
+        return FakeHandle(self._ctx, self)
+
+
+class FakeHandle(object):
+    def __init__(self, ctx, device):
+        self._ctx = ctx
+        self._device = device
+
+    def _check(self):
+        if not self._ctx.plugged:
+            raise usb1.USBErrorNoDevice()
+
+    def getDevice(self):
+        return self._device
+
+    def kernelDriverActive(self, number):
+        return False
+
+    def claimInterface(self, number):
+        self._check()
+        if self._ctx.busy:
+            # Claimed by another driver, ie Steam
+            self._ctx.busy -= 1
+            raise usb1.USBErrorBusy()
+
+    def releaseInterface(self, number):
+        self._check()
+
+    def resetDevice(self):
+        self._check()
+
+    def close(self):
+        self._ctx.closed += 1
+
+    def getTransfer(self):
+        return FakeTransfer(self._ctx)
+
+    def controlWrite(self, **kwargs):
+        self._check()
+
+    def controlRead(self, **kwargs):
+        """Answer to the serial number request, FAKE0001 for the first one"""
+        self._check()
+        self._ctx.serials += 1
+        serial = 'FAKE{:04d}'.format(self._ctx.serials).encode()
+        return (steamcontroller.SERIALCMD[:1] + b'\x00\x00' + serial).ljust(64, b'\x00')
+
+
+class FakeContext(object):
+    """
+    One controller sending a report every PERIOD while plugged, with hotplug
+    events. pid is the product id, 0x1102 for a wired controller or 0x1142
+    for a wireless dongle. The first busy claims fail with USBErrorBusy.
+    Control transfers are completed by the next handleEvents().
+    """
+    pid = 0x1102
+    hotplug = True
+    busy = 0
+
+    def __init__(self):
+        self.plugged = True
+        self.address = 1
+        self.submitted = []
+        self.controls = []
+        self.closed = 0
+        self.serials = 0
+        self.seq = 0
+        self.wakeups = 0
+        self._events = []
+        self._interrupted = False
+        self._callback = None
+        self._cond = threading.Condition()
+
+    def getDeviceIterator(self, skip_on_error=False):
+        return [FakeDevice(self)] if self.plugged else []
+
+    def hasCapability(self, capability):
+        return self.hotplug and capability == usb1.CAP_HAS_HOTPLUG
+
+    def hotplugRegisterCallback(self, callback, vendor_id=None, **kwargs):
+        self._callback = callback
+        if self.plugged:
+            callback(self, FakeDevice(self), usb1.HOTPLUG_EVENT_DEVICE_ARRIVED)
+        return 1
+
+    def plug(self):
+        with self._cond:
+            self.plugged = True
+            self.address += 1
+            if self._callback is not None:
+                self._events.append((FakeDevice(self), usb1.HOTPLUG_EVENT_DEVICE_ARRIVED))
+            self._cond.notify()
+
+    def unplug(self):
+        with self._cond:
+            self.plugged = False
+            if self._callback is not None:
+                self._events.append((FakeDevice(self), usb1.HOTPLUG_EVENT_DEVICE_LEFT))
+            self._cond.notify()
+
+    def interruptEventHandler(self):
+        with self._cond:
+            self._interrupted = True
+            self._cond.notify()
+
+    def handleEventsTimeout(self, tv=0):
+        self._handle(tv)
+
+    def handleEvents(self):
+        self._handle(None)
+
+    def _handle(self, tv):
+        """Wait for an event, then run hotplug callbacks and complete transfers"""
+        with self._cond:
+            deadline = None if tv is None else time.monotonic() + tv
+            while not (self._events or self._interrupted or self.controls or
+                       (self.plugged and self.submitted)):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self.wakeups += 1
+            self._interrupted = False
+            events, self._events = self._events, []
+            controls, self.controls = self.controls, []
+            plugged = self.plugged
+        for device, event in events:
+            self._callback(self, device, event)
+        for transfer in controls:
+            transfer.complete(usb1.TRANSFER_COMPLETED if plugged else usb1.TRANSFER_NO_DEVICE)
+        if not plugged:
+            while self.submitted:
+                self.submitted.pop(0).complete(usb1.TRANSFER_NO_DEVICE)
+        elif self.submitted:
+            time.sleep(PERIOD)
+            self.seq += 1
+            self.submitted.pop(0).complete(usb1.TRANSFER_COMPLETED, self.seq)
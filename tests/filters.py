@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+# Pad filters: jitter on a slow noisy move, lag on a fast swipe, and cost by
+# update compared with the mean over the whole window computed each report.
+
+import math
+import timeit
+import random
+from collections import deque
+
+import steamcontroller.uinput as sui
+from steamcontroller import SCButtons, SCStatus, SCI_NULL
+from steamcontroller.uinput import Axes
+from steamcontroller.events import EventMapper, Pos
+from steamcontroller.filters import MovingAverage, ExponentialAverage, OneEuroFilter
+
+PERIOD = 0.004
+NOISE = 150
+
+
+def stream(speed, duration, noise=NOISE, seed=0):
+    """(t, true x, noisy x, noisy y) of a finger moving at speed units/s"""
+    rnd = random.Random(seed)
+    out = []
+    for i in range(int(duration / PERIOD)):
+        t = i * PERIOD
+        x = -30000 + speed * t
+        out.append((t, x, int(x + rnd.gauss(0, noise)), int(rnd.gauss(0, noise))))
+    return out
+
+
+def rms(flt, samples, skip=10):
+    """RMS error of the filtered x against the true position"""
+    flt.reset()
+    err = 0.0
+    for i, (t, x, nx, ny) in enumerate(samples):
+        fx, _ = flt.update(nx, ny, t)
+        if i >= skip:
+            err += (fx - x) ** 2
+    return math.sqrt(err / (len(samples) - skip))
+
+
+# Exact same output as the mean of the previous 8 samples window
+ma = MovingAverage()
+xdq, ydq = deque(maxlen=8), deque(maxlen=8)
+for t, _, nx, ny in stream(5000, 1.0):
+    xdq.append(nx)
+    ydq.append(ny)
+    assert ma.update(nx, ny, t) == (int(sum(xdq) / len(xdq)), int(sum(ydq) / len(ydq)))
+
+slow = stream(2000, 2.0)
+fast = stream(100000, 0.5)
+filters = [
+    ('raw', MovingAverage(1)),
+    ('moving average 8', MovingAverage()),
+    ('exponential 0.4', ExponentialAverage()),
+    ('one euro', OneEuroFilter()),
+]
+
+print('{:18s} {:>10s} {:>10s} {:>8s}'.format('filter', 'slow rms', 'fast rms', 'ns'))
+results = {}
+for name, flt in filters:
+    def _update(flt=flt):
+        for t, _, nx, ny in slow:
+            flt.update(nx, ny, t)
+    cost = min(timeit.repeat(_update, number=1, repeat=5)) / len(slow) * 1e9
+    results[name] = (rms(flt, slow), rms(flt, fast))
+    print('{:18s} {:10.0f} {:10.0f} {:8.0f}'.format(name, results[name][0], results[name][1], cost))
+
+
+def _window():
+    for t, _, nx, ny in slow:
+        xm_p = int(sum(xdq) / len(xdq))
+        ym_p = int(sum(ydq) / len(ydq))
+        xdq.append(nx)
+        ydq.append(ny)
+        xm = int(sum(xdq) / len(xdq))
+        ym = int(sum(ydq) / len(ydq))
+
+
+cost = min(timeit.repeat(_window, number=1, repeat=5)) / len(slow) * 1e9
+print('{:18s} {:>10s} {:>10s} {:8.0f}'.format('window sums', '', '', cost))
+
+# The 1 euro filter removes jitter at low speed with less lag than the moving average
+assert results['one euro'][0] < results['raw'][0]
+assert results['one euro'][1] < results['moving average 8'][1]
+
+# Pad axes emit the filtered position while touched and the raw one when released
+rec = sui.RecordBackend()
+sui.setDefaultBackend(rec)
+gp = sui.Gamepad()
+evm = EventMapper(uinput_devices=(gp,))
+evm.setPadAxes(Pos.RIGHT, Axes.ABS_RX, Axes.ABS_RY, revert=False,
+               smoothing=ExponentialAverage(0.5))
+base = SCI_NULL._replace(status=SCStatus.INPUT)
+for x, buttons in ((1000, SCButtons.RPADTOUCH), (3000, SCButtons.RPADTOUCH), (0, 0)):
+    evm.process(None, base._replace(buttons=buttons, rpad_x=x))
+assert [e[2] for e in rec.events(gp) if e[:2] == (sui.EV_ABS, Axes.ABS_RX)] == [1000, 2000, 0]
+
+# Reports delivered in batches of 4 after each USB wakeup: filtering with the
+# callback time (about 10us apart) instead of the arrival time of each report
+# (SteamController.timestamp) breaks the speed estimation of the 1 euro filter
+
+
+class StampedController(object):
+    connected = None
+    timestamp = None
+    serial = None
+
+    def addFeedback(self, *args, **kwargs):
+        pass
+
+
+def batched(stamp):
+    """RMS error of the pad axis on the slow stream, stamp(i, t) gives the report time"""
+    rec = sui.RecordBackend()
+    sui.setDefaultBackend(rec)
+    gp = sui.Gamepad()
+    evm = EventMapper(uinput_devices=(gp,))
+    evm.setPadAxes(Pos.RIGHT, Axes.ABS_RX, Axes.ABS_RY, revert=False, smoothing=OneEuroFilter())
+    sc = StampedController()
+    err = []
+    for i, (t, x, nx, ny) in enumerate(slow):
+        sc.timestamp = stamp(i, t)
+        evm.process(sc, base._replace(buttons=SCButtons.RPADTOUCH, rpad_x=nx, rpad_y=ny, seq=i))
+        rx = [e[2] for e in rec.events(gp) if e[:2] == (sui.EV_ABS, Axes.ABS_RX)]
+        if i >= 10 and rx:
+            err.append((rx[-1] - x) ** 2)
+    return math.sqrt(sum(err) / len(err))
+
+
+arrival = batched(lambda i, t: t)
+callback = batched(lambda i, t: (i // 4) * 4 * PERIOD + (i % 4) * 10e-6)
+print('one euro in batches: {:.0f} rms with arrival times, {:.0f} with callback times'.format(
+    arrival, callback))
+assert arrival < callback
+assert abs(arrival - results['one euro'][0]) < 5
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+# Gyro aiming: sensitivity curves, online bias tracking while the controller
+# lies still, mouse and stick modes with grip enable and ratchet, and cost by
+# report of the gyro mouse compared with an unbound mapper.
+
+import gc
+import random
+import timeit
+import tracemalloc
+
+import steamcontroller.uinput as sui
+import steamcontroller.events as sce
+from steamcontroller import SCButtons, SCStatus, SCI_NULL
+from steamcontroller.uinput import Axes, Rels
+from steamcontroller.gyro import Gyro, SensitivityCurve, UNITS_PER_DPS
+from steamcontroller.calibration import Calibration
+
+from profiles import Clock, FakeSteamController
+
+PERIOD = 0.004
+BIAS = (12.0, -5.0, 3.0)
+
+# Curves: tightened below 2 deg/s, sensitivity ramp between 20 and 200 deg/s
+curve = SensitivityCurve(10, 30, slow_rate=20, fast_rate=200, tighten=2)
+assert curve.apply(0.0) == 0.0
+assert abs(curve.apply(1.0) - 5.0) < 1e-9
+assert abs(curve.apply(-10.0) + 100.0) < 1e-9
+assert abs(curve.apply(110.0) - 110.0 * 20) < 1e-9
+assert abs(curve.apply(-400.0) + 400.0 * 30) < 1e-9
+
+# Bias tracking: a wrong bias converges while still, and is kept while moving
+rnd = random.Random(0)
+gyro = Gyro((0, 0, 0))
+now = 0.0
+for i in range(int(10.0 / PERIOD)):
+    now += PERIOD
+    gyro.update(*[b + rnd.gauss(0, 4) for b in BIAS], now=now)
+print('bias after 10s still: ({:.2f}, {:.2f}, {:.2f})'.format(*gyro.bias))
+assert all(abs(b - e) < 1.0 for b, e in zip(gyro.bias, BIAS))
+bias = gyro.bias
+for i in range(int(2.0 / PERIOD)):
+    now += PERIOD
+    gyro.update(BIAS[0] + 3000, BIAS[1], BIAS[2], now)
+assert gyro.bias == bias
+
+clock = Clock()
+sce.time = clock.time
+base = SCI_NULL._replace(status=SCStatus.INPUT)
+
+
+def turn(evm, sc, yaw_dps, duration, buttons=0, batch=1):
+    """
+    Reports of a turn at constant speed around the yaw axis, delivered by
+    batches: the wall clock only moves once per batch
+    """
+    yaw = int(round(BIAS[2] + yaw_dps * UNITS_PER_DPS))
+    for i in range(int(round(duration / PERIOD))):
+        if i % batch == 0:
+            clock.now = sc.timestamp + PERIOD * batch
+        sc.timestamp += PERIOD
+        evm.process(sc, base._replace(buttons=buttons, gpitch=int(BIAS[0]), groll=int(BIAS[1]),
+                                      gyaw=yaw, seq=i))
+
+
+def moves(rec, mouse, rel):
+    return sum(e[2] for e in rec.events(mouse) if e[:2] == (sui.EV_REL, rel))
+
+
+# Gyro mouse: 100 deg/s during 1s at 15 pixels by degree, enabled on the
+# controller, only while the grip is held, or except while held with ratchet
+rec = sui.RecordBackend()
+sui.setDefaultBackend(rec)
+mouse = sui.Mouse()
+sc = FakeSteamController()
+sc.timestamp = clock.now
+evm = sce.EventMapper(uinput_devices=(mouse,), calibration=Calibration(gyro_bias=BIAS))
+evm.setGyroMouse()
+turn(evm, sc, 100.0, 1.0)
+dx = moves(rec, mouse, Rels.REL_X)
+print('gyro mouse: 100 deg/s during 1s moved {:d} pixels'.format(dx))
+assert abs(dx + 1500) <= 15 and moves(rec, mouse, Rels.REL_Y) == 0
+assert sc.cmsg == 1
+
+# Same turn delivered 4 reports at a time, integrated on the arrival times
+rec = sui.RecordBackend()
+sui.setDefaultBackend(rec)
+mouse = sui.Mouse()
+evm = sce.EventMapper(uinput_devices=(mouse,), calibration=Calibration(gyro_bias=BIAS))
+evm.setGyroMouse()
+turn(evm, sc, 100.0, 1.0, batch=4)
+assert abs(moves(rec, mouse, Rels.REL_X) - dx) <= 1
+
+for ratchet, held, expected in ((False, SCButtons.RGRIP, 1500), (False, 0, 0),
+                                (True, SCButtons.RGRIP, 0), (True, 0, 1500)):
+    rec = sui.RecordBackend()
+    sui.setDefaultBackend(rec)
+    mouse = sui.Mouse()
+    evm = sce.EventMapper(uinput_devices=(mouse,), calibration=Calibration(gyro_bias=BIAS))
+    evm.setGyroMouse(enable=SCButtons.RGRIP, ratchet=ratchet)
+    turn(evm, sc, -100.0, 1.0, held)
+    assert abs(moves(rec, mouse, Rels.REL_X) - expected) <= 15, (ratchet, held)
+
+# Gyro stick: deflection follows the speed, centered when released
+rec = sui.RecordBackend()
+sui.setDefaultBackend(rec)
+gp = sui.Gamepad()
+evm = sce.EventMapper(uinput_devices=(gp,), calibration=Calibration(gyro_bias=BIAS))
+evm.setGyroAxes(Axes.ABS_RX, Axes.ABS_RY, enable=SCButtons.RGRIP)
+turn(evm, sc, -180.0, 0.1, SCButtons.RGRIP)
+turn(evm, sc, -180.0, 0.1)
+rx = [e[2] for e in rec.events(gp) if e[:2] == (sui.EV_ABS, Axes.ABS_RX)]
+assert abs(rx[0] - 16000) < 100 and rx[-1] == 0 and len(rx) == 2, rx
+
+# Cost by report, the gyro fields change every report
+sui.setDefaultBackend(sui.NullBackend())
+stream = [base._replace(gpitch=rnd.randint(-50, 50), groll=rnd.randint(-50, 50),
+                        gyaw=rnd.randint(-2000, 2000), seq=i) for i in range(2000)]
+
+
+def cost(evm):
+    def _run():
+        for sci in stream:
+            sc.timestamp += PERIOD
+            evm.process(sc, sci)
+    _run()
+    return min(timeit.repeat(_run, number=1, repeat=5)) / len(stream) * 1e6
+
+
+idle = sce.EventMapper(uinput_devices=(sui.Mouse(),))
+aim = sce.EventMapper(uinput_devices=(sui.Mouse(),))
+aim.setGyroMouse()
+print('unbound {:.2f}us, gyro mouse {:.2f}us by report'.format(cost(idle), cost(aim)))
+
+# Nothing is kept from one report to the next
+gc.collect()
+tracemalloc.start()
+cost(aim)
+before = tracemalloc.take_snapshot()
+cost(aim)
+after = tracemalloc.take_snapshot()
+tracemalloc.stop()
+grown = sum(s.size_diff for s in after.compare_to(before, 'filename') if s.size_diff > 0)
+print('memory grown over {:d} reports: {:d} bytes'.format(len(stream) * 6, grown))
+assert grown < 4096
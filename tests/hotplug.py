@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+# Reconnection in keep_alive mode and of the manager: the usb1 context is
+# replaced by a fake one with hotplug support, the controller is unplugged
+# and plugged again from another thread. The loop must sleep while nothing
+# is plugged and get reports again right after the arrival. Without hotplug
+# support it falls back on polling, as when the plugged controller stays
+# busy (ie claimed by Steam) after its arrival. A slot claimed by the
+# manager that fails to open is released.
+
+import time
+import threading
+
+import usb1
+import steamcontroller
+from steamcontroller import SteamController
+from steamcontroller.manager import SteamControllerManager
+
+import fakeusb
+from fakeusb import FakeContext
+
+
+def limit():
+    """Longest reconnection: arrival retries then polling"""
+    return sum(steamcontroller.ARRIVAL_RETRY) + 4 * steamcontroller.RECONNECT_POLL
+
+
+def session(hotplug, busy=0):
+    ctx = FakeContext()
+    ctx.hotplug = hotplug
+    received = []
+    serials = set()
+
+    def _received(sc, sci):
+        received.append(time.monotonic())
+        serials.add(sc.serial)
+
+    sc = SteamController(callback=_received, keep_alive=True, ctx=ctx)
+    thread = threading.Thread(target=sc.run)
+    thread.daemon = True
+    thread.start()
+    time.sleep(0.1)
+    assert received
+
+    ctx.unplug()
+    time.sleep(0.05)
+    wakeups = ctx.wakeups
+    time.sleep(0.5)
+    idle = ctx.wakeups - wakeups
+
+    plugged = time.monotonic()
+    ctx.busy = busy
+    ctx.plug()
+    while not received or received[-1] < plugged:
+        time.sleep(0.001)
+        if time.monotonic() - plugged > limit():
+            raise AssertionError('not reconnected')
+    latency = received[-1] - plugged
+
+    sc.release()
+    thread.join(2.0)
+    assert not thread.is_alive()
+    assert not ctx.busy
+    # The serial is read once by connection, before the first report
+    assert ctx.serials == 2 and serials == {'FAKE0001', 'FAKE0002'}, serials
+    return idle, latency, ctx
+
+
+for hotplug in (True, False):
+    idle, latency, ctx = session(hotplug)
+    print('{:8s}: {:d} wakeups in 0.5s unplugged, first report {:.0f}ms after plug'.format(
+        'hotplug' if hotplug else 'polling', idle, latency * 1e3))
+    # The unplugged device handle is closed
+    assert ctx.closed >= 1
+    if hotplug:
+        assert idle == 0 and latency < 0.05
+    else:
+        assert latency <= steamcontroller.RECONNECT_POLL + 0.1
+
+# Busy during all the arrival retries: no other arrival comes, polled
+steamcontroller.RECONNECT_POLL = 0.2
+busy = len(steamcontroller.ARRIVAL_RETRY) + 2
+idle, latency, ctx = session(True, busy)
+print('busy    : opened after {:d} busy claims, first report {:.0f}ms after plug'.format(
+    busy, latency * 1e3))
+assert latency < limit()
+
+# Manager: the controller going away is dropped, the one plugged later is
+# served from the same loop
+steamcontroller.RECONNECT_POLL = 2.0
+
+ctx = FakeContext()
+received = []
+slots = []
+
+
+def _factory(slot):
+    slots.append(slot)
+    return lambda sc, sci: received.append(time.monotonic())
+
+
+manager = SteamControllerManager(_factory, ctx=ctx)
+thread = threading.Thread(target=manager.run)
+thread.daemon = True
+thread.start()
+time.sleep(0.1)
+assert received and len(manager.controllers) == 1
+
+ctx.unplug()
+deadline = time.monotonic() + 1.0
+while manager.controllers:
+    assert time.monotonic() < deadline, 'unplugged controller kept'
+    time.sleep(0.001)
+wakeups = ctx.wakeups
+time.sleep(0.5)
+idle = ctx.wakeups - wakeups
+
+plugged = time.monotonic()
+ctx.plug()
+while not received or received[-1] < plugged:
+    time.sleep(0.001)
+    if time.monotonic() - plugged > limit():
+        raise AssertionError('manager did not serve the new controller')
+latency = received[-1] - plugged
+print('manager : {:d} wakeups in 0.5s unplugged, first report {:.0f}ms after plug'.format(
+    idle, latency * 1e3))
+assert idle == 0 and latency < 0.05
+assert len(slots) == 2 and len(manager.controllers) == 1
+
+# Busy after its arrival: rescanned until it can be claimed
+ctx.unplug()
+while manager.controllers:
+    time.sleep(0.001)
+steamcontroller.RECONNECT_POLL = 0.2
+plugged = time.monotonic()
+ctx.busy = busy
+ctx.plug()
+while not received or received[-1] < plugged:
+    time.sleep(0.001)
+    if time.monotonic() - plugged > limit():
+        raise AssertionError('manager did not serve the busy controller')
+print('manager : opened after {:d} busy claims, first report {:.0f}ms after plug'.format(
+    busy, (received[-1] - plugged) * 1e3))
+assert not ctx.busy and len(slots) == 3
+
+manager.release()
+thread.join(2.0)
+assert not thread.is_alive() and not manager.controllers
+
+
+# A claimed slot that can not be opened is released, its handle closed
+released = []
+
+
+def _failingWrite(handle, **kwargs):
+    raise usb1.USBErrorPipe()
+
+
+fakeusb.FakeHandle.controlWrite = _failingWrite
+fakeusb.FakeHandle.releaseInterface = lambda handle, number: released.append(number)
+ctx = FakeContext()
+try:
+    SteamControllerManager(_factory, ctx=ctx)
+except ValueError:
+    pass
+else:
+    raise AssertionError('controller served')
+assert released == [2] and ctx.closed == 1, (released, ctx.closed)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+# Import time report of every entry point, in the style of -X importtime.
+# Each script is imported (not run) in a fresh interpreter with
+# -X importtime, the time spent in imports that the bare interpreter does
+# not do is summed and checked against tests/imports.json, which also lists
+# modules an entry point must not import at startup:
+#
+#   python tests/imports.py            report and check budgets
+#   python tests/imports.py -v         also print the slowest imports
+
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = os.path.join(HERE, '..', 'scripts')
+BUDGETS = os.path.join(HERE, 'imports.json')
+
+IMPORT_SCRIPT = '''
+import importlib.util as u
+s = u.spec_from_file_location('entry', {!r})
+s.loader.exec_module(u.module_from_spec(s))
+'''
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$', re.M)
+
+
+def importtime(code):
+    """Return [(module, self us, cumulative us, depth)] of a python -c run"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().split('\n')[-1])
+    return [(m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2)
+            for m in _LINE.finditer(proc.stderr)]
+
+
+def entries():
+    out = {}
+    for name in sorted(os.listdir(SCRIPTS)):
+        if name.endswith('.py'):
+            out[name[:-3]] = IMPORT_SCRIPT.format(os.path.abspath(os.path.join(SCRIPTS, name)))
+    for module in ('steamcontroller', 'steamcontroller.events', 'steamcontroller.uinput'):
+        out[module] = 'import ' + module
+    return out
+
+
+def measure(code, baseline, runs):
+    """Return the best total in ms, the imported modules and the import list of a run"""
+    best = None
+    for _ in range(runs):
+        imports = [x for x in importtime(code) if x[0] not in baseline]
+        total = sum(x[1] for x in imports) / 1000.0
+        if best is None or total < best[0]:
+            best = (total, imports)
+    return best[0], set(x[0] for x in best[1]), best[1]
+
+
+def _main():
+    parser = argparse.ArgumentParser(description='Entry points import time report')
+    parser.add_argument('-n', '--runs', type=int, default=3, help='keep the best of RUNS')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print the slowest imports')
+    args = parser.parse_args()
+
+    with open(BUDGETS) as f:
+        budgets = json.load(f)
+
+    baseline = set(x[0] for x in importtime('pass'))
+    failed = []
+    for entry, code in sorted(entries().items()):
+        budget = budgets.get(entry, {})
+        try:
+            total, modules, imports = measure(code, baseline, args.runs)
+        except RuntimeError as e:
+            print('{:24s} skipped: {}'.format(entry, e))
+            continue
+        errors = []
+        if 'ms' in budget and total > budget['ms']:
+            errors.append('over {:.0f}ms budget'.format(budget['ms']))
+        for module in budget.get('forbid', []):
+            if module in modules:
+                errors.append('imports ' + module)
+        print('{:24s} {:7.1f}ms {:4d} modules  {}'.format(entry, total, len(modules),
+                                                         ', '.join(errors) or 'ok'))
+        if args.verbose:
+            for module, own, cumulative, depth in sorted(imports, key=lambda x: -x[1])[:5]:
+                print('    {:7.1f}ms {:7.1f}ms  {}'.format(own / 1000.0, cumulative / 1000.0, module))
+        if errors:
+            failed.append(entry)
+
+    if failed:
+        print('import budget exceeded: ' + ', '.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+# Trackball inertia: a glide integrated at 1kHz on a virtual clock moves the
+# same distance as one advanced every 20ms (the period at which the last
+# report used to be sent again), in smaller steps, and the integrator sleeps
+# once the ball is stopped.
+
+import steamcontroller.uinput as sui
+from steamcontroller.inertia import Inertia
+
+DECEL = 20.0
+SCALE = 400.0
+
+
+def glide(rate, xvel=4.0, yvel=-3.0):
+    """Return the moves emitted and the ticks of a glide"""
+    moves = []
+    ball = Inertia(lambda dx, dy: moves.append((dx, dy)), DECEL, SCALE, SCALE, rate)
+    now = 0.0
+    dist = 0.0
+    ball.throw(xvel, yvel, now)
+    while True:
+        timeout = ball.timeout(now)
+        if timeout is None:
+            break
+        now += timeout
+        dist += ball.tick(now)
+    # tick() returns the distance travelled, v^2 / 2a in all
+    assert abs(dist - (xvel ** 2 + yvel ** 2) / (2 * DECEL)) < 1e-9
+    return moves, ball.ticks, now
+
+
+print('{:>6s} {:>8s} {:>8s} {:>6s} {:>6s} {:>8s}'.format(
+    'rate', 'dx', 'dy', 'moves', 'max', 'stop ms'))
+results = {}
+for rate in (50, 250, 1000):
+    moves, ticks, stop = glide(rate)
+    dx = sum(m[0] for m in moves)
+    dy = sum(m[1] for m in moves)
+    step = max(abs(m[0]) + abs(m[1]) for m in moves)
+    results[rate] = (dx, dy, step)
+    print('{:6d} {:8d} {:8d} {:6d} {:6d} {:8.0f}'.format(rate, dx, dy, len(moves), step, stop * 1e3))
+
+# Exact integration: the distance does not depend on the rate (v^2 / 2a)
+assert abs(results[1000][0] - results[50][0]) <= 1 and abs(results[1000][1] - results[50][1]) <= 1
+assert abs(results[1000][0] - int(4.0 * 5.0 / (2 * DECEL) * SCALE)) <= 1
+assert results[1000][2] * 10 < results[50][2]
+
+# Stopped ball and late ticks
+moves, ticks, stop = glide(1000)
+ball = Inertia(lambda dx, dy: None, DECEL, SCALE, SCALE)
+assert ball.timeout(0.0) is None and not ball.moving()
+ball.throw(1.0, 0.0, 0.0)
+assert ball.timeout(0.0) == 0.001
+assert ball.tick(0.0005) == 0.0
+assert ball.tick(0.0105) > 0.0
+assert abs(ball.timeout(0.0105) - 0.0005) < 1e-9
+
+# Mouse throws the ball on release, the glide goes on through its timers
+sui.setDefaultBackend(sui.RecordBackend())
+
+
+class Clock(object):
+    now = 10.0
+
+    def monotonic(self):
+        return self.now
+
+
+clock = Clock()
+sui.time = clock
+mouse = sui.Mouse()
+for i in range(10):
+    clock.now += 0.004
+    mouse.moveEvent(200, 0)
+clock.now += 0.004
+assert mouse.moveEvent(0, 0, free=True) == 0.0
+timers = [t for t in mouse.timers() if t.moving()]
+assert len(timers) == 1
+# Driven by the next calls when nothing ticks, they return the distance
+clock.now += 0.001
+assert mouse.moveEvent(0, 0, free=True) > 0.0
+while timers[0].moving():
+    clock.now += timers[0].timeout(clock.now)
+    timers[0].tick(clock.now)
+assert all(t.timeout(clock.now) is None for t in mouse.timers())
+print('mouse glide {:.0f}ms, {:d} ticks'.format((clock.now - 10.044) * 1e3, timers[0].ticks))
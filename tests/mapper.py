@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+# EventMapper dispatch plan: the events generated by the shipped profiles are
+# compared with the mapper of the first commit (loaded with git show) and the
+# per report cost is measured while binding more and more buttons, it should
+# grow with what is bound and stay low when nothing is.
+
+import os
+import timeit
+import subprocess
+
+import steamcontroller.uinput as sui
+import steamcontroller.events as sce
+from steamcontroller import SCButtons
+from steamcontroller.uinput import Keys
+
+from profiles import Clock, FakeSteamController, load, report, synthetic
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPORTS = 2000
+
+
+class RecordSteamController(FakeSteamController):
+    def __init__(self):
+        super(RecordSteamController, self).__init__()
+        self.calls = []
+
+    def addFeedback(self, *args, **kwargs):
+        self.calls.append(('feedback', args, sorted(kwargs.items())))
+
+    def addExit(self):
+        self.calls.append(('exit',))
+
+
+def original():
+    """EventMapper class of the first commit"""
+    root = subprocess.check_output(['git', 'rev-list', '--max-parents=0', 'HEAD'],
+                                   cwd=HERE).decode().split()[0]
+    source = subprocess.check_output(['git', 'show', root + ':src/events.py'], cwd=HERE).decode()
+    module = {}
+    exec(compile(source, 'old_events', 'exec'), module)
+    return module
+
+
+def run(evminit, reports, clock):
+    rec = sui.RecordBackend()
+    sui.setDefaultBackend(rec)
+    clock.now = 1000.0
+    sc = RecordSteamController()
+    evm = evminit()
+    # The original mapper does not know about the trackball timers
+    for uip in evm._uips:
+        for timer in uip.timers():
+            sc.addTimer(timer)
+    for sci in reports:
+        sc.advance(clock, 0.004)
+        evm.process(sc, sci)
+    return rec.events(), sc.calls
+
+
+clock = Clock()
+sui.time = clock
+sce.time = clock.time
+old = original()
+old['time'] = clock.time
+
+# Same events and haptic feedbacks as the original mapper
+reports = synthetic(REPORTS)
+for profile in ('sc-xbox', 'sc-desktop', 'sc-gamepad', 'sc-mixed'):
+    evminit = load(profile)
+    new = run(evminit, reports, clock)
+    evminit.__globals__['EventMapper'] = old['EventMapper']
+    ref = run(evminit, reports, clock)
+    evminit.__globals__['EventMapper'] = sce.EventMapper
+    print('{:12s} {:6d} events, {:4d} feedbacks, {}'.format(
+        profile, len(new[0]), len(new[1]), 'identical' if new == ref else 'DIFFERENT'))
+    assert new == ref, profile
+
+# Button callbacks are called (they were skipped by the original mapper)
+calls = []
+evm = sce.EventMapper(uinput_devices=(sui.Keyboard(),))
+evm.setButtonCallback(SCButtons.STEAM, lambda evm, btn, pressed: calls.append((btn, pressed)))
+for buttons in (SCButtons.STEAM, SCButtons.STEAM, 0):
+    evm.process(None, report(0, buttons))
+assert calls == [(SCButtons.STEAM, True), (SCButtons.STEAM, False)], calls
+
+# Reconfiguration while running rebuilds the plan
+rec = sui.RecordBackend()
+sui.setDefaultBackend(rec)
+kb = sui.Keyboard()
+evm = sce.EventMapper(uinput_devices=(kb,))
+evm.setButtonAction(SCButtons.A, Keys.KEY_A)
+evm.process(None, report(0, SCButtons.A))
+evm.setButtonAction(SCButtons.B, Keys.KEY_B)
+evm.process(None, report(1, SCButtons.A | SCButtons.B))
+assert [e for e in rec.events(kb) if e[0] == sui.EV_KEY] == [
+    (sui.EV_KEY, Keys.KEY_A, 1), (sui.EV_KEY, Keys.KEY_B, 1)], rec.events(kb)
+
+# Per report cost with buttons toggling in turn, only buttons are bound
+BUTTONS = [SCButtons.A, SCButtons.B, SCButtons.X, SCButtons.Y, SCButtons.LB, SCButtons.RB,
+           SCButtons.START, SCButtons.BACK, SCButtons.LGRIP, SCButtons.RGRIP,
+           SCButtons.LT, SCButtons.RT, SCButtons.LPAD]
+KEYS = [Keys.BTN_A, Keys.BTN_B, Keys.BTN_X, Keys.BTN_Y, Keys.BTN_TL, Keys.BTN_TR,
+        Keys.BTN_START, Keys.BTN_SELECT, Keys.BTN_BACK, Keys.BTN_FORWARD,
+        Keys.BTN_TL2, Keys.BTN_TR2, Keys.BTN_THUMBL]
+stream = [report(i, BUTTONS[(i // 4) % len(BUTTONS)] if i % 4 < 2 else 0) for i in range(REPORTS)]
+sui.setDefaultBackend(sui.NullBackend())
+gamepad = sui.Gamepad()
+
+
+def mapper(cls, bound):
+    evm = cls(uinput_devices=(gamepad,))
+    for btn, key in zip(BUTTONS[:bound], KEYS):
+        evm.setButtonAction(btn, key)
+    return evm
+
+
+def cost(evm):
+    def _run():
+        for sci in stream:
+            evm.process(None, sci)
+    return min(timeit.repeat(_run, number=1, repeat=5)) / len(stream) * 1e6
+
+
+print('{:>6s} {:>8s} {:>8s}'.format('bound', 'old us', 'new us'))
+for bound in (0, 2, 6, len(BUTTONS)):
+    told = cost(mapper(old['EventMapper'], bound))
+    tnew = cost(mapper(sce.EventMapper, bound))
+    print('{:6d} {:8.2f} {:8.2f}'.format(bound, told, tnew))
+    if bound == 0:
+        assert tnew < told, 'unbound report slower than the original mapper'
@@ -13,9 +13,12 @@ for i in range(250):
 # let the ball roll
 t0 = time.time()
 dtotal = 0
-while d != 0.0:
+while True:
     d = m.moveEvent(0,0,True)
     dtotal += d
+    # Fixed rate glide: calls between two ticks move nothing
+    if not m.timers()[0].moving():
+        break
 dt = time.time()-t0
 print('Intertia time = {:f}, total mvmt = {:d}'.format(dt, int(dtotal)))
 
@@ -31,9 +34,12 @@ for i in range(250):
 # let the ball roll
 t0 = time.time()
 dtotal = 0
-while d != 0.0:
+while True:
     d = m.moveEvent(0,0,True)
     dtotal += d
+    # Fixed rate glide: calls between two ticks move nothing
+    if not m.timers()[0].moving():
+        break
 dt = time.time()-t0
 print('Intertia time = {:f}, total mvmt = {:d}'.format(dt, int(dtotal)))
 
@@ -49,8 +55,11 @@ for i in range(250):
 # let the ball roll
 t0 = time.time()
 dtotal = 0
-while d != 0.0:
+while True:
     d = m.moveEvent(0,0,True)
     dtotal += d
+    # Fixed rate glide: calls between two ticks move nothing
+    if not m.timers()[0].moving():
+        break
 dt = time.time()-t0
 print('Intertia time = {:f}, total mvmt = {:d}'.format(dt, int(dtotal)))
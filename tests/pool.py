@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+# Virtual devices kept across reconnects: the devices of a DevicePool are
+# created before the first report, in parallel (the backend sleeps on each
+# creation), and a controller going away releases what it was holding
+# without destroying them. Leased mappers are only taken by slots sending
+# input reports.
+
+import time
+import threading
+
+import steamcontroller.uinput as sui
+import steamcontroller.events as sce
+from steamcontroller import SCButtons, SCStatus, SCI_NULL
+from steamcontroller.pool import DevicePool
+from steamcontroller.uinput import Keys
+
+from profiles import Clock, FakeSteamController, load, report
+
+CREATE_TIME = 0.02
+
+
+class SlowBackend(sui.RecordBackend):
+    """Device creation takes CREATE_TIME, as the uinput ioctls would"""
+    def __init__(self):
+        super(SlowBackend, self).__init__()
+        self.created = 0
+        self._lock = threading.Lock()
+
+    def create(self, uip):
+        time.sleep(CREATE_TIME)
+        with self._lock:
+            self.created += 1
+            return super(SlowBackend, self).create(uip)
+
+
+def main():
+    clock = Clock()
+    sce.time = clock.time
+    backend = SlowBackend()
+    sui.setDefaultBackend(backend)
+
+    start = time.monotonic()
+    pool = DevicePool(load('sc-desktop'), size=2)
+    elapsed = time.monotonic() - start
+    devices = sum(len(evm.devices) for evm in pool)
+    print('{} devices created in {:.1f}ms ({:.0f}ms each)'.format(
+        devices, elapsed * 1000, CREATE_TIME * 1000))
+    assert backend.created == devices == 6
+    assert elapsed < devices * CREATE_TIME / 2, "created one after the other"
+
+    # Same mappers in the same order at each session, more built on demand
+    first = pool.acquire()
+    assert first is pool[0] and pool.acquire() is pool[1]
+    pool.acquire()
+    assert len(pool) == 3 and backend.created == 9
+    pool.reset()
+    assert pool.acquire() is first
+
+    # Hold A (KEY_ENTER on sc-desktop) and the right pad click, then go away
+    sc = FakeSteamController()
+    first.process(sc, report(1, SCButtons.A | SCButtons.RPAD))
+    kbd = [uip for uip in first.devices if uip.keyManaged(Keys.KEY_ENTER)][0]
+    assert (sui.EV_KEY, Keys.KEY_ENTER, 1) in backend.events(kbd)
+    backend.clear()
+    sc.connected = False
+    first.process(sc, report(1, SCButtons.A | SCButtons.RPAD))
+    released = backend.events()
+    print('released on disconnect:', released)
+    assert (kbd._fd, sui.EV_KEY, Keys.KEY_ENTER, 0) in released
+    assert (kbd._fd, sui.EV_KEY, Keys.KEY_SPACE, 0) in released
+    assert all(value == 0 for _, evtype, _, value in released if evtype == sui.EV_KEY)
+
+    # Nothing more while disconnected, the devices are still there
+    backend.clear()
+    first.process(sc, report(2, SCButtons.A))
+    assert not backend.events()
+    assert all(uip.created for uip in first.devices)
+
+    # Reconnected: a new press is seen again
+    sc = FakeSteamController()
+    first.process(sc, report(3, SCButtons.A))
+    assert (kbd._fd, sui.EV_KEY, Keys.KEY_ENTER, 1) in backend.events()
+    pool.reset()
+    assert (kbd._fd, sui.EV_KEY, Keys.KEY_ENTER, 0) in backend.events()
+
+    # Long Steam press: exit requested, keys released, devices kept
+    backend.clear()
+    sc = FakeSteamController()
+    first = pool.acquire()
+    first.process(sc, report(4, SCButtons.A | SCButtons.STEAM))
+    clock.now += 3.0
+    first.process(sc, report(5, SCButtons.A | SCButtons.STEAM))
+    assert sc.cmsg == 1
+    assert (kbd._fd, sui.EV_KEY, Keys.KEY_ENTER, 0) in backend.events()
+    assert all(uip.created for uip in first.devices)
+    pool.reset()
+
+    # Manager leases: an empty dongle slot only sends hotplug and idle
+    # reports and gets no devices, a controller takes the first free mapper
+    # and gives it back once gone
+    backend.clear()
+    created = backend.created
+    empty, lease = pool.lease(), pool.lease()
+    sc = FakeSteamController()
+    empty(sc, SCI_NULL._replace(status=SCStatus.HOTPLUG))
+    empty(sc, SCI_NULL._replace(status=SCStatus.IDLE))
+    assert empty.mapper is None
+    lease(sc, report(6, SCButtons.A))
+    assert lease.mapper is first and backend.created == created
+    pool.release(empty)
+    pool.release(lease)
+    assert lease.mapper is None
+    assert (kbd._fd, sui.EV_KEY, Keys.KEY_ENTER, 0) in backend.events()
+    other = pool.lease()
+    other(sc, report(7, 0))
+    assert other.mapper is first and len(pool) == 3
+    pool.reset()
+
+    pool.close()
+    assert not backend.devices and len(pool) == 0
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+
+# End-to-end benchmark of the shipped profiles: synthetic or recorded report
+# streams are pushed through the evminit() configuration of each sc-*.py
+# script and the uinput output goes to the null backend, so it runs
+# without /dev/uinput nor USB hardware.
+#
+# Results are printed as JSON (reports/s, p50/p99 per report processing time,
+# events per report, allocations per report) and can be compared with a
+# previous run:
+#
+#   python tests/profiles.py -o before.json
+#   python tests/profiles.py --compare before.json
+#   python tests/profiles.py -r session.sccap
+
+import os
+import sys
+import gc
+import json
+import math
+import time
+import argparse
+import platform
+import tracemalloc
+import importlib.util
+from struct import pack
+
+import steamcontroller.uinput as sui
+import steamcontroller.events as sce
+from steamcontroller import SCStatus, SCButtons, SCI_NULL
+from steamcontroller.decoder import decodeInput
+from steamcontroller.capture import CaptureReader
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+PROFILES = ('sc-xbox', 'sc-desktop', 'sc-gamepad', 'sc-mixed')
+
+PERIOD = 0.004
+REPORTS = 5000
+
+
+class Clock(object):
+    """Virtual clock advanced by the report period, used instead of time.time"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+
+class FakeSteamController(object):
+    """Control messages sent by the mapper are only counted"""
+    connected = None
+    timestamp = None
+    serial = None
+
+    def __init__(self):
+        self.cmsg = 0
+        self.timers = []
+
+    def addFeedback(self, *args, **kwargs):
+        self.cmsg += 1
+
+    def addExit(self):
+        self.cmsg += 1
+
+    def setGyro(self, enabled=True):
+        self.cmsg += 1
+
+    def addTimer(self, timer):
+        if timer not in self.timers:
+            self.timers.append(timer)
+
+    def advance(self, clock, period):
+        """Tick the timers as the event loop would until the next report"""
+        end = clock.now + period
+        while True:
+            timeouts = [t for t in (x.timeout(clock.now) for x in self.timers) if t is not None]
+            if not timeouts or clock.now + min(timeouts) > end:
+                break
+            clock.now += min(timeouts) + 1e-9
+            for timer in self.timers:
+                timer.tick(clock.now)
+        clock.now = end
+        self.timestamp = end
+
+
+def report(seq, buttons=0, ltrig=0, rtrig=0, lpad=(0, 0), rpad=(0, 0)):
+    data = bytearray(64)
+    data[2] = SCStatus.INPUT
+    data[4:6] = pack('<H', seq & 0xffff)
+    data[7:11] = pack('<I', buttons)
+    data[11] = ltrig
+    data[12] = rtrig
+    data[16:24] = pack('<hhhh', lpad[0], lpad[1], rpad[0], rpad[1])
+    return decodeInput(data)
+
+
+def synthetic(count=REPORTS):
+    """
+    Deterministic stream mixing the usual inputs over 1s cycles: left pad or
+    stick and right pad moving in circles with touch lifts (free trackball),
+    trigger ramps and buttons pressed in turn
+    """
+    buttons = [SCButtons.A, SCButtons.B, SCButtons.X, SCButtons.Y, SCButtons.LB,
+               SCButtons.RB, SCButtons.START, SCButtons.BACK, SCButtons.LGRIP,
+               SCButtons.RGRIP]
+    reports = []
+    for i in range(count):
+        phase = i % 250
+        angle = 2 * math.pi * i / 125.0
+        btn = 0
+        if phase % 50 < 10:
+            btn |= buttons[(i // 50) % len(buttons)]
+        lpad = (int(20000 * math.cos(angle)), int(20000 * math.sin(angle)))
+        if phase < 125:
+            # Left pad touched, right pad moving
+            btn |= SCButtons.LPADTOUCH | SCButtons.RPADTOUCH
+            rpad = (int(25000 * math.sin(angle)), int(25000 * math.cos(angle)))
+        elif phase < 200:
+            # Stick used (no LPADTOUCH), right pad lifted
+            rpad = (0, 0)
+        else:
+            btn |= SCButtons.RPADTOUCH
+            rpad = (int(8000 * math.cos(angle)), 0)
+        ramp = int(255 * abs(math.sin(angle / 2)))
+        reports.append(report(i, btn, ramp, 255 - ramp, lpad, rpad))
+    return reports
+
+
+def recorded(path):
+    """Input reports of a capture file, see sc-dump.py -w"""
+    reports = []
+    with CaptureReader(path) as reader:
+        for _, data in reader:
+            if data[2] == SCStatus.INPUT:
+                reports.append(decodeInput(data))
+    return reports
+
+
+def load(profile):
+    """Import a sc-*.py script and return its evminit function"""
+    spec = importlib.util.spec_from_file_location(profile.replace('-', '_'),
+                                                  os.path.join(SCRIPTS, profile + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.evminit
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def bench(evminit, reports, sink, clock):
+    sc = FakeSteamController()
+
+    # Timing pass
+    evm = evminit()
+    process = evm.process
+    evm.process(sc, SCI_NULL)
+    events = sink.events
+    frames = sink.frames
+    times = []
+    gc.collect()
+    start = time.perf_counter()
+    for sci in reports:
+        sc.advance(clock, PERIOD)
+        t = time.perf_counter()
+        process(sc, sci)
+        times.append(time.perf_counter() - t)
+    total = time.perf_counter() - start
+    events = sink.events - events
+    frames = sink.frames - frames
+
+    # Allocation pass, transient bytes per report and retained blocks
+    sc.timers = []
+    evm = evminit()
+    process = evm.process
+    evm.process(sc, SCI_NULL)
+    gc.collect()
+    peak = 0
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    for sci in reports:
+        sc.advance(clock, PERIOD)
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        process(sc, sci)
+        peak += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks
+
+    times.sort()
+    n = len(reports)
+    return {
+        'reports': n,
+        'reports_per_s': n / total,
+        'p50_us': percentile(times, 0.5) * 1e6,
+        'p99_us': percentile(times, 0.99) * 1e6,
+        'events_per_report': float(events) / n,
+        'frames_per_report': float(frames) / n,
+        'cmsg': sc.cmsg,
+        'alloc_bytes_per_report': float(peak) / n,
+        'retained_blocks_per_report': float(blocks) / n,
+    }
+
+
+def compare(old, new):
+    for profile, streams in sorted(new['results'].items()):
+        for stream, res in sorted(streams.items()):
+            try:
+                ref = old['results'][profile][stream]
+            except KeyError:
+                continue
+            print('{:12s} {:12s} reports/s {:+6.1f}%  p99 {:+6.1f}%  events {:+6.1f}%'.format(
+                profile, stream,
+                100.0 * (res['reports_per_s'] / ref['reports_per_s'] - 1),
+                100.0 * (res['p99_us'] / ref['p99_us'] - 1),
+                100.0 * (res['events_per_report'] / ref['events_per_report'] - 1)
+                if ref['events_per_report'] else 0.0))
+
+
+def _main():
+    parser = argparse.ArgumentParser(description='Steam Controller profiles benchmark')
+    parser.add_argument('-n', '--reports', type=int, default=REPORTS,
+                        help='number of synthetic reports')
+    parser.add_argument('-r', '--read', metavar='FILE', action='append', default=[],
+                        help='also run a recorded capture FILE')
+    parser.add_argument('-p', '--profile', action='append', choices=PROFILES,
+                        help='profile to run, all by default')
+    parser.add_argument('-o', '--output', metavar='FILE', default=None,
+                        help='write JSON results to FILE instead of stdout')
+    parser.add_argument('--compare', metavar='FILE', default=None,
+                        help='print relative change against previous JSON results')
+    args = parser.parse_args()
+
+    sink = sui.NullBackend()
+    sui.setDefaultBackend(sink)
+    clock = Clock()
+    sui.time = clock
+    sce.time = clock.time
+
+    streams = {'synthetic': synthetic(args.reports)}
+    for path in args.read:
+        streams[os.path.basename(path)] = recorded(path)
+
+    results = {}
+    for profile in args.profile or PROFILES:
+        evminit = load(profile)
+        results[profile] = {}
+        for name, reports in sorted(streams.items()):
+            if reports:
+                results[profile][name] = bench(evminit, reports, sink, clock)
+
+    out = {
+        'python': platform.python_implementation() + ' ' + platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(out, f, indent=2, sort_keys=True)
+    elif args.compare is None:
+        json.dump(out, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(json.load(f), out)
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+# Control message scheduler on a virtual clock: haptic pulses coalesced by
+# pad, exit before settings before haptic, the token bucket refills at rate
+# up to the burst size, exit is never delayed and overflowing queues drop
+# their oldest message. RATE is a power of two so the clock steps are exact.
+
+from steamcontroller.scheduler import ControlScheduler, Priority, QUEUE_SIZE
+
+from profiles import Clock
+
+RATE = 64.0
+BURST = 4
+
+
+def drain(sched):
+    """Pop everything allowed now"""
+    sent = []
+    while True:
+        data = sched.pop()
+        if data is None:
+            return sent
+        sent.append(data)
+
+
+clock = Clock()
+sched = ControlScheduler(rate=RATE, burst=BURST, clock=clock.time)
+
+# A newer pulse on a pad replaces the pending one, the other pad is kept
+sched.push(b'left1', Priority.HAPTIC, key='haptic1')
+sched.push(b'right1', Priority.HAPTIC, key='haptic0')
+sched.push(b'left2', Priority.HAPTIC, key='haptic1')
+assert len(sched) == 2 and sched.coalesced == 1
+assert drain(sched) == [b'left2', b'right1']
+# Once sent a pulse with the same key is queued again
+sched.push(b'left3', Priority.HAPTIC, key='haptic1')
+assert len(sched) == 1 and sched.coalesced == 1
+clock.now += 1.0
+assert drain(sched) == [b'left3']
+
+# Priorities whatever the push order
+sched.push(b'haptic', Priority.HAPTIC, key='haptic0')
+sched.push(b'settings', Priority.SETTINGS)
+sched.push(b'exit', Priority.EXIT)
+assert drain(sched) == [b'exit', b'settings', b'haptic']
+
+# Burst cap: after a long idle time only BURST messages go at once
+clock.now += 10.0
+for i in range(BURST * 2):
+    sched.push(b'msg%d' % i, Priority.SETTINGS)
+assert len(drain(sched)) == BURST
+assert abs(sched.timeout() - 1.0 / RATE) < 1e-9
+
+# Refill: one message every 1 / RATE
+clock.now += 0.5 / RATE
+assert drain(sched) == [] and abs(sched.timeout() - 0.5 / RATE) < 1e-9
+clock.now += 0.5 / RATE
+assert drain(sched) == [b'msg%d' % BURST]
+clock.now += 2.0 / RATE
+assert drain(sched) == [b'msg%d' % (BURST + 1), b'msg%d' % (BURST + 2)]
+
+# Exit is never delayed, even with the bucket empty
+assert sched.pop() is None
+sched.push(b'exit', Priority.EXIT, key='exit')
+assert sched.timeout() == 0.0
+assert sched.pop() == b'exit' and sched.pop() is None
+clock.now += 1.0
+assert drain(sched) == [b'msg%d' % (BURST * 2 - 1)]
+assert sched.timeout() is None
+
+# Overflow drops the oldest message of the priority, and its key
+dropped = sched.dropped
+for i in range(QUEUE_SIZE + 3):
+    sched.push(b'set%d' % i, Priority.SETTINGS)
+sched.push(b'pulse', Priority.HAPTIC, key='haptic0')
+assert len(sched) == QUEUE_SIZE + 1 and sched.dropped == dropped + 3
+clock.now += 1000.0
+sent = []
+while len(sched):
+    clock.now += 1.0
+    sent.extend(drain(sched))
+assert sent[0] == b'set3' and sent[-2:] == [b'set%d' % (QUEUE_SIZE + 2), b'pulse']
+
+# The key of a dropped pulse does not coalesce anymore
+coalesced = sched.coalesced
+for i in range(QUEUE_SIZE + 1):
+    sched.push(b'pulse%d' % i, Priority.HAPTIC, key=i)
+assert sched.dropped == dropped + 4
+sched.push(b'again', Priority.HAPTIC, key=0)
+assert sched.dropped == dropped + 5 and sched.coalesced == coalesced
+print(sched.stats())
+print('ok')
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+# Link statistics: sequence gaps are counted as dropped reports, a late
+# report takes its drop back, duplicates and other reports do not change
+# the loss ratio, and sequence numbers wrap around.
+
+from steamcontroller.decoder import SCStatus
+from steamcontroller.stats import LinkStats
+
+PERIOD = 0.004
+
+stats = LinkStats()
+now = [0.0]
+
+
+def receive(*seqs):
+    for seq in seqs:
+        now[0] += PERIOD
+        stats.report(SCStatus.INPUT, now[0])
+        stats.sequence(seq)
+
+
+def loss():
+    return stats.snapshot()['loss']
+
+
+receive(*range(1, 11))
+assert stats.dropped == 0 and loss() == 0.0
+
+# 11, 12 and 13 lost
+receive(14)
+assert stats.dropped == 3 and loss() == 3.0 / (11 + 3)
+
+# Duplicates change nothing but their counter
+receive(14)
+assert stats.duplicates == 1 and stats.dropped == 3 and loss() == 3.0 / (12 + 3)
+
+# 12 arrives late: no longer dropped, once
+receive(12)
+assert stats.reordered == 1 and stats.dropped == 2
+receive(12)
+assert stats.reordered == 2 and stats.dropped == 2
+
+# Idle and hotplug reports are not counted against the loss
+ratio = loss()
+for _ in range(100):
+    now[0] += PERIOD
+    stats.report(SCStatus.IDLE, now[0])
+stats.report(SCStatus.HOTPLUG, now[0])
+assert loss() == ratio
+
+# Wrap around: 0xffff and 0 lost
+receive(*range(15, 0xfffe + 1))
+dropped = stats.dropped
+receive(1)
+assert stats.dropped == dropped + 2
+receive(0)
+assert stats.dropped == dropped + 1
+
+# A gap larger than the window is still counted, late reports from its
+# start are not recognized anymore
+receive(1001)
+assert stats.dropped == dropped + 1 + 999
+receive(2)
+assert stats.dropped == dropped + 1 + 999
+receive(1000)
+assert stats.dropped == dropped + 999
+
+# Reconnected: the new numbering does not count as a gap
+stats.resync()
+receive(500, 501)
+assert stats.dropped == dropped + 999 and stats.reordered == 5
+print(stats)
+print('ok')
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+# Check that no report is lost with a slow callback when several interrupt
+# transfers are kept in flight. The usb1 context is replaced by a fake one
+# driven by a virtual clock: the controller produces one report every PERIOD
+# and a report is lost if no transfer is submitted when it is produced.
+# Control messages queued from another thread wake the loop up, at most
+# CONTROL_INFLIGHT transfers are in flight and failures are counted.
+
+import time
+import threading
+
+import usb1
+import steamcontroller
+from steamcontroller import SteamController
+
+import fakeusb
+
+PERIOD = 0.004
+REPORTS = 400
+
+
+class FakeContext(fakeusb.FakeContext):
+    """Wireless dongle producing REPORTS reports on a virtual clock"""
+    pid = 0x1142
+
+    def __init__(self):
+        super(FakeContext, self).__init__()
+        self.clock = 0.0
+        self.produced = 0
+
+    def handleEventsTimeout(self, tv=0):
+        self.handleEvents(wait=tv != 0)
+
+    def handleEvents(self, wait=True):
+        if self.produced >= REPORTS:
+            while self.submitted:
+                self.submitted.pop(0).complete(usb1.TRANSFER_NO_DEVICE)
+            return
+
+        # Wait for the next report if none was produced since last call
+        if wait:
+            self.clock = max(self.clock, (self.produced + 1) * PERIOD)
+
+        ready = []
+        while self.produced < REPORTS and (self.produced + 1) * PERIOD <= self.clock:
+            self.produced += 1
+            if self.submitted:
+                ready.append((self.submitted.pop(0), self.produced))
+        for transfer, seq in ready:
+            transfer.complete(usb1.TRANSFER_COMPLETED, seq)
+
+
+class ControlContext(fakeusb.FakeContext):
+    """
+    Controller sending no report: the loop sleeps until it is interrupted,
+    control transfers are held until finish() completes them from the loop
+    """
+
+    def __init__(self):
+        super(ControlContext, self).__init__()
+        self.parked = []
+        self.held = []
+        self.finishing = None
+
+    def finish(self, status):
+        self.finishing = status
+        self.interruptEventHandler()
+
+    def _handle(self, tv):
+        self.parked.extend(self.submitted)
+        self.held.extend(self.controls)
+        del self.submitted[:], self.controls[:]
+        super(ControlContext, self)._handle(tv)
+        if self.finishing is not None:
+            status, self.finishing = self.finishing, None
+            held, self.held = self.held, []
+            for transfer in held:
+                transfer.complete(status)
+
+
+def wait(condition, what):
+    deadline = time.monotonic() + 1.0
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError(what)
+        time.sleep(0.001)
+
+
+def control():
+    ctx = ControlContext()
+    sc = SteamController(callback=lambda sc, sci: None, ctx=ctx)
+    thread = threading.Thread(target=sc.run)
+    thread.daemon = True
+    thread.start()
+    time.sleep(0.05)
+    wakeups = ctx.wakeups
+
+    # Queued from this thread while the loop sleeps without timeout
+    start = time.monotonic()
+    sc.setGyro(True)
+    sc.addFeedback(0)
+    sc.addFeedback(1)
+    wait(lambda: len(ctx.held) == steamcontroller.CONTROL_INFLIGHT, 'loop not woken up')
+    latency = time.monotonic() - start
+    time.sleep(0.05)
+    stats = sc.controlStats()
+    print('control: {:d} in flight after {:.1f}ms, {:d} wakeups'.format(
+        len(ctx.held), latency * 1e3, ctx.wakeups - wakeups))
+    assert len(ctx.held) == steamcontroller.CONTROL_INFLIGHT
+    assert stats['inflight'] == steamcontroller.CONTROL_INFLIGHT and stats['depth'] == 1
+    assert ctx.wakeups - wakeups <= 4
+
+    # Completions free their slots, the last message goes
+    ctx.finish(usb1.TRANSFER_COMPLETED)
+    wait(lambda: len(ctx.held) == 1 and sc.controlStats()['inflight'] == 1, 'slot not freed')
+    assert sc.controlStats()['depth'] == 0 and sc.controlStats()['failed'] == 0
+
+    # Timed out and errored transfers are counted as failed
+    ctx.finish(usb1.TRANSFER_TIMED_OUT)
+    wait(lambda: sc.controlStats()['inflight'] == 0, 'failed transfer kept in flight')
+    sc.addFeedback(0)
+    wait(lambda: len(ctx.held) == 1, 'loop not woken up')
+    ctx.finish(usb1.TRANSFER_ERROR)
+    wait(lambda: sc.controlStats()['inflight'] == 0, 'failed transfer kept in flight')
+    assert sc.controlStats()['failed'] == 2
+
+    sc.release()
+    thread.join(1.0)
+    assert not thread.is_alive()
+
+
+def run(transfers):
+    received = []
+
+    def slow(sc, sci):
+        received.append(sci.seq)
+        # Stall for 20ms every 8 reports, 1ms otherwise
+        sc._ctx.clock += 0.02 if len(received) % 8 == 0 else 0.001
+
+    sc = SteamController(callback=slow, transfers=transfers)
+    sc.run()
+    return received
+
+
+usb1.USBContext = FakeContext
+
+for n in (1, steamcontroller.TRANSFERS):
+    received = run(n)
+    lost = REPORTS - len(set(received))
+    print('{:d} transfer(s): {:d} reports received, {:d} lost'.format(n, len(received), lost))
+
+    assert received == sorted(received)
+
+assert lost == 0, 'reports lost with {:d} transfers'.format(steamcontroller.TRANSFERS)
+
+control()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+# Steam watcher: a fake process table drives the detection, the scans back
+# off while Steam is not running, a pidfd wakes the watcher as soon as a real
+# process exits, and a running SteamController is released without being
+# turned off within milliseconds of the detection.
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+from struct import pack
+
+import steamcontroller.watcher as scw
+from steamcontroller import SteamController, SCStatus, EXITCMD
+from steamcontroller.capture import CaptureWriter, CaptureReader, ReplayContext
+from steamcontroller.daemon import Daemon
+
+PERIOD = 0.004
+
+scw.SCAN_MIN = 0.01
+scw.SCAN_MAX = 0.08
+scw.POLL = 0.01
+
+
+class FakeDetector(scw.ProcDetector):
+    """Process table held in a dict, pidfd from the real process if any"""
+    def __init__(self, pidfd=False):
+        super(FakeDetector, self).__init__()
+        self.table = {}
+        self._pidfd = pidfd
+
+    def find(self, name):
+        for pid, comm in self.table.items():
+            if comm == name:
+                return pid
+        return None
+
+    def alive(self, pid, name):
+        return self.table.get(pid) == name
+
+    def open(self, pid):
+        return super(FakeDetector, self).open(pid) if self._pidfd else None
+
+
+def waitFor(cond, timeout=2.0):
+    start = time.monotonic()
+    while not cond():
+        if time.monotonic() - start > timeout:
+            raise AssertionError('timeout')
+        time.sleep(0.001)
+    return time.monotonic() - start
+
+
+# Polling: start and exit detected, scans back off while Steam is not running
+events = []
+detector = FakeDetector()
+watcher = scw.SteamWatcher(on_start=lambda pid: events.append(('start', pid)),
+                           on_exit=lambda: events.append(('exit',)), detector=detector)
+watcher.start()
+assert not watcher.running and watcher.waitIdle(0)
+time.sleep(0.5)
+print('{:d} scans in 0.5s without steam'.format(watcher.scans))
+assert watcher.scans <= 0.5 / scw.SCAN_MAX + 5
+detector.table[1234] = 'steam'
+found = waitFor(lambda: watcher.running)
+assert watcher.pid == 1234 and not watcher.waitIdle(0)
+del detector.table[1234]
+gone = waitFor(lambda: not watcher.running)
+print('polling: start seen after {:.0f}ms, exit after {:.0f}ms'.format(found * 1e3, gone * 1e3))
+assert events == [('start', 1234), ('exit',)], events
+watcher.stop()
+
+# Real pid with pidfd: the watcher sleeps until the process exits
+child = subprocess.Popen(['sleep', '30'])
+detector = FakeDetector(pidfd=True)
+detector.table[child.pid] = 'steam'
+pidfd = detector.open(child.pid)
+if pidfd is not None:
+    os.close(pidfd)
+    watcher = scw.SteamWatcher(detector=detector)
+    watcher.start()
+    assert watcher.pid == child.pid
+    time.sleep(0.1)
+    scans = watcher.scans
+    start = time.monotonic()
+    child.kill()
+    child.wait()
+    del detector.table[child.pid]
+    waitFor(lambda: not watcher.running)
+    print('pidfd: exit seen after {:.1f}ms'.format((time.monotonic() - start) * 1e3))
+    assert scans == 1
+    watcher.stop()
+else:
+    child.kill()
+    child.wait()
+    print('pidfd: not supported')
+
+# /proc detector finds this process by its name
+with open('/proc/self/comm') as f:
+    comm = f.read().strip()
+assert scw.ProcDetector().find(comm) is not None
+assert scw.ProcDetector().alive(os.getpid(), comm)
+
+# A running controller is released without being turned off
+tmp = tempfile.mkdtemp()
+try:
+    path = os.path.join(tmp, 'long.sccap')
+    with CaptureWriter(path, pid=0x1142) as capture:
+        for seq in range(1, 2500):
+            report = bytearray(64)
+            report[2] = SCStatus.INPUT
+            report[4:6] = pack('<H', seq)
+            capture.write(report, seq * PERIOD)
+
+    detector = FakeDetector()
+    daemon = Daemon(os.path.join(tmp, 'pid'), detector=detector)
+    daemon._watcher = scw.SteamWatcher(on_start=daemon._steamStarted, detector=detector)
+    daemon._watcher.start()
+    with CaptureReader(path) as reader:
+        received = []
+        sc = SteamController(callback=lambda sc, sci: received.append(sci.seq),
+                             ctx=ReplayContext(reader), keep_alive=True)
+        handle = sc._handle
+        thread = threading.Thread(target=daemon.serve, args=(sc,))
+        thread.start()
+        time.sleep(0.2)
+        detector.table[4321] = 'steam'
+        waitFor(lambda: daemon._watcher.running)
+        start = time.monotonic()
+        thread.join(1.0)
+        released = time.monotonic() - start
+        print('controller released {:.1f}ms after steam was detected, {:d} reports'.format(
+            released * 1e3, len(received)))
+        assert not thread.is_alive() and sc._handle is None
+        assert handle._last[:len(EXITCMD)] != EXITCMD
+        assert released < 0.05
+
+        # Steam already running: serve() returns right away
+        sc = SteamController(callback=lambda sc, sci: None, ctx=ReplayContext(reader))
+        start = time.monotonic()
+        daemon.serve(sc)
+        assert time.monotonic() - start < 0.05 and sc._handle is None
+    daemon._watcher.stop()
+finally:
+    shutil.rmtree(tmp)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+# Compare the cost of an xbox like frame (4 axes, 1 button, syn) written with
+# one ctypes call and write() per event through libuinput, to the frame
+# batched pack_into and single write() of the uinput backends. Events are
+# written to /dev/null so no /dev/uinput is needed. The ctypes part needs the
+# built extension (python setup.py build_ext --inplace), or give its path.
+
+import os
+import sys
+import ctypes
+import timeit
+
+import steamcontroller.uinput as sui
+from steamcontroller.uinput import Keys, Axes
+
+NUMBER = 100000
+
+fd = os.open(os.devnull, os.O_WRONLY)
+lib_path = sys.argv[1] if len(sys.argv) > 1 else sui.findLibUInput()
+
+
+def ctypes_frame(lib):
+    lib.uinput_abs(fd, ctypes.c_uint16(Axes.ABS_X), ctypes.c_int32(1000))
+    lib.uinput_abs(fd, ctypes.c_uint16(Axes.ABS_Y), ctypes.c_int32(-1000))
+    lib.uinput_abs(fd, ctypes.c_uint16(Axes.ABS_RX), ctypes.c_int32(2000))
+    lib.uinput_abs(fd, ctypes.c_uint16(Axes.ABS_RY), ctypes.c_int32(-2000))
+    lib.uinput_key(fd, ctypes.c_uint16(Keys.BTN_A), ctypes.c_int32(1))
+    lib.uinput_syn(fd)
+
+
+backend = sui.IoctlUInputBackend()
+frame = sui._Frame(fd)
+
+
+def batched_frame():
+    backend.abs(frame, Axes.ABS_X, 1000)
+    backend.abs(frame, Axes.ABS_Y, -1000)
+    backend.abs(frame, Axes.ABS_RX, 2000)
+    backend.abs(frame, Axes.ABS_RY, -2000)
+    backend.key(frame, Keys.BTN_A, 1)
+    backend.syn(frame)
+
+
+if lib_path:
+    start = timeit.timeit(lambda: ctypes.CDLL(sui.findLibUInput() or lib_path), number=100) / 100
+    print('libuinput lookup and load: {:.1f}us'.format(start * 1e6))
+    lib = ctypes.CDLL(lib_path)
+    old = timeit.timeit(lambda: ctypes_frame(lib), number=NUMBER) / NUMBER
+    print('ctypes, 6 writes per frame: {:.2f}us'.format(old * 1e6))
+else:
+    old = None
+    print('libuinput not built, ctypes path skipped')
+
+new = timeit.timeit(batched_frame, number=NUMBER) / NUMBER
+print('batched, 1 write per frame: {:.2f}us'.format(new * 1e6))
+if old:
+    print('x{:.1f} faster'.format(old / new))
+print(backend.stats())